@@ -0,0 +1,79 @@
+"""move selected accounts to user_accounts
+
+Revision ID: 61b056746849
+Revises: d4abf96feef2
+Create Date: 2026-10-16 23:20:57.782157
+
+"""
+import json
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '61b056746849'
+down_revision: str | Sequence[str] | None = 'd4abf96feef2'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+user_accounts = sa.table(
+    'user_accounts',
+    sa.column('user_id', sa.BigInteger()),
+    sa.column('account_id', sa.String()),
+    sa.column('position', sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_accounts',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('account_id', sa.String(length=64), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('currency_code', sa.Integer(), nullable=True),
+    sa.Column('type', sa.String(length=32), nullable=True),
+    sa.Column('masked_pan', sa.String(length=32), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'account_id')
+    )
+    with op.batch_alter_table('user_accounts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_accounts_account_id'), ['account_id'], unique=False)
+
+    bind = op.get_bind()
+    rows = []
+    users = bind.execute(sa.text("SELECT id, selected_accounts FROM users WHERE selected_accounts IS NOT NULL"))
+    for user_id, selected in users:
+        # dict.fromkeys drops duplicates while keeping the order they were selected in
+        for position, account_id in enumerate(dict.fromkeys(json.loads(selected))):
+            rows.append({'user_id': user_id, 'account_id': account_id, 'position': position})
+    if rows:
+        op.bulk_insert(user_accounts, rows)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('selected_accounts')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('selected_accounts', sa.TEXT(), nullable=True))
+
+    bind = op.get_bind()
+    selected: dict[int, list[str]] = {}
+    stmt = sa.select(user_accounts.c.user_id, user_accounts.c.account_id).order_by(
+        user_accounts.c.user_id, user_accounts.c.position
+    )
+    for user_id, account_id in bind.execute(stmt):
+        selected.setdefault(user_id, []).append(account_id)
+    for user_id, accounts in selected.items():
+        bind.execute(
+            sa.text("UPDATE users SET selected_accounts = :accounts WHERE id = :id"),
+            {'accounts': json.dumps(accounts), 'id': user_id},
+        )
+
+    with op.batch_alter_table('user_accounts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_accounts_account_id'))
+
+    op.drop_table('user_accounts')
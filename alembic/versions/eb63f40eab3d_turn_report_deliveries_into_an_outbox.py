@@ -0,0 +1,61 @@
+"""turn report deliveries into an outbox
+
+Revision ID: eb63f40eab3d
+Revises: 37ecfd52cc5e
+Create Date: 2026-10-16 22:54:48.760375
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'eb63f40eab3d'
+down_revision: str | Sequence[str] | None = '37ecfd52cc5e'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('report_deliveries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('status', sa.String(length=16), nullable=True))
+
+    # Rows recorded before the outbox existed were all delivered reports
+    op.execute("UPDATE report_deliveries SET idempotency_key = 'delivery:' || id, status = 'sent'")
+
+    with op.batch_alter_table('report_deliveries', schema=None) as batch_op:
+        batch_op.alter_column('idempotency_key',
+               existing_type=sa.String(length=64),
+               nullable=False)
+        batch_op.alter_column('status',
+               existing_type=sa.String(length=16),
+               nullable=False)
+        batch_op.alter_column('delivered_at',
+               existing_type=sa.DATETIME(),
+               nullable=True)
+        batch_op.alter_column('lateness',
+               existing_type=sa.FLOAT(),
+               nullable=True)
+        batch_op.create_index(batch_op.f('ix_report_deliveries_idempotency_key'), ['idempotency_key'], unique=True)
+        batch_op.create_index('ix_report_deliveries_status_scheduled', ['status', 'scheduled_for'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM report_deliveries WHERE delivered_at IS NULL OR lateness IS NULL")
+
+    with op.batch_alter_table('report_deliveries', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_deliveries_status_scheduled')
+        batch_op.drop_index(batch_op.f('ix_report_deliveries_idempotency_key'))
+        batch_op.alter_column('lateness',
+               existing_type=sa.FLOAT(),
+               nullable=False)
+        batch_op.alter_column('delivered_at',
+               existing_type=sa.DATETIME(),
+               nullable=False)
+        batch_op.drop_column('status')
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,74 @@
+import random
+import time
+
+from src.services.aggregation import TransactionBatch, np
+from src.services.categorization import compile_rules, get_category_for_mcc
+
+SIZES = [10_000, 1_000_000]
+USERS = 500
+MCCS = [5411, 5812, 5541, 4829, 5912, 5732, 7832, 3010, 9999, 6011]
+
+
+def make_transactions(size: int) -> list[dict]:
+    rng = random.Random(size)
+    return [
+        {
+            "user": rng.randrange(USERS),
+            "account": f"account{rng.randrange(USERS * 2)}",
+            "amount": rng.randint(-100_000, 50_000),
+            "mcc": rng.choice(MCCS),
+            "time": 1705660800 + i,
+            "description": None,
+        }
+        for i in range(size)
+    ]
+
+
+def legacy_aggregate(transactions: list[dict]) -> dict:
+    results: dict[int, dict] = {}
+    for tx in transactions:
+        result = results.setdefault(tx["user"], {"spending": {}, "total_spending": 0, "total_income": 0})
+        amount = tx.get("amount", 0)
+        mcc = tx.get("mcc", 0)
+        if amount < 0:
+            category = get_category_for_mcc(mcc)
+            result["spending"][category] = result["spending"].get(category, 0) + abs(amount)
+            result["total_spending"] += abs(amount)
+        else:
+            result["total_income"] += amount
+    return results
+
+
+def make_batch(transactions: list[dict]) -> TransactionBatch:
+    batch = TransactionBatch()
+    for tx in transactions:
+        batch.append(tx["user"], tx["account"], tx["amount"], tx["mcc"], tx["time"], tx["description"])
+    return batch
+
+
+def timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    categorizer = compile_rules()
+    print(f"{'transactions':>12} {'legacy loop':>12} {'batch python':>13} {'batch numpy':>12} {'speedup':>8}")
+    for size in SIZES:
+        transactions = make_transactions(size)
+        batch = make_batch(transactions)
+        categorizers = [categorizer] * len(batch.users)
+        languages = ["uk"] * len(batch.users)
+
+        legacy = timed(legacy_aggregate, transactions)
+        python = timed(batch.aggregate, categorizers, languages, vectorized=False)
+        vectorized = timed(batch.aggregate, categorizers, languages, vectorized=True) if np is not None else None
+
+        best = vectorized if vectorized is not None else python
+        vectorized_text = f"{vectorized:11.3f}s" if vectorized is not None else f"{'n/a':>12}"
+        print(f"{size:>12} {legacy:11.3f}s {python:12.3f}s {vectorized_text} {legacy / best:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
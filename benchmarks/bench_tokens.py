@@ -0,0 +1,81 @@
+import asyncio
+import base64
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from src.lib import crypto
+
+SIZES = [100, 500]
+TICK = 0.001
+TOKEN = "uBenchToken12345678901234567890123456789"
+
+
+def legacy_encrypt(user_id: int) -> str:
+    fernet = Fernet(crypto._pbkdf2_user_key(crypto._get_or_create_master_key(), user_id))
+    return base64.urlsafe_b64encode(fernet.encrypt(TOKEN.encode())).decode()
+
+
+def sequential(tokens: list[tuple[int, str]]) -> float:
+    crypto.key_cache.invalidate()
+    start = time.perf_counter()
+    for user_id, encrypted in tokens:
+        crypto.decrypt_token(encrypted, user_id)
+    return time.perf_counter() - start
+
+
+async def _batched(tokens: list[tuple[int, str]]) -> tuple[float, float]:
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            tick = time.perf_counter()
+            await asyncio.sleep(TICK)
+            stall = max(stall, time.perf_counter() - tick - TICK)
+
+    ticking = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await crypto.decrypt_tokens(tokens)
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticking
+    return elapsed, stall
+
+
+def batched(tokens: list[tuple[int, str]]) -> tuple[float, float]:
+    crypto.key_cache.invalidate()
+    return asyncio.run(_batched(tokens))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        crypto.SECRET_KEY_FILE = Path(tmp) / ".secret_key"
+        crypto.RETIRED_KEYS_FILE = Path(tmp) / ".secret_key.retired"
+        # start the worker processes once, outside the measurements
+        asyncio.run(crypto.decrypt_tokens([(0, legacy_encrypt(0))]))
+
+        print(f"{'format':>8} {'tokens':>7} {'sequential':>11} {'batch':>9} {'speedup':>8} {'loop stall':>11}")
+        try:
+            for size in SIZES:
+                formats = {
+                    "legacy": [(user_id, legacy_encrypt(user_id)) for user_id in range(1, size + 1)],
+                    "v2": [(user_id, crypto.encrypt_token(TOKEN, user_id)) for user_id in range(1, size + 1)],
+                }
+                for name, tokens in formats.items():
+                    loop_time = sequential(tokens)
+                    batch_time, stall = batched(tokens)
+                    print(
+                        f"{name:>8} {size:>7} {loop_time:10.3f}s {batch_time:8.3f}s "
+                        f"{loop_time / batch_time:7.1f}x {stall * 1000:9.1f}ms"
+                    )
+        finally:
+            crypto.shutdown_decrypt_pool()
+            crypto.pending_reencryptions.drain()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import pprint
+import signal
 import traceback
 
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, ContextTypes, MessageHandler, filters
@@ -7,10 +9,18 @@ from telegram.ext import ApplicationBuilder, CallbackQueryHandler, ContextTypes,
 from src.database.configuration import engine
 from src.database.models import Base
 from src.jobs.daily_report import start_daily_report_job, stop_daily_report_job
-from src.lib.callback_context import CustomCallbackContext
+from src.jobs.maintenance import start_maintenance_job, stop_maintenance_job
+from src.lib.callback_context import CustomCallbackContext, UpdateSessionProcessor
+from src.lib.crypto import shutdown_decrypt_pool
 from src.menus.fallback import goto_start
 from src.menus.start import StartMenu
-from src.settings import BOT_TOKEN
+from src.services.http_client import http_pool
+from src.services.scheduler import statement_scheduler
+from src.services.telegram_dispatcher import outbound_limiter
+from src.services.user_cache import user_cache
+from src.services.webhook import webhook_server
+from src.services.workers import worker_registry
+from src.settings import BOT_TOKEN, WEBHOOK_ENABLED
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +32,33 @@ async def error(update, context):
     traceback.print_exc()
 
 
+async def post_init(_application):
+    if WEBHOOK_ENABLED:
+        await webhook_server.start()
+
+
+async def post_shutdown(_application):
+    await user_cache.flush()
+    await worker_registry.leave()
+    await webhook_server.stop()
+    await statement_scheduler.close()
+    await http_pool.close()
+    shutdown_decrypt_pool()
+
+
+def _build_application(builder: ApplicationBuilder):
+    context_types = ContextTypes(context=CustomCallbackContext)
+    return (
+        builder.token(BOT_TOKEN)
+        .context_types(context_types)
+        .concurrent_updates(UpdateSessionProcessor(max_concurrent_updates=1))
+        .rate_limiter(outbound_limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+
 def main():
     if not BOT_TOKEN:
         logger.error("BOT_TOKEN is not set. Please set it in .env file.")
@@ -30,8 +67,7 @@ def main():
     Base.metadata.create_all(engine)
     logger.info("Database tables created")
 
-    context_types = ContextTypes(context=CustomCallbackContext)
-    application = ApplicationBuilder().token(BOT_TOKEN).context_types(context_types).build()
+    application = _build_application(ApplicationBuilder())
 
     start_menu = StartMenu(application=application)
 
@@ -41,11 +77,43 @@ def main():
     application.add_error_handler(error)
 
     start_daily_report_job(application.job_queue)
+    start_maintenance_job(application.job_queue)
 
     logger.info("Bot started")
     application.run_polling(allowed_updates=["message", "edited_message", "callback_query"])
 
     stop_daily_report_job(application.job_queue)
+    stop_maintenance_job(application.job_queue)
+
+
+async def _run_worker(application):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    async with application:
+        await application.start()
+        start_daily_report_job(application.job_queue)
+        start_maintenance_job(application.job_queue)
+        logger.info(f"Report worker {worker_registry.worker_id} started")
+
+        await stopping.wait()
+
+        stop_daily_report_job(application.job_queue)
+        stop_maintenance_job(application.job_queue)
+        await application.stop()
+    await post_shutdown(application)
+
+
+def worker():
+    """Runs daily reports only, next to the polling bot and other workers sharing its database."""
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN is not set. Please set it in .env file.")
+        return
+
+    application = _build_application(ApplicationBuilder().updater(None))
+    asyncio.run(_run_worker(application))
 
 
 if __name__ == "__main__":
@@ -1,11 +1,175 @@
-from sqlalchemy import create_engine
+import asyncio
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import Pool
+
+from src.settings import (
+    DATABASE_ASYNC,
+    DATABASE_ASYNC_URL,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_SIZE,
+    DATABASE_URL,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+# [sessions, connections] used by the update being processed
+_update_usage: ContextVar[list[int] | None] = ContextVar("update_usage", default=None)
+
+
+class SessionStats:
+    """Counts the sessions opened by run_db and the pooled connections checked out,
+    in total and for each processed update.
+    """
+
+    def __init__(self):
+        self.sessions = 0
+        self.connections = 0
+        self.updates = 0
+        self.updates_with_session = 0
+        self.update_sessions = 0
+        self.update_connections = 0
+        self.max_update_sessions = 0
+
+    def _count(self, index: int) -> None:
+        usage = _update_usage.get()
+        if usage is not None:
+            usage[index] += 1
+
+    def session_opened(self) -> None:
+        self.sessions += 1
+        self._count(0)
+
+    def connection_checked_out(self) -> None:
+        self.connections += 1
+        self._count(1)
+
+    def update_done(self, sessions: int, connections: int) -> None:
+        self.updates += 1
+        self.updates_with_session += bool(sessions)
+        self.update_sessions += sessions
+        self.update_connections += connections
+        self.max_update_sessions = max(self.max_update_sessions, sessions)
+
+    def as_dict(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "connections": self.connections,
+            "updates": self.updates,
+            "without_session": self.updates - self.updates_with_session,
+            "sessions_per_update": self.update_sessions / self.updates if self.updates else 0.0,
+            "connections_per_update": self.update_connections / self.updates if self.updates else 0.0,
+            "max_sessions_per_update": self.max_update_sessions,
+            "pool": engine.pool.status(),
+        }
+
+
+session_stats = SessionStats()
+
+
+@contextmanager
+def count_update_usage() -> Iterator[None]:
+    """Attributes the sessions and connections used inside the block to one update."""
+    usage = [0, 0]
+    token = _update_usage.set(usage)
+    try:
+        yield
+    finally:
+        _update_usage.reset(token)
+        session_stats.update_done(*usage)
+
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(_dbapi_connection, _connection_record, _connection_proxy) -> None:
+    session_stats.connection_checked_out()
 
-from src.settings import DATABASE_URL
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {"pool_size": DATABASE_POOL_SIZE, "max_overflow": DATABASE_MAX_OVERFLOW}
+
+    options: dict = {"connect_args": {"check_same_thread": False}}
+    # in-memory databases live in a single connection, there is no pool to size
+    if parsed.database not in (None, "", ":memory:"):
+        options.update(pool_size=DATABASE_POOL_SIZE, max_overflow=DATABASE_MAX_OVERFLOW)
+    return options
+
+
+def create_db_engine(url: str = DATABASE_URL) -> Engine:
+    engine = create_engine(url, **_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
 sm = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+async_sm: "async_sessionmaker[AsyncSession] | None" = None
 
 
 def get_session() -> Session:
     return sm()
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return url if driver is None else parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_async_session() -> "AsyncSession":
+    global async_sm
+    if async_sm is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = DATABASE_ASYNC_URL or async_database_url()
+        async_engine = create_async_engine(url, **_engine_options(url))
+        if async_engine.dialect.name == "sqlite":
+            event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        async_sm = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_sm()
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Calls ``fn(session, *args, **kwargs)`` inside a transaction and returns its result.
+
+    With DATABASE_ASYNC the function runs on an async session through
+    ``run_sync``, so its queries wait on the driver. Otherwise it runs on a
+    regular session in a worker thread. Either way the event loop is not blocked.
+    """
+    session_stats.session_opened()
+    if DATABASE_ASYNC:
+        async with get_async_session() as session, session.begin():
+            return await session.run_sync(fn, *args, **kwargs)
+
+    return await asyncio.to_thread(_run_in_session, fn, *args, **kwargs)
+
+
+def _run_in_session(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    session = get_session()
+    try:
+        with session.begin():
+            return fn(session, *args, **kwargs)
+    finally:
+        session.close()
@@ -1,4 +1,22 @@
+from src.database.models.account_sync import AccountSyncState
 from src.database.models.base import Base
+from src.database.models.category_rule import UserCategoryRule
+from src.database.models.rate_limit import RateLimitState
+from src.database.models.report_delivery import ReportDelivery
+from src.database.models.transaction import Transaction
 from src.database.models.user import User
+from src.database.models.user_account import UserAccount
+from src.database.models.worker import Lease, WorkerHeartbeat
 
-__all__ = ["Base", "User"]
+__all__ = [
+    "AccountSyncState",
+    "Base",
+    "Lease",
+    "RateLimitState",
+    "ReportDelivery",
+    "Transaction",
+    "User",
+    "UserAccount",
+    "UserCategoryRule",
+    "WorkerHeartbeat",
+]
@@ -0,0 +1,20 @@
+import datetime
+
+from sqlalchemy import BigInteger, DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.models.base import Base
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+class AccountSyncState(Base):
+    __tablename__ = "account_sync_states"
+
+    account_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    synced_from: Mapped[int] = mapped_column(BigInteger)
+    synced_to: Mapped[int] = mapped_column(BigInteger)
+    balance: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=_utc_now, onupdate=_utc_now)
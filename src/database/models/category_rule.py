@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.models.base import Base
+
+
+class UserCategoryRule(Base):
+    __tablename__ = "category_rules"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    category: Mapped[str] = mapped_column(String(64))
+    mcc_from: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    mcc_to: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    pattern: Mapped[str | None] = mapped_column(String(255), nullable=True)
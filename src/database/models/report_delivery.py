@@ -0,0 +1,20 @@
+import datetime
+
+from sqlalchemy import BigInteger, DateTime, Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.models.base import Base
+
+
+class ReportDelivery(Base):
+    __tablename__ = "report_deliveries"
+    __table_args__ = (Index("ix_report_deliveries_status_scheduled", "status", "scheduled_for"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    scheduled_for: Mapped[datetime.datetime] = mapped_column(DateTime)
+    status: Mapped[str] = mapped_column(String(16), default="pending")
+    delivered_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    lateness: Mapped[float | None] = mapped_column(Float, nullable=True)
+    claimed_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
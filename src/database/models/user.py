@@ -1,17 +1,17 @@
 import datetime
 import gettext
-import json
 from html import escape
 from typing import TYPE_CHECKING
 
-from sqlalchemy import BigInteger, DateTime, Integer, String, Text
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, literal_column, text
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from telegram import Bot
 from telegram import User as TelegramUser
 
 from src.database.models.base import Base
-from src.lib.crypto import decrypt_token, encrypt_token
+from src.database.models.user_account import UserAccount
+from src.lib.crypto import decrypt_token, encrypt_token, needs_reencryption, pending_reencryptions
 from src.settings import PROJECT_ROOT, REPORT_HOUR, REPORT_MINUTE
 
 if TYPE_CHECKING:
@@ -24,6 +24,18 @@ def _utc_now() -> datetime.datetime:
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index(
+            "ix_users_report_slot",
+            "report_hour",
+            "report_minute",
+            "id",
+            sqlite_where=text("block_date IS NULL AND monobank_token IS NOT NULL"),
+            postgresql_where=text("block_date IS NULL AND monobank_token IS NOT NULL"),
+        ),
+    )
+    # read back the version a flush increments, so detached users know the row they came from
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(255))
@@ -31,17 +43,28 @@ class User(Base):
     username: Mapped[str | None] = mapped_column(String(255), nullable=True)
     language_code: Mapped[str] = mapped_column(String(10), default="uk")
     _monobank_token: Mapped[str | None] = mapped_column("monobank_token", String(512), nullable=True)
-    _selected_accounts: Mapped[str | None] = mapped_column("selected_accounts", Text, nullable=True)
     report_hour: Mapped[int] = mapped_column(Integer, default=REPORT_HOUR)
     report_minute: Mapped[int] = mapped_column(Integer, default=REPORT_MINUTE)
     join_date: Mapped[datetime.datetime] = mapped_column(DateTime, default=_utc_now)
     block_date: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    webhook_date: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    # incremented by every write to the row, lets the user cache of another process notice it
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", onupdate=literal_column("version + 1"))
+    # loaded together with the user, so detached users kept between updates still have their accounts
+    accounts: Mapped[list[UserAccount]] = relationship(
+        lazy="selectin", cascade="all, delete-orphan", order_by=UserAccount.position
+    )
+
+    @property
+    def encrypted_token(self) -> str | None:
+        return self._monobank_token
 
     @property
     def monobank_token(self) -> str | None:
-        if self._monobank_token:
-            return decrypt_token(self._monobank_token, self.id)
-        return None
+        if not self._monobank_token:
+            return None
+
+        return decrypt_token(self._monobank_token, self.id)
 
     @monobank_token.setter
     def monobank_token(self, value: str | None):
@@ -50,15 +73,40 @@ class User(Base):
         else:
             self._monobank_token = None
 
+    def reencrypt_if_stale(self) -> None:
+        """Re-encrypts a token in an older format or under a retired key and queues it to be written back."""
+        if not self._monobank_token or not needs_reencryption(self._monobank_token):
+            return
+
+        token = decrypt_token(self._monobank_token, self.id)
+        if token is not None:
+            encrypted = encrypt_token(token, self.id)
+            pending_reencryptions.add(self.id, self._monobank_token, encrypted)
+            self._monobank_token = encrypted
+
     @property
     def selected_accounts(self) -> list[str]:
-        if self._selected_accounts:
-            return json.loads(self._selected_accounts)
-        return []
+        return [account.account_id for account in self.accounts]
 
     @selected_accounts.setter
     def selected_accounts(self, value: list[str]):
-        self._selected_accounts = json.dumps(value) if value else None
+        current = {account.account_id: account for account in self.accounts}
+        accounts = []
+        for position, account_id in enumerate(value or []):
+            account = current.get(account_id) or UserAccount(account_id=account_id)
+            account.position = position
+            accounts.append(account)
+        self.accounts = accounts
+
+    def select_accounts(self, accounts: list[dict]) -> None:
+        """Replaces the selection with Monobank accounts, keeping the rows of accounts that stay selected."""
+        current = {account.account_id: account for account in self.accounts}
+        selected = []
+        for position, account in enumerate(accounts):
+            row = current.get(account["id"]) or UserAccount.from_monobank(account, position)
+            row.position = position
+            selected.append(row)
+        self.accounts = selected
 
     @hybrid_property
     def is_active(self):
@@ -78,6 +126,12 @@ class User(Base):
     def has_token(cls) -> "InstrumentedAttribute[bool]":
         return cls._monobank_token.isnot(None)  # type: ignore[return-value]
 
+    @property
+    def webhook_since(self) -> int | None:
+        if self.webhook_date is None:
+            return None
+        return int(self.webhook_date.replace(tzinfo=datetime.UTC).timestamp())
+
     def activate(self) -> None:
         self.block_date = None
 
@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.models.base import Base
+
+
+class UserAccount(Base):
+    __tablename__ = "user_accounts"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    account_id: Mapped[str] = mapped_column(String(64), primary_key=True, index=True)
+    position: Mapped[int] = mapped_column(Integer, default=0)
+    currency_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    type: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    masked_pan: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+    @classmethod
+    def from_monobank(cls, account: dict, position: int = 0) -> "UserAccount":
+        masked_pan = account.get("maskedPan") or [None]
+        return cls(
+            account_id=account["id"],
+            position=position,
+            currency_code=account.get("currencyCode"),
+            type=account.get("type"),
+            masked_pan=masked_pan[0],
+        )
@@ -1,92 +1,486 @@
+import asyncio
 import datetime
 import logging
+import math
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from enum import Enum
 
+import httpx
 import pytz
-from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from telegram.error import BadRequest, Forbidden
 
-from src.database.configuration import get_session
+from src.database.configuration import run_db
 from src.database.models import User
+from src.lib.crypto import decrypt_tokens
 from src.lib.helpers import format_money
-from src.services.monobank import MonobankAPIError, get_daily_spending
-from src.settings import TIMEZONE
+from src.services.categorization import load_user_rules
+from src.services.http_client import http_pool
+from src.services.monobank import MONOBANK_API_URL, MonobankAPIError, get_daily_spending, sync_statements
+from src.services.rate_limiter import DEFAULT_LIMITS, STATEMENT
+from src.services.report_outbox import (
+    OutboxItem,
+    acknowledge,
+    claim,
+    deactivate_users,
+    due_users,
+    enqueue,
+    expire,
+    last_scheduled,
+    pending_items,
+    release,
+)
+from src.services.report_recipients import ReportRecipient, iter_recipients
+from src.services.report_schedule import report_schedule
+from src.services.scheduler import Priority
+from src.services.workers import worker_registry
+from src.settings import (
+    HTTP_WARM_UP_SECONDS,
+    REPORT_CATCH_UP_SECONDS,
+    REPORT_CONCURRENCY,
+    REPORT_OUTBOX_ACK_BATCH_SIZE,
+    REPORT_PREFETCH_ENABLED,
+    REPORT_PREFETCH_MARGIN_SECONDS,
+    REPORT_PREFETCH_MAX_LEAD_SECONDS,
+    REPORT_USER_TIMEOUT_SECONDS,
+    TIMEZONE,
+    WORKER_HEARTBEAT_SECONDS,
+)
 
 logger = logging.getLogger(__name__)
 
+REPORT_JOB_NAME = "daily_report_job"
+PREFETCH_JOB_NAME = "report_prefetch_job"
+HEARTBEAT_JOB_NAME = "worker_heartbeat_job"
+SLOT_SECONDS = 60
+
+_running_slots: dict[datetime.datetime, float] = {}
+
 
 def start_daily_report_job(job_queue):
     stop_daily_report_job(job_queue)
 
-    job_queue.run_repeating(send_daily_reports, interval=60, first=0, name="daily_report_job")
-    logger.info(f"Daily report job scheduled to run every minute ({TIMEZONE})")
+    report_schedule.load()
+    report_schedule.on_change = lambda: _schedule_jobs(job_queue)
+    _schedule_jobs(job_queue)
+    job_queue.run_repeating(worker_heartbeat, interval=WORKER_HEARTBEAT_SECONDS, first=0, name=HEARTBEAT_JOB_NAME)
+
+    now = datetime.datetime.now(pytz.timezone(TIMEZONE))
+    first_warm_up = (60 - now.second - HTTP_WARM_UP_SECONDS) % 60
+    job_queue.run_repeating(warm_up_connections, interval=60, first=first_warm_up, name="warm_up_job")
 
 
 def stop_daily_report_job(job_queue):
-    for job in job_queue.get_jobs_by_name("daily_report_job"):
+    report_schedule.on_change = None
+    for job in job_queue.get_jobs_by_name(REPORT_JOB_NAME):
         job.schedule_removal()
         logger.info("Daily report job stopped")
+    for job in job_queue.get_jobs_by_name(PREFETCH_JOB_NAME):
+        job.schedule_removal()
+    for job in job_queue.get_jobs_by_name(HEARTBEAT_JOB_NAME):
+        job.schedule_removal()
+    for job in job_queue.get_jobs_by_name("warm_up_job"):
+        job.schedule_removal()
 
 
-async def send_daily_reports(context):
-    tz = pytz.timezone(TIMEZONE)
-    now = datetime.datetime.now(tz)
-    current_hour = now.hour
-    current_minute = now.minute
+def _schedule_jobs(job_queue):
+    schedule_next_report(job_queue)
+    schedule_next_prefetch(job_queue)
+
+
+def _schedule_slot_job(job_queue, name, callback, slot, lead=datetime.timedelta(0)):
+    jobs = [job for job in job_queue.get_jobs_by_name(name) if not job.removed]
+    if len(jobs) == 1 and jobs[0].data == slot:
+        return
+    for job in jobs:
+        job.schedule_removal()
+
+    if slot is not None:
+        job_queue.run_once(callback, when=slot - lead, data=slot, name=name)
 
-    session = get_session()
 
+def schedule_next_report(job_queue, after: datetime.datetime | None = None):
+    fire_at = report_schedule.next_fire(after or datetime.datetime.now(pytz.timezone(TIMEZONE)))
+    _schedule_slot_job(job_queue, REPORT_JOB_NAME, send_daily_reports, fire_at)
+
+    if fire_at is None:
+        logger.info("No daily reports scheduled")
+    else:
+        logger.debug(f"Next daily report slot at {fire_at:%Y-%m-%d %H:%M %Z}")
+
+
+def schedule_next_prefetch(job_queue, after: datetime.datetime | None = None):
+    if not REPORT_PREFETCH_ENABLED:
+        return
+
+    lead = datetime.timedelta(seconds=REPORT_PREFETCH_MAX_LEAD_SECONDS)
+    after = after or datetime.datetime.now(pytz.timezone(TIMEZONE))
+    _schedule_slot_job(job_queue, PREFETCH_JOB_NAME, prefetch_statements, report_schedule.next_fire(after + lead), lead)
+
+
+def statement_budget(accounts: int) -> float:
+    """Seconds the statement rate limit of one token needs for a report of that many accounts."""
+    limit = DEFAULT_LIMITS[STATEMENT]
+    calls = max(accounts - limit.burst, 0) + 1
+    return calls * limit.interval + REPORT_PREFETCH_MARGIN_SECONDS
+
+
+def prefetch_lead(accounts: int) -> float:
+    return min(statement_budget(accounts), REPORT_PREFETCH_MAX_LEAD_SECONDS)
+
+
+async def _prefetch_user(user_id: int, token: str, accounts: list[str], from_ts: int, start_at: float) -> None:
+    await asyncio.sleep(max(start_at - time.time(), 0))
     try:
-        stmt = select(User).where(
-            User.is_active,
-            User.has_token,
-            User.report_hour == current_hour,
-            User.report_minute == current_minute,
+        await sync_statements(token, accounts, from_ts, int(time.time()))
+    except (MonobankAPIError, httpx.HTTPError) as e:
+        logger.warning(f"Failed to prefetch statements for user {user_id}: {e}")
+    except Exception as e:
+        # the report still fetches the statements itself, so one user must not end the others' prefetch
+        logger.error(f"Error prefetching statements for user {user_id}: {e}")
+
+
+async def prefetch_statements(context):
+    slot = context.job.data
+    schedule_next_prefetch(context.job_queue, after=slot - datetime.timedelta(seconds=REPORT_PREFETCH_MAX_LEAD_SECONDS))
+
+    shard = worker_registry.shard
+    user_ids = [user_id for user_id in report_schedule.due(slot.hour, slot.minute) if shard.owns(user_id)]
+    if not user_ids:
+        return
+
+    recipients = await run_db(lambda session: list(iter_recipients(session, user_ids, User.webhook_date.is_(None))))
+
+    tokens = await decrypt_tokens((recipient.id, recipient.encrypted_token) for recipient in recipients)
+    users = [(recipient.id, tokens.get(recipient.id), recipient.selected_accounts) for recipient in recipients]
+
+    from_ts = int(slot.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+    fire_ts = slot.timestamp()
+    tasks = [
+        _prefetch_user(user_id, token, accounts, from_ts, fire_ts - prefetch_lead(len(accounts)))
+        for user_id, token, accounts in users
+        if token and accounts
+    ]
+    logger.info(f"Prefetching statements of {len(tasks)} users for {slot:%H:%M} slot")
+    await asyncio.gather(*tasks)
+
+
+async def warm_up_connections(_context):
+    tz = pytz.timezone(TIMEZONE)
+    upcoming = datetime.datetime.now(tz) + datetime.timedelta(seconds=HTTP_WARM_UP_SECONDS)
+
+    shard = worker_registry.shard
+    due_users = sum(shard.owns(user_id) for user_id in report_schedule.due(upcoming.hour, upcoming.minute))
+    if due_users:
+        await http_pool.warm_up(MONOBANK_API_URL, connections=due_users)
+        logger.debug(f"HTTP pool stats before {upcoming:%H:%M} slot: {http_pool.stats}")
+
+
+class ReportOutcome(Enum):
+    SENT = "sent"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    BLOCKED = "blocked"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class TickSummary:
+    slot: datetime.datetime
+    outcomes: Counter = field(default_factory=Counter)
+    latencies: list[float] = field(default_factory=list)
+    duration: float = 0.0
+
+    def percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def __str__(self) -> str:
+        counts = ", ".join(f"{outcome.value}={self.outcomes[outcome]}" for outcome in ReportOutcome)
+        return (
+            f"slot {self.slot:%H:%M}: {counts}, p50={self.percentile(50):.1f}s, p99={self.percentile(99):.1f}s, "
+            f"took {self.duration:.1f}s"
         )
-        users = session.scalars(stmt).all()
 
-        if not users:
+
+class OutboxAcknowledger:
+    """Collects report outcomes and marks them in the outbox.
+
+    Sent reports are marked right away, so a worker that dies mid-tick does not
+    leave delivered reports pending for another worker to send again. Other
+    outcomes are written in batches. Cancelled reports are left pending for the
+    next tick to pick up, and users who blocked the bot are collected so the tick
+    can deactivate them in one update.
+    """
+
+    def __init__(self, batch_size: int = REPORT_OUTBOX_ACK_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.blocked: list[int] = []
+        self._results: list[tuple[OutboxItem, str, datetime.datetime | None]] = []
+
+    async def add(self, item: OutboxItem, outcome: ReportOutcome) -> None:
+        if outcome is ReportOutcome.CANCELLED:
             return
+        if outcome is ReportOutcome.BLOCKED:
+            self.blocked.append(item.user_id)
+
+        delivered_at = datetime.datetime.now(datetime.UTC) if outcome is ReportOutcome.SENT else None
+        self._results.append((item, outcome.value, delivered_at))
+        if outcome is ReportOutcome.SENT or len(self._results) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._results:
+            return
+
+        # reports keep finishing while the batch is written, they go to a fresh buffer
+        results, self._results = self._results, []
+        try:
+            await run_db(acknowledge, results)
+        except BaseException:
+            # also when the tick cancels the report that is being acknowledged
+            self._results = results + self._results
+            raise
+
 
-        logger.info(f"Sending daily reports to {len(users)} users at {current_hour:02d}:{current_minute:02d}")
+async def fan_out_reports(
+    context,
+    deliveries: list[tuple[OutboxItem, ReportRecipient]],
+    slot: datetime.datetime,
+    deadline: datetime.datetime | None = None,
+    concurrency: int = REPORT_CONCURRENCY,
+    timeout: float = REPORT_USER_TIMEOUT_SECONDS,
+    on_result: Callable[[OutboxItem, ReportOutcome], Awaitable[None]] | None = None,
+    tokens: dict[int, str | None] | None = None,
+) -> TickSummary:
+    summary = TickSummary(slot)
+    semaphore = asyncio.Semaphore(concurrency)
+    started_at = time.monotonic()
 
-        for user in users:
-            if not user.selected_accounts:
-                logger.debug(f"User {user.id} has no selected accounts, skipping")
-                continue
+    async def send(item: OutboxItem, user: ReportRecipient) -> ReportOutcome:
+        if not user.selected_accounts:
+            logger.debug(f"User {user.id} has no selected accounts, skipping")
+            return ReportOutcome.SKIPPED
 
+        async with semaphore:
+            user_started_at = time.monotonic()
             try:
-                await send_report_to_user(context, user)
+                async with asyncio.timeout(timeout):
+                    outcome = await send_report_to_user(
+                        context, user, scheduled_for=item.scheduled_for, token=tokens.get(user.id) if tokens else None
+                    )
+            except TimeoutError:
+                logger.warning(f"Report for user {user.id} timed out after {timeout}s")
+                outcome = ReportOutcome.FAILED
             except Exception as e:
                 logger.error(f"Error sending report to user {user.id}: {e}")
-                continue
+                outcome = ReportOutcome.FAILED
+            summary.latencies.append(time.monotonic() - user_started_at)
+            return outcome
 
+    async def run(item: OutboxItem, user: ReportRecipient) -> ReportOutcome:
+        outcome = await send(item, user)
+        summary.outcomes[outcome] += 1
+        if on_result is not None:
+            await on_result(item, outcome)
+        return outcome
+
+    tasks = [asyncio.create_task(run(item, user)) for item, user in deliveries]
+    remaining = (
+        None if deadline is None else max((deadline - datetime.datetime.now(deadline.tzinfo)).total_seconds(), 0)
+    )
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=remaining)
+    else:
+        pending = set()
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Cancelled {len(pending)} reports of slot {slot:%H:%M} at their deadline")
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    summary.outcomes[ReportOutcome.CANCELLED] += len(pending)
+    summary.duration = time.monotonic() - started_at
+    return summary
+
+
+async def _deactivate_blocked(user_ids: list[int]) -> None:
+    if not user_ids:
+        return
+
+    deactivated = await run_db(deactivate_users, user_ids)
+    for user_id in user_ids:
+        report_schedule.remove(user_id)
+    logger.info(f"Deactivated {deactivated} users who blocked the bot")
+
+
+def report_deadline(until: datetime.datetime, accounts: int) -> datetime.datetime | None:
+    """Reports still running at the next slot are cancelled, but not before they had their statement budget."""
+    next_fire = report_schedule.next_fire(until)
+    if next_fire is None:
+        return None
+    return max(next_fire, until + datetime.timedelta(seconds=statement_budget(accounts)))
+
+
+def _claim_pending(
+    session, since: datetime.datetime, until: datetime.datetime, worker_id: str
+) -> tuple[list[OutboxItem], dict[int, ReportRecipient]]:
+    candidates = pending_items(session, since, until, worker_registry.shard)
+    claimed = claim(session, [item.id for item in candidates], worker_id, worker_registry.live_since())
+    items = [item for item in candidates if item.id in claimed]
+    users = {recipient.id: recipient for recipient in iter_recipients(session, {item.user_id for item in items})}
+    return items, users
+
+
+async def dispatch_outbox(context, until: datetime.datetime) -> TickSummary | None:
+    since = until - datetime.timedelta(seconds=REPORT_CATCH_UP_SECONDS)
+    worker_id = worker_registry.worker_id
+    items, users = await run_db(_claim_pending, since, until, worker_id)
+    if not items:
+        return None
+
+    tokens = await decrypt_tokens((user.id, user.encrypted_token) for user in users.values())
+    acknowledger = OutboxAcknowledger(REPORT_OUTBOX_ACK_BATCH_SIZE)
+    deliveries = []
+    for item in items:
+        user = users.get(item.user_id)
+        if user is None:
+            await acknowledger.add(item, ReportOutcome.SKIPPED)
+        else:
+            deliveries.append((item, user))
+
+    logger.info(f"Sending {len(deliveries)} daily reports at {until:%H:%M}")
+    try:
+        summary = await fan_out_reports(
+            context,
+            deliveries,
+            until,
+            deadline=report_deadline(until, max((len(user.selected_accounts) for _, user in deliveries), default=0)),
+            on_result=acknowledger.add,
+            tokens=tokens,
+        )
     finally:
-        session.close()
+        try:
+            await acknowledger.flush()
+        finally:
+            await run_db(release, [item.id for item in items], worker_id)
+        await _deactivate_blocked(acknowledger.blocked)
+
+    logger.info(f"Daily reports {summary}")
+    return summary
+
+
+def _enqueue_slots(session, slots: list[datetime.datetime]) -> int:
+    return sum(enqueue(session, slot, due_users(session, slot)) for slot in slots)
+
+
+async def _enqueue(slots: list[datetime.datetime]) -> int:
+    for attempt in range(2):
+        try:
+            return await run_db(_enqueue_slots, slots)
+        except IntegrityError:
+            # another worker enqueued the same slot concurrently, the retry skips its rows
+            if attempt:
+                raise
+    return 0
 
 
-async def send_report_to_user(context, user: User):
+async def send_daily_reports(context):
+    slot = context.job.data
+    schedule_next_report(context.job_queue, after=slot)
+
+    # the schedule only times the tick: users who moved their report in another
+    # process are enqueued from the database, not from a stale copy of their slot
+    await _enqueue([slot])
+
+    for running_slot, started_at in _running_slots.items():
+        logger.warning(
+            f"Report slot {running_slot:%H:%M} overran: still running after {time.monotonic() - started_at:.0f}s"
+        )
+
+    _running_slots[slot] = time.monotonic()
+    try:
+        summary = await dispatch_outbox(context, slot)
+    finally:
+        del _running_slots[slot]
+
+    if summary is not None and summary.duration > SLOT_SECONDS:
+        logger.warning(f"Report slot {slot:%H:%M} took {summary.duration:.0f}s, longer than its {SLOT_SECONDS}s slot")
+
+
+def _expire_before(session, horizon: datetime.datetime) -> datetime.datetime:
+    expire(session, horizon)
+    return max(last_scheduled(session) or horizon, horizon)
+
+
+async def replay_missed_slots(now: datetime.datetime) -> int:
+    horizon = now - datetime.timedelta(seconds=REPORT_CATCH_UP_SECONDS)
+    watermark = await run_db(_expire_before, horizon)
+
+    slots = []
+    slot = report_schedule.next_fire(watermark)
+    while slot is not None and slot <= now:
+        slots.append(slot)
+        slot = report_schedule.next_fire(slot)
+
+    missed = await _enqueue(slots)
+    if missed:
+        logger.warning(
+            f"Replaying {missed} daily reports missed since {watermark.astimezone(now.tzinfo):%Y-%m-%d %H:%M}"
+        )
+    return missed
+
+
+async def worker_heartbeat(context):
+    now = datetime.datetime.now(pytz.timezone(TIMEZONE))
+    was_leader = worker_registry.is_leader
+    await worker_registry.heartbeat()
+    if worker_registry.is_leader and not was_leader:
+        await replay_missed_slots(now)
+
+    # Picks up reports left pending by a dead worker, a cancelled tick or a replay
+    await dispatch_outbox(context, now)
+
+
+async def send_report_to_user(
+    context, user: ReportRecipient, scheduled_for: datetime.datetime | None = None, token: str | None = None
+) -> ReportOutcome:
     _ = user.translator
+    token = token or user.monobank_token
 
     tz = pytz.timezone(TIMEZONE)
-    now = datetime.datetime.now(tz)
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    # a late report, e.g. one replayed after midnight, still covers the day of its slot
+    report_at = datetime.datetime.now(tz) if scheduled_for is None else scheduled_for.astimezone(tz)
+    start_of_day = report_at.replace(hour=0, minute=0, second=0, microsecond=0)
 
     from_ts = int(start_of_day.timestamp())
-    to_ts = int(now.timestamp())
+    to_ts = int(report_at.timestamp())
 
-    if not user.monobank_token:
+    if not token:
         logger.warning(f"User {user.id} has no monobank token")
-        return
+        return ReportOutcome.SKIPPED
 
     try:
         result = await get_daily_spending(
-            user.monobank_token, user.selected_accounts, from_ts, to_ts, user.language_code or "uk"
+            token,
+            user.selected_accounts,
+            from_ts,
+            to_ts,
+            user.language_code or "uk",
+            push_since=user.webhook_since,
+            rules=await load_user_rules(user.id),
         )
     except MonobankAPIError as e:
         logger.warning(f"Failed to get spending for user {user.id}: {e}")
-        return
+        return ReportOutcome.FAILED
 
-    date_str = now.strftime("%d.%m.%Y")
+    date_str = report_at.strftime("%d.%m.%Y")
 
     text = _("📊 Daily Report for {date}\n\n").format(date=date_str)
 
@@ -106,19 +500,18 @@ async def send_report_to_user(context, user: User):
     text += _("\n\n📱 Transactions: {count}").format(count=result["transaction_count"])
 
     try:
-        await context.bot.send_message(chat_id=user.id, text=text, parse_mode="HTML")
-        logger.info(f"Report sent to user {user.id}")
+        await context.bot.send_message(
+            chat_id=user.id, text=text, parse_mode="HTML", rate_limit_args=Priority.SCHEDULED
+        )
+        if scheduled_for is None:
+            logger.info(f"Report sent to user {user.id}")
+        else:
+            lateness = (datetime.datetime.now(datetime.UTC) - scheduled_for).total_seconds()
+            logger.info(f"Report sent to user {user.id} ({lateness:.1f}s after {scheduled_for:%H:%M})")
+        return ReportOutcome.SENT
     except Forbidden:
         logger.warning(f"User {user.id} blocked the bot")
-        session = get_session()
-        try:
-            with session.begin():
-                stmt = select(User).where(User.id == user.id)
-                db_user = session.scalar(stmt)
-                if db_user:
-                    db_user.deactivate()
-                    session.add(db_user)
-        finally:
-            session.close()
+        return ReportOutcome.BLOCKED
     except BadRequest as e:
         logger.error(f"Failed to send message to user {user.id}: {e}")
+    return ReportOutcome.FAILED
@@ -0,0 +1,49 @@
+import logging
+
+from src.database.configuration import session_stats
+from src.services.rate_limiter import rate_limiter
+from src.services.report_schedule import report_schedule
+from src.services.token_migration import flush_reencrypted_tokens
+from src.services.user_cache import user_cache
+from src.settings import USER_CACHE_SYNC_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL_SECONDS = 60 * 60
+REENCRYPTION_FLUSH_INTERVAL_SECONDS = 60
+
+
+def start_maintenance_job(job_queue):
+    stop_maintenance_job(job_queue)
+
+    job_queue.run_repeating(run_maintenance, interval=MAINTENANCE_INTERVAL_SECONDS, first=60, name="maintenance_job")
+    job_queue.run_repeating(
+        store_reencrypted_tokens, interval=REENCRYPTION_FLUSH_INTERVAL_SECONDS, name="reencryption_job"
+    )
+    job_queue.run_repeating(sync_user_cache, interval=USER_CACHE_SYNC_SECONDS, name="user_cache_job")
+    logger.info("Maintenance job scheduled to run every hour")
+
+
+def stop_maintenance_job(job_queue):
+    for job in job_queue.get_jobs_by_name("maintenance_job"):
+        job.schedule_removal()
+        logger.info("Maintenance job stopped")
+    for job in job_queue.get_jobs_by_name("reencryption_job"):
+        job.schedule_removal()
+    for job in job_queue.get_jobs_by_name("user_cache_job"):
+        job.schedule_removal()
+
+
+async def run_maintenance(_context):
+    await rate_limiter.evict()
+    await report_schedule.reload()
+    logger.info(f"Database sessions: {session_stats.as_dict()}")
+    logger.info(f"User cache: {user_cache.as_dict()}")
+
+
+async def store_reencrypted_tokens(_context):
+    await flush_reencrypted_tokens()
+
+
+async def sync_user_cache(_context):
+    await user_cache.sync()
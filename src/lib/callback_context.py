@@ -1,13 +1,24 @@
+from collections.abc import Awaitable
 from typing import Any
 
 from telegram._bot import BT
-from telegram.ext import Application, CallbackContext
+from telegram.ext import Application, CallbackContext, SimpleUpdateProcessor
 from telegram.ext._utils.types import BD, CD, UD
 
-from src.database.configuration import get_session
+from src.database.configuration import count_update_usage
 from src.database.models import User
 
 
+class UpdateSessionProcessor(SimpleUpdateProcessor):
+    """Processes updates like PTB's default processor and counts the database
+    sessions and connections each update uses through ``run_db``.
+    """
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        with count_update_usage():
+            await coroutine
+
+
 class CustomCallbackContext(CallbackContext[Any, Any, Any, Any]):
     user: User | None
 
@@ -19,9 +30,4 @@ class CustomCallbackContext(CallbackContext[Any, Any, Any, Any]):
     ):
         super().__init__(application, chat_id, user_id)
 
-        self.session = get_session()
         self.user = self.user_data.get("user") if self.user_data is not None else None
-
-    def __del__(self) -> None:
-        self.session.expunge_all()
-        self.session.close()
@@ -1,14 +1,40 @@
+import asyncio
 import base64
 import hashlib
+import hmac
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
 
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
-from src.settings import PROJECT_ROOT
+from src.settings import (
+    PROJECT_ROOT,
+    TOKEN_DECRYPT_CHUNK_SIZE,
+    TOKEN_DECRYPT_PROCESSES,
+    TOKEN_KEY_CACHE_MAX_SIZE,
+    TOKEN_KEY_CACHE_TTL_SECONDS,
+    TOKEN_KEY_DERIVATION_THREADS,
+)
 
 SECRET_KEY_FILE = PROJECT_ROOT / "data" / ".secret_key"
+RETIRED_KEYS_FILE = PROJECT_ROOT / "data" / ".secret_key.retired"
 
+ENVELOPE_VERSION = 2
+KEY_ID_SIZE = 4
 
-def _get_or_create_master_key() -> bytes:
+_master_keys: dict[Path, bytes] = {}
+_keyrings: dict[tuple[Path, Path], dict[bytes, bytes]] = {}
+_master_keys_lock = threading.Lock()
+
+
+def _load_or_create_master_key() -> bytes:
     if SECRET_KEY_FILE.exists():
         return SECRET_KEY_FILE.read_bytes()
 
@@ -18,8 +44,114 @@ def _get_or_create_master_key() -> bytes:
     return key
 
 
-def _derive_user_key(user_id: int) -> bytes:
-    master_key = _get_or_create_master_key()
+def _get_or_create_master_key() -> bytes:
+    key = _master_keys.get(SECRET_KEY_FILE)
+    if key is None:
+        with _master_keys_lock:
+            key = _master_keys.get(SECRET_KEY_FILE)
+            if key is None:
+                key = _master_keys[SECRET_KEY_FILE] = _load_or_create_master_key()
+    return key
+
+
+def key_id(master_key: bytes) -> bytes:
+    return hashlib.sha256(master_key).digest()[:KEY_ID_SIZE]
+
+
+def _load_retired_keys() -> list[bytes]:
+    if not RETIRED_KEYS_FILE.exists():
+        return []
+    return [line.strip() for line in RETIRED_KEYS_FILE.read_bytes().splitlines() if line.strip()]
+
+
+def _keyring() -> dict[bytes, bytes]:
+    keyring = _keyrings.get((SECRET_KEY_FILE, RETIRED_KEYS_FILE))
+    if keyring is None:
+        current = _get_or_create_master_key()
+        with _master_keys_lock:
+            keyring = {key_id(current): current}
+            for master_key in _load_retired_keys():
+                keyring.setdefault(key_id(master_key), master_key)
+            _keyrings[(SECRET_KEY_FILE, RETIRED_KEYS_FILE)] = keyring
+    return keyring
+
+
+def reload_keys() -> None:
+    with _master_keys_lock:
+        _master_keys.clear()
+        _keyrings.clear()
+
+
+def rotate_master_key() -> bytes:
+    current = _get_or_create_master_key()
+    if current not in _load_retired_keys():
+        with RETIRED_KEYS_FILE.open("ab") as retired:
+            retired.write(current + b"\n")
+
+    new_key = Fernet.generate_key()
+    pending = SECRET_KEY_FILE.with_suffix(".new")
+    pending.write_bytes(new_key)
+    pending.replace(SECRET_KEY_FILE)
+    reload_keys()
+    return new_key
+
+
+class DerivedKeyCache:
+    """LRU of legacy per-user Fernet keys, so PBKDF2 runs once per user and TTL.
+
+    Entries are keyed by the master key as well, so replacing the key file never
+    serves a key derived from the old one. Keys are filled from the derivation
+    threads, hence the lock.
+    """
+
+    def __init__(self, max_size: int = TOKEN_KEY_CACHE_MAX_SIZE, ttl: float = TOKEN_KEY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[bytes, int], tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, master_key: bytes, user_id: int) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get((master_key, user_id))
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end((master_key, user_id))
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, master_key: bytes, user_id: int) -> bool:
+        with self._lock:
+            entry = self._entries.get((master_key, user_id))
+            return entry is not None and entry[1] >= time.monotonic()
+
+    def put(self, master_key: bytes, user_id: int, key: bytes) -> None:
+        with self._lock:
+            self._entries[(master_key, user_id)] = (key, time.monotonic() + self.ttl)
+            self._entries.move_to_end((master_key, user_id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[1] == user_id]:
+                del self._entries[cache_key]
+
+    @property
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+key_cache = DerivedKeyCache()
+_derivation_pool = ThreadPoolExecutor(max_workers=TOKEN_KEY_DERIVATION_THREADS, thread_name_prefix="token_kdf")
+
+
+def _pbkdf2_user_key(master_key: bytes, user_id: int) -> bytes:
     derived = hashlib.pbkdf2_hmac(
         "sha256",
         master_key,
@@ -29,18 +161,220 @@ def _derive_user_key(user_id: int) -> bytes:
     return base64.urlsafe_b64encode(derived)
 
 
+def _derive_user_key(user_id: int, master_key: bytes | None = None) -> bytes:
+    master_key = master_key or _get_or_create_master_key()
+    key = key_cache.get(master_key, user_id)
+    if key is None:
+        key = _pbkdf2_user_key(master_key, user_id)
+        key_cache.put(master_key, user_id, key)
+    return key
+
+
+def _hkdf_user_key(master_key: bytes, user_id: int) -> bytes:
+    hkdf = HKDF(algorithm=SHA256(), length=32, salt=None, info=f"monobank-token:{user_id}".encode())
+    return base64.urlsafe_b64encode(hkdf.derive(master_key))
+
+
+def _open_envelope(encrypted_token: str) -> tuple[bytes | None, bytes]:
+    """Returns the key id and the Fernet token; the key id is None for the legacy format."""
+    raw = base64.urlsafe_b64decode(encrypted_token.encode())
+    # Fernet tokens start with 0x80, so the legacy format never starts with the version byte
+    if raw[:1] == bytes([ENVELOPE_VERSION]):
+        return raw[1 : 1 + KEY_ID_SIZE], base64.urlsafe_b64encode(raw[1 + KEY_ID_SIZE :])
+    return None, raw
+
+
+def _envelope_key_id(encrypted_token: str) -> bytes | None:
+    try:
+        return _open_envelope(encrypted_token)[0]
+    except ValueError:
+        return None
+
+
+def is_legacy_token(encrypted_token: str) -> bool:
+    try:
+        return _open_envelope(encrypted_token)[0] is None
+    except ValueError:
+        return False
+
+
+def needs_reencryption(encrypted_token: str) -> bool:
+    try:
+        envelope_key_id = _open_envelope(encrypted_token)[0]
+    except ValueError:
+        return False
+    return envelope_key_id != key_id(_get_or_create_master_key())
+
+
+async def warm_up_user_keys(tokens: Iterable[tuple[int, str | None]]) -> None:
+    master_key = _get_or_create_master_key()
+    cold = {
+        user_id
+        for user_id, encrypted_token in tokens
+        if encrypted_token and is_legacy_token(encrypted_token) and not key_cache.contains(master_key, user_id)
+    }
+    if not cold:
+        return
+
+    # pbkdf2_hmac releases the GIL, so the derivations run in parallel off the event loop
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(_derivation_pool, _derive_user_key, user_id) for user_id in cold))
+
+
+def invalidate_user_key(user_id: int | None = None) -> None:
+    key_cache.invalidate(user_id)
+    if user_id is None:
+        reload_keys()
+
+
+def _encrypt_with(master_key: bytes, token: str, user_id: int) -> str:
+    fernet = Fernet(_hkdf_user_key(master_key, user_id))
+    encrypted = base64.urlsafe_b64decode(fernet.encrypt(token.encode()))
+    return base64.urlsafe_b64encode(bytes([ENVELOPE_VERSION]) + key_id(master_key) + encrypted).decode()
+
+
+def _decrypt_with(keyring: dict[bytes, bytes], encrypted_token: str, user_id: int) -> str | None:
+    envelope_key_id, fernet_token = _open_envelope(encrypted_token)
+    if envelope_key_id is None:
+        for master_key in keyring.values():
+            try:
+                return Fernet(_derive_user_key(user_id, master_key)).decrypt(fernet_token).decode()
+            except Exception:
+                continue
+        return None
+
+    master_key = keyring.get(envelope_key_id)
+    if master_key is None:
+        return None
+    return Fernet(_hkdf_user_key(master_key, user_id)).decrypt(fernet_token).decode()
+
+
 def encrypt_token(token: str, user_id: int) -> str:
-    key = _derive_user_key(user_id)
-    fernet = Fernet(key)
-    encrypted = fernet.encrypt(token.encode())
-    return base64.urlsafe_b64encode(encrypted).decode()
+    return _encrypt_with(_get_or_create_master_key(), token, user_id)
 
 
 def decrypt_token(encrypted_token: str, user_id: int) -> str | None:
     try:
-        key = _derive_user_key(user_id)
-        fernet = Fernet(key)
-        decrypted = fernet.decrypt(base64.urlsafe_b64decode(encrypted_token.encode()))
-        return decrypted.decode()
+        keyring = _keyring()
+        envelope_key_id = _open_envelope(encrypted_token)[0]
+        if envelope_key_id is not None and envelope_key_id not in keyring:
+            # the key was rotated by another process
+            reload_keys()
+            keyring = _keyring()
+        return _decrypt_with(keyring, encrypted_token, user_id)
     except Exception:
         return None
+
+
+class PendingReencryptions:
+    """Tokens re-encrypted on read that still have to be written back to the database."""
+
+    def __init__(self):
+        self._tokens: dict[int, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, old: str, new: str) -> None:
+        with self._lock:
+            self._tokens[user_id] = (self._tokens.get(user_id, (old, new))[0], new)
+
+    def drain(self) -> dict[int, tuple[str, str]]:
+        with self._lock:
+            tokens, self._tokens = self._tokens, {}
+        return tokens
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+
+pending_reencryptions = PendingReencryptions()
+
+
+def _decrypt_chunk(master_keys: list[bytes], items: list[tuple[int, str]]) -> list[tuple[int, str | None, str | None]]:
+    """Decrypts a chunk of tokens in a worker and re-encrypts stale ones with the first key."""
+    keyring = {key_id(master_key): master_key for master_key in master_keys}
+    current = master_keys[0]
+    results = []
+    for user_id, encrypted_token in items:
+        try:
+            token = _decrypt_with(keyring, encrypted_token, user_id)
+        except Exception:
+            results.append((user_id, None, None))
+            continue
+        stale = token is not None and _open_envelope(encrypted_token)[0] != key_id(current)
+        results.append((user_id, token, _encrypt_with(current, token, user_id) if stale else None))
+    return results
+
+
+_decrypt_pool: ProcessPoolExecutor | None = None
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _decrypt_pool
+    if _decrypt_pool is None:
+        _decrypt_pool = ProcessPoolExecutor(
+            max_workers=TOKEN_DECRYPT_PROCESSES or None, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _decrypt_pool
+
+
+def shutdown_decrypt_pool() -> None:
+    global _decrypt_pool
+    if _decrypt_pool is not None:
+        _decrypt_pool.shutdown(cancel_futures=True)
+        _decrypt_pool = None
+
+
+async def decrypt_tokens(
+    items: Iterable[tuple[int, str | None]], chunk_size: int = TOKEN_DECRYPT_CHUNK_SIZE
+) -> dict[int, str | None]:
+    """Decrypts many users' tokens at once without stalling the event loop.
+
+    Legacy tokens need a PBKDF2 derivation each and are spread over a process
+    pool. Current tokens only need HKDF, which is cheaper than shipping them to
+    another process, so their chunks go to the key derivation threads instead.
+    Stale tokens come back re-encrypted and are queued like on a single read.
+    """
+    items = [(user_id, encrypted_token) for user_id, encrypted_token in items if encrypted_token]
+    if not items:
+        return {}
+
+    keyring = _keyring()
+    if any(_envelope_key_id(encrypted_token) not in (None, *keyring) for _, encrypted_token in items):
+        reload_keys()
+        keyring = _keyring()
+    # the current key comes first in the keyring, that is the one stale tokens are re-encrypted with
+    master_keys = list(keyring.values())
+
+    legacy = [item for item in items if is_legacy_token(item[1])]
+    current = [item for item in items if not is_legacy_token(item[1])]
+    loop = asyncio.get_running_loop()
+    pending = [
+        loop.run_in_executor(_process_pool(), _decrypt_chunk, master_keys, legacy[start : start + chunk_size])
+        for start in range(0, len(legacy), chunk_size)
+    ]
+    pending.extend(
+        loop.run_in_executor(_derivation_pool, _decrypt_chunk, master_keys, current[start : start + chunk_size])
+        for start in range(0, len(current), chunk_size)
+    )
+
+    results = []
+    for chunk in await asyncio.gather(*pending):
+        results.extend(chunk)
+
+    encrypted = dict(items)
+    for user_id, _token, reencrypted in results:
+        if reencrypted is not None:
+            pending_reencryptions.add(user_id, encrypted[user_id], reencrypted)
+    return {user_id: token for user_id, token, _reencrypted in results}
+
+
+def webhook_signatures(user_id: int) -> list[str]:
+    return [_webhook_signature(master_key, user_id) for master_key in _keyring().values()]
+
+
+def _webhook_signature(master_key: bytes, user_id: int) -> str:
+    return hmac.new(master_key, f"webhook:{user_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def webhook_signature(user_id: int) -> str:
+    return _webhook_signature(_get_or_create_master_key(), user_id)
@@ -2,12 +2,19 @@ from __future__ import annotations
 
 import gettext
 import logging
+from collections.abc import Callable
 from typing import TYPE_CHECKING
 
 from sqlalchemy import select
+from sqlalchemy.orm import Session
 from telegram import Update
+from telegram import User as TelegramUser
 
+from src.database.configuration import run_db
 from src.database.models import User
+from src.lib.crypto import warm_up_user_keys
+from src.services.report_schedule import report_schedule
+from src.services.user_cache import user_cache
 from src.settings import PROJECT_ROOT
 
 if TYPE_CHECKING:
@@ -42,44 +49,79 @@ def ntranslator(language_code="en"):
     return translation.ngettext
 
 
-async def prepare_user(update: Update, context: CustomCallbackContext, lang: str | None = None) -> User:
-    if context.user_data and context.user_data.get("user", False) and context.user_data.get("_", False):
-        user: User = context.user_data["user"]
-        user.activate()
-        user.save()
-        return user
+def _load_user(session: Session, tuser: TelegramUser, lang: str) -> User:
+    stmt = select(User).where(User.id == tuser.id)
+    user = session.scalar(stmt)
+    if not user:
+        user = User()
+        user.id = tuser.id
+        user.first_name = tuser.first_name
+        user.last_name = tuser.last_name
+        user.username = tuser.username
+        user.language_code = lang
+        session.add(user)
+        session.flush()
+        logger.info(f'New user joined bot: "{user.name}".')
+        user = session.scalar(stmt)
+        if user is None:
+            raise ValueError("Failed to get user from database")
+    session.expunge(user)
+    return user
+
+
+def _update_user(session: Session, user_id: int, change: Callable[[User], None], pending: dict) -> User:
+    user = session.scalar(select(User).where(User.id == user_id))
+    for key, value in pending.items():
+        setattr(user, key, value)
+    change(user)
+    session.flush()
+    session.expunge(user)
+    return user
+
+
+async def update_user(context: CustomCallbackContext, change: Callable[[User], None]) -> User:
+    """Applies ``change`` to the stored copy of the context's user right away, with its cached pending changes."""
+    user_id = context.user_data["user"].id
+    pending = user_cache.take(user_id)
+    try:
+        user = await run_db(_update_user, user_id, change, pending)
+    except Exception:
+        user_cache.restore(user_id, pending)
+        raise
+    user.reencrypt_if_stale()
+    context.user_data["user"] = user_cache.put(user)
+    return user
+
 
+def change_user(context: CustomCallbackContext, **values) -> User:
+    """Sets profile columns of the context's user in the user cache, which writes them behind."""
+    user = context.user_data["user"]
+    user = user_cache.get(user.id) or user_cache.put(user)
+    user_cache.update(user, **values)
+    context.user_data["user"] = user
+    return user
+
+
+async def prepare_user(update: Update, context: CustomCallbackContext, lang: str | None = None) -> User:
     tuser = update.effective_user
     if tuser is None:
         raise ValueError("No effective user in update")
 
-    with context.session.begin():
-        stmt = select(User).where(User.id == tuser.id)
-        user = context.session.scalar(stmt)
+    user = user_cache.get(tuser.id)
+    loaded = user is None
+    if loaded:
         if lang is None:
             lang = tuser.language_code if tuser.language_code else "uk"
+        user = user_cache.put(await run_db(_load_user, tuser, lang))
 
-        if not user:
-            user = User()
-            user.id = tuser.id
-            user.first_name = tuser.first_name
-            user.last_name = tuser.last_name
-            user.username = tuser.username
-            user.language_code = lang
-            logger.info(f'New user joined bot: "{user.name}".')
-
-        user.first_name = tuser.first_name
-        user.last_name = tuser.last_name
-        user.username = tuser.username
-        user.activate()
-
-        context.session.add(user)
-        context.session.flush()
-        user = context.session.scalar(stmt)
-        if user is None:
-            raise ValueError("Failed to get user from database")
-        context.session.expunge(user)
-
+    # nothing is written unless the profile changed or the user had blocked the bot
+    user_cache.update(
+        user, first_name=tuser.first_name, last_name=tuser.last_name, username=tuser.username, block_date=None
+    )
+    report_schedule.sync_user(user)
+    await warm_up_user_keys([(user.id, user.encrypted_token)])
+    if loaded:
+        user.reencrypt_if_stale()
     if context.user_data is not None:
         context.user_data["user"] = user
     context.user = user
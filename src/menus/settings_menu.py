@@ -1,14 +1,20 @@
+import datetime
 from enum import Enum
 
-from sqlalchemy import select
+import httpx
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import BaseHandler, CallbackQueryHandler, MessageHandler, filters
 
 from src.database.models import User
 from src.lib.basemenu import BaseMenu
-from src.lib.helpers import group_buttons
+from src.lib.crypto import invalidate_user_key
+from src.lib.helpers import change_user, group_buttons, update_user
 from src.lib.messages import delete_user_message, send_or_edit
+from src.services.client_info_cache import client_info_cache
 from src.services.monobank import MonobankAPIError, MonobankService, format_account_name
+from src.services.report_schedule import report_schedule
+from src.services.webhook import webhook_url
+from src.settings import WEBHOOK_ENABLED
 
 
 class States(Enum):
@@ -142,15 +148,23 @@ class SettingsMenu(BaseMenu):
             await send_or_edit(context, chat_id=user.id, text=text, reply_markup=InlineKeyboardMarkup(buttons))
             return self.States.WAITING_TOKEN
 
-        with context.session.begin():
-            stmt = select(User).where(User.id == user.id)
-            db_user = context.session.scalar(stmt)
+        webhook_date = None
+        if WEBHOOK_ENABLED:
+            try:
+                await service.set_webhook(webhook_url(user.id))
+                webhook_date = datetime.datetime.now(datetime.UTC)
+            except (MonobankAPIError, httpx.HTTPError) as e:
+                self.logger.warning(f"Failed to register Monobank webhook for user {user.id}: {e}")
+
+        def save_token(db_user: User) -> None:
+            if db_user.monobank_token and db_user.monobank_token != token:
+                client_info_cache.invalidate(db_user.monobank_token)
             db_user.monobank_token = token
             db_user.selected_accounts = []
-            context.session.add(db_user)
-            context.session.flush()
-            context.session.expunge(db_user)
-            context.user_data["user"] = db_user
+            db_user.webhook_date = webhook_date
+
+        db_user = await update_user(context, save_token)
+        report_schedule.sync_user(db_user)
 
         text = _("✅ Token saved successfully!\n\nNow select accounts to track.")
         buttons = [
@@ -165,15 +179,16 @@ class SettingsMenu(BaseMenu):
         user = context.user_data["user"]
         _ = user.translator
 
-        with context.session.begin():
-            stmt = select(User).where(User.id == user.id)
-            db_user = context.session.scalar(stmt)
+        def drop_token(db_user: User) -> None:
+            if db_user.monobank_token:
+                client_info_cache.invalidate(db_user.monobank_token)
             db_user.monobank_token = None
             db_user.selected_accounts = []
-            context.session.add(db_user)
-            context.session.flush()
-            context.session.expunge(db_user)
-            context.user_data["user"] = db_user
+            db_user.webhook_date = None
+
+        db_user = await update_user(context, drop_token)
+        report_schedule.sync_user(db_user)
+        invalidate_user_key(db_user.id)
 
         if update.callback_query:
             await update.callback_query.answer(_("Token removed"))
@@ -206,12 +221,12 @@ class SettingsMenu(BaseMenu):
             return self.States.DEFAULT
 
         context.user_data[self.menu_name]["accounts"] = accounts
+        # toggles only change this draft, the selection is stored once on save
+        selected = context.user_data[self.menu_name]["selected"] = list(user.selected_accounts)
 
         text = _("💳 <b>Select accounts</b>\n\nTap to toggle selection:")
 
         buttons = []
-        selected = user.selected_accounts
-
         for account in accounts:
             account_id = account.get("id")
             account_name = format_account_name(account)
@@ -234,26 +249,15 @@ class SettingsMenu(BaseMenu):
         _ = user.translator
 
         account_id = update.callback_query.data.replace("toggle_account_", "")
-
-        selected = list(user.selected_accounts)
+        accounts = context.user_data[self.menu_name].get("accounts", [])
+        selected = context.user_data[self.menu_name].setdefault("selected", list(user.selected_accounts))
         if account_id in selected:
             selected.remove(account_id)
         else:
             selected.append(account_id)
 
-        with context.session.begin():
-            stmt = select(User).where(User.id == user.id)
-            db_user = context.session.scalar(stmt)
-            db_user.selected_accounts = selected
-            context.session.add(db_user)
-            context.session.flush()
-            context.session.expunge(db_user)
-            context.user_data["user"] = db_user
-
         await update.callback_query.answer()
 
-        accounts = context.user_data[self.menu_name].get("accounts", [])
-
         text = _("💳 <b>Select accounts</b>\n\nTap to toggle selection:")
 
         buttons = []
@@ -278,13 +282,22 @@ class SettingsMenu(BaseMenu):
         user = context.user_data["user"]
         _ = user.translator
 
-        count = len(user.selected_accounts)
-        if count > 0:
-            await update.callback_query.answer(_("{count} account(s) saved").format(count=count))
-        else:
+        selected = context.user_data[self.menu_name].get("selected", user.selected_accounts)
+        count = len(selected)
+        if count == 0:
             await update.callback_query.answer(_("No accounts selected"), show_alert=True)
             return self.States.SELECT_ACCOUNTS
 
+        if selected != user.selected_accounts:
+            accounts = {account.get("id"): account for account in context.user_data[self.menu_name].get("accounts", [])}
+
+            def save_selection(db_user: User) -> None:
+                db_user.select_accounts([accounts.get(account_id, {"id": account_id}) for account_id in selected])
+
+            await update_user(context, save_selection)
+
+        await update.callback_query.answer(_("{count} account(s) saved").format(count=count))
+
         await self.send_message(context)
         return self.States.DEFAULT
 
@@ -349,15 +362,12 @@ class SettingsMenu(BaseMenu):
         minute = int(update.callback_query.data.replace("set_minute_", ""))
         hour = context.user_data[self.menu_name].get("selected_hour", user.report_hour)
 
-        with context.session.begin():
-            stmt = select(User).where(User.id == user.id)
-            db_user = context.session.scalar(stmt)
+        def set_report_time(db_user: User) -> None:
             db_user.report_hour = hour
             db_user.report_minute = minute
-            context.session.add(db_user)
-            context.session.flush()
-            context.session.expunge(db_user)
-            context.user_data["user"] = db_user
+
+        user = await update_user(context, set_report_time)
+        report_schedule.sync_user(user)
 
         await update.callback_query.answer(_("Report time set to {time}").format(time=f"{hour:02d}:{minute:02d}"))
 
@@ -391,19 +401,7 @@ class SettingsMenu(BaseMenu):
 
         language_code = update.callback_query.data.replace("set_language_", "")
 
-        if user.language_code != language_code:
-            with context.session.begin():
-                stmt = select(User).where(User.id == user.id)
-                db_user = context.session.scalar(stmt)
-                db_user.language_code = language_code
-                context.session.add(db_user)
-
-            # Re-fetch outside transaction to get fresh object
-            with context.session.begin():
-                stmt = select(User).where(User.id == user.id)
-                user = context.session.scalar(stmt)
-                context.session.expunge(user)
-                context.user_data["user"] = user
+        user = change_user(context, language_code=language_code)
 
         _ = user.translator
         language_name = next((name for code, name in SUPPORTED_LANGUAGES if code == language_code), language_code)
@@ -9,7 +9,9 @@ from src.lib.basemenu import BaseMenu
 from src.lib.helpers import format_money, prepare_user
 from src.lib.messages import delete_interface, delete_user_message, send_or_edit
 from src.menus.settings_menu import SettingsMenu
+from src.services.categorization import load_user_rules
 from src.services.monobank import MonobankAPIError, get_daily_spending
+from src.services.scheduler import Priority
 from src.settings import TIMEZONE
 
 
@@ -76,7 +78,14 @@ class StartMenu(BaseMenu):
 
         try:
             result = await get_daily_spending(
-                user.monobank_token, user.selected_accounts, from_ts, to_ts, user.language_code or "uk"
+                user.monobank_token,
+                user.selected_accounts,
+                from_ts,
+                to_ts,
+                user.language_code or "uk",
+                priority=Priority.INTERACTIVE,
+                push_since=user.webhook_since,
+                rules=await load_user_rules(user.id),
             )
 
             date_str = now.strftime("%d.%m.%Y")
@@ -0,0 +1,179 @@
+from array import array
+from collections.abc import Iterable, Sequence
+
+from src.services.categorization import MCC_SPACE, Categorizer, get_category_name
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TransactionBatch:
+    """Columnar batch of transactions of one or many users.
+
+    Every column is a compact typed array, so the whole batch can be categorized and
+    summed in one vectorized pass (numpy when installed, a plain loop otherwise).
+    """
+
+    __slots__ = (
+        "amounts",
+        "mccs",
+        "times",
+        "account_idx",
+        "user_idx",
+        "description_idx",
+        "accounts",
+        "users",
+        "descriptions",
+        "_account_index",
+        "_user_index",
+        "_description_index",
+    )
+
+    def __init__(self):
+        self.amounts = array("q")
+        self.mccs = array("i")
+        self.times = array("q")
+        self.account_idx = array("I")
+        self.user_idx = array("I")
+        self.description_idx = array("I")
+        self.accounts: list[str] = []
+        self.users: list[int] = []
+        self.descriptions: list[str | None] = [None]
+        self._account_index: dict[str, int] = {}
+        self._user_index: dict[int, int] = {}
+        self._description_index: dict[str | None, int] = {None: 0}
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def add_user(self, user_id: int) -> int:
+        index = self._user_index.get(user_id)
+        if index is None:
+            index = self._user_index[user_id] = len(self.users)
+            self.users.append(user_id)
+        return index
+
+    def _account(self, account_id: str) -> int:
+        index = self._account_index.get(account_id)
+        if index is None:
+            index = self._account_index[account_id] = len(self.accounts)
+            self.accounts.append(account_id)
+        return index
+
+    def _description(self, description: str | None) -> int:
+        index = self._description_index.get(description)
+        if index is None:
+            index = self._description_index[description] = len(self.descriptions)
+            self.descriptions.append(description)
+        return index
+
+    def append(
+        self, user_id: int, account_id: str, amount: int, mcc: int, time: int, description: str | None = None
+    ) -> None:
+        self.amounts.append(amount)
+        self.mccs.append(mcc)
+        self.times.append(time)
+        self.account_idx.append(self._account(account_id))
+        self.user_idx.append(self.add_user(user_id))
+        self.description_idx.append(self._description(description))
+
+    def extend(self, user_id: int, rows: Iterable[tuple[str, int, int, int, str | None]]) -> None:
+        for account_id, amount, mcc, time, description in rows:
+            self.append(user_id, account_id, amount, mcc, time, description)
+
+    def aggregate(
+        self, categorizers: Sequence[Categorizer], languages: Sequence[str], vectorized: bool | None = None
+    ) -> list[dict]:
+        if vectorized is None:
+            vectorized = np is not None
+        if vectorized and np is None:
+            raise RuntimeError("numpy is not installed")
+
+        sums = self._sum_vectorized(categorizers) if vectorized else self._sum_python(categorizers)
+        return [
+            _format_result(spending, income, count, language)
+            for (spending, income, count), language in zip(sums, languages)
+        ]
+
+    def _description_categories(self, categorizer: Categorizer) -> list[str | None]:
+        if not categorizer.has_patterns:
+            return [None] * len(self.descriptions)
+        return [categorizer.match_pattern(d) if d else None for d in self.descriptions]
+
+    def _sum_python(self, categorizers: Sequence[Categorizer]) -> list[tuple[dict[str, int], int, int]]:
+        spending: list[dict[str, int]] = [{} for _ in self.users]
+        income = [0] * len(self.users)
+        counts = [0] * len(self.users)
+        pattern_categories = {id(c): self._description_categories(c) for c in categorizers}
+
+        for amount, mcc, user, description in zip(self.amounts, self.mccs, self.user_idx, self.description_idx):
+            counts[user] += 1
+            if amount >= 0:
+                income[user] += amount
+                continue
+
+            categorizer = categorizers[user]
+            category = pattern_categories[id(categorizer)][description]
+            if category is None:
+                category = categorizer.categories[categorizer.table[mcc]] if 0 <= mcc < MCC_SPACE else "other"
+            user_spending = spending[user]
+            user_spending[category] = user_spending.get(category, 0) - amount
+
+        return list(zip(spending, income, counts))
+
+    def _sum_vectorized(self, categorizers: Sequence[Categorizer]) -> list[tuple[dict[str, int], int, int]]:
+        assert np is not None
+        n_users = len(self.users)
+        amounts = np.frombuffer(self.amounts, dtype=np.int64)
+        mccs = np.frombuffer(self.mccs, dtype=np.int32)
+        users = np.frombuffer(self.user_idx, dtype=np.uint32).astype(np.intp)
+        descriptions = np.frombuffer(self.description_idx, dtype=np.uint32)
+
+        spend = amounts < 0
+        counts = np.bincount(users, minlength=n_users)
+        income = np.bincount(users[~spend], weights=amounts[~spend], minlength=n_users)
+
+        spending: list[dict[str, int]] = [{} for _ in range(n_users)]
+        in_range = (mccs >= 0) & (mccs < MCC_SPACE)
+        safe_mccs = np.where(in_range, mccs, 0)
+
+        groups: dict[int, list[int]] = {}
+        for user, categorizer in enumerate(categorizers[:n_users]):
+            groups.setdefault(id(categorizer), []).append(user)
+
+        for user_group in groups.values():
+            categorizer = categorizers[user_group[0]]
+            mask = spend & np.isin(users, user_group) if len(groups) > 1 else spend
+
+            table = np.frombuffer(categorizer.table, dtype=np.uint16)
+            categories = np.where(in_range[mask], table[safe_mccs[mask]], 0).astype(np.intp)
+            if categorizer.has_patterns:
+                lookup = {name: i for i, name in enumerate(categorizer.categories)}
+                matched = [lookup.get(c, -1) if c else -1 for c in self._description_categories(categorizer)]
+                overrides = np.asarray(matched, dtype=np.int64)[descriptions[mask]]
+                categories = np.where(overrides >= 0, overrides, categories)
+
+            n_categories = len(categorizer.categories)
+            keys = users[mask] * n_categories + categories
+            totals = np.bincount(keys, weights=-amounts[mask], minlength=n_users * n_categories)
+            for key in np.flatnonzero(totals):
+                user, category = divmod(int(key), n_categories)
+                spending[user][categorizer.categories[category]] = int(totals[key])
+
+        return [(spending[user], int(income[user]), int(counts[user])) for user in range(n_users)]
+
+
+def _format_result(spending_by_category: dict[str, int], total_income: int, count: int, language: str) -> dict:
+    categories_formatted = []
+    for category_key, amount in sorted(spending_by_category.items(), key=lambda x: (-x[1], x[0])):
+        category_name = get_category_name(category_key, language)
+        categories_formatted.append({"key": category_key, "name": category_name, "amount": amount})
+
+    return {
+        "total_spending": sum(spending_by_category.values()),
+        "total_income": total_income,
+        "categories": categories_formatted,
+        "transaction_count": count,
+    }
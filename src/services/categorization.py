@@ -0,0 +1,284 @@
+import logging
+import re
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.database.models import UserCategoryRule
+
+try:
+    # private modules that were renamed before (sre_parse became re._parser in 3.11)
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    sre_constants = sre_parse = None
+
+logger = logging.getLogger(__name__)
+
+MCC_SPACE = 10000
+OTHER = "other"
+MAX_PATTERN_LENGTH = 100
+MAX_DESCRIPTION_LENGTH = 256
+_REPEAT_CHARS = re.compile(r"(?<!\\)[*+{]")
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+MCC_CATEGORIES = {
+    "groceries": {
+        "name_uk": "🛒 Продукти",
+        "name_en": "🛒 Groceries",
+        "codes": [5411, 5412, 5422, 5441, 5451, 5462, 5499],
+    },
+    "restaurants": {
+        "name_uk": "🍔 Ресторани та кафе",
+        "name_en": "🍔 Restaurants & Cafes",
+        "codes": [5812, 5813, 5814],
+    },
+    "transport": {
+        "name_uk": "🚗 Транспорт",
+        "name_en": "🚗 Transport",
+        "codes": [4111, 4112, 4121, 4131, 4411, 4511, 4784, 5541, 5542, 5172, 7512, 7523],
+    },
+    "entertainment": {
+        "name_uk": "🎬 Розваги",
+        "name_en": "🎬 Entertainment",
+        "codes": [7832, 7841, 7911, 7922, 7929, 7932, 7933, 7941, 7991, 7992, 7993, 7994, 7995, 7996, 7997, 7998, 7999],
+    },
+    "health": {
+        "name_uk": "💊 Здоров'я",
+        "name_en": "💊 Health",
+        "codes": [5122, 5292, 5912, 5975, 5976, 5977, 8011, 8021, 8031, 8041, 8042, 8043, 8049, 8050, 8062, 8071, 8099],
+    },
+    "clothing": {
+        "name_uk": "👕 Одяг та взуття",
+        "name_en": "👕 Clothing & Shoes",
+        "codes": [5611, 5621, 5631, 5641, 5651, 5661, 5681, 5691, 5699, 5931, 5932, 5948],
+    },
+    "utilities": {
+        "name_uk": "🏠 Комунальні послуги",
+        "name_en": "🏠 Utilities",
+        "codes": [4814, 4816, 4821, 4899, 4900],
+    },
+    "electronics": {
+        "name_uk": "📱 Електроніка",
+        "name_en": "📱 Electronics",
+        "codes": [5045, 5046, 5065, 5722, 5732, 5733, 5734, 5735],
+    },
+    "education": {
+        "name_uk": "📚 Освіта",
+        "name_en": "📚 Education",
+        "codes": [5111, 5192, 5942, 5943, 5994, 8211, 8220, 8241, 8244, 8249, 8299],
+    },
+    "transfers": {
+        "name_uk": "💸 Перекази",
+        "name_en": "💸 Transfers",
+        "codes": [4829, 6010, 6011, 6012, 6051, 6211, 6300, 6540],
+    },
+    "other": {
+        "name_uk": "📦 Інше",
+        "name_en": "📦 Other",
+        "codes": [],
+    },
+}
+
+
+@dataclass(frozen=True)
+class CategoryRule:
+    category: str
+    mcc_from: int | None = None
+    mcc_to: int | None = None
+    pattern: str | None = None
+
+
+class Categorizer:
+    def __init__(
+        self,
+        categories: tuple[str, ...],
+        table: array,
+        matcher: re.Pattern | None = None,
+        pattern_categories: tuple[int, ...] = (),
+        matchers: tuple[re.Pattern, ...] = (),
+    ):
+        self.categories = categories
+        self.table = table
+        self.matcher = matcher
+        self.pattern_categories = pattern_categories
+        # used one by one when the patterns could not be combined into ``matcher``
+        self.matchers = matchers
+
+    @property
+    def has_patterns(self) -> bool:
+        return self.matcher is not None or bool(self.matchers)
+
+    def match_pattern(self, description: str) -> str | None:
+        description = description[:MAX_DESCRIPTION_LENGTH]
+        if self.matcher is None:
+            for i, matcher in enumerate(self.matchers):
+                if matcher.search(description):
+                    return self.categories[self.pattern_categories[i]]
+            return None
+
+        match = self.matcher.search(description)
+        if match is None:
+            return None
+
+        group = match.lastgroup
+        if group is None or not group.startswith("_p"):
+            group = next(
+                name for name, value in match.groupdict().items() if name.startswith("_p") and value is not None
+            )
+        return self.categories[self.pattern_categories[int(group[2:])]]
+
+    def categorize(self, mcc: int, description: str | None = None) -> str:
+        if self.has_patterns and description:
+            category = self.match_pattern(description)
+            if category is not None:
+                return category
+
+        if 0 <= mcc < MCC_SPACE:
+            return self.categories[self.table[mcc]]
+        return OTHER
+
+
+def _nested_repeat(parsed, repeated: bool = False) -> bool:
+    assert sre_constants is not None
+    repeats = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, sre_constants.POSSESSIVE_REPEAT)
+    for op, av in parsed:
+        if op in repeats:
+            low, high, sub = av
+            if repeated and high > 1:
+                return True
+            if _nested_repeat(sub, repeated or high > 1):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _nested_repeat(av[-1], repeated):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_nested_repeat(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _nested_repeat(av[1], repeated):
+                return True
+        elif op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+    return False
+
+
+def _looks_nested(pattern: str) -> bool:
+    """Textual stand-in for _nested_repeat that errs on the side of rejecting a pattern."""
+    if _BACKREFERENCE.search(pattern):
+        return True
+    starts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif char == "(":
+            starts.append(i)
+        elif char == ")" and starts:
+            start = starts.pop()
+            if pattern[i + 1 : i + 2] in ("*", "+", "{") and _REPEAT_CHARS.search(pattern, start + 1, i):
+                return True
+        i += 1
+    return False
+
+
+def check_pattern(pattern: str) -> None:
+    """Raises ValueError for a description pattern that is invalid or could backtrack catastrophically."""
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"Pattern is longer than {MAX_PATTERN_LENGTH} characters")
+    try:
+        if sre_parse is None:
+            re.compile(pattern)
+            nested = _looks_nested(pattern)
+        else:
+            nested = _nested_repeat(sre_parse.parse(pattern))
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e}") from e
+    # repeats inside repeats, like (a+)+, and backreferences make matching time exponential
+    if nested:
+        raise ValueError("Pattern nests repetitions or uses backreferences")
+
+
+def _builtin_rules() -> tuple[CategoryRule, ...]:
+    rules = []
+    for category_key, category_data in MCC_CATEGORIES.items():
+        for code in category_data["codes"]:
+            rules.append(CategoryRule(category_key, code, code))
+    return tuple(rules)
+
+
+BUILTIN_RULES = _builtin_rules()
+
+
+@lru_cache(maxsize=256)
+def compile_rules(rules: tuple[CategoryRule, ...] = ()) -> Categorizer:
+    categories = [OTHER]
+    index = {OTHER: 0}
+
+    def category_index(category: str) -> int:
+        if category not in index:
+            index[category] = len(categories)
+            categories.append(category)
+        return index[category]
+
+    table = array("H", [0]) * MCC_SPACE
+    patterns = []
+    for rule in BUILTIN_RULES + rules:
+        if rule.pattern:
+            try:
+                check_pattern(rule.pattern)
+            except ValueError as e:
+                logger.warning(f"Skipping category pattern {rule.pattern!r}: {e}")
+                continue
+            patterns.append((rule.pattern, category_index(rule.category)))
+            continue
+
+        mcc_from = max(rule.mcc_from or 0, 0)
+        mcc_to = min(rule.mcc_to if rule.mcc_to is not None else mcc_from, MCC_SPACE - 1)
+        value = category_index(rule.category)
+        for mcc in range(mcc_from, mcc_to + 1):
+            table[mcc] = value
+
+    matcher = None
+    matchers: tuple[re.Pattern, ...] = ()
+    patterns.reverse()
+    if patterns:
+        try:
+            matcher = re.compile(
+                "|".join(f"(?P<_p{i}>{pattern})" for i, (pattern, _) in enumerate(patterns)), re.IGNORECASE
+            )
+        except re.error as e:
+            # patterns valid on their own can still clash once combined, e.g. by reusing a group name
+            logger.warning(f"Matching {len(patterns)} category patterns one by one: {e}")
+            matchers = tuple(re.compile(pattern, re.IGNORECASE) for pattern, _ in patterns)
+
+    logger.debug(f"Compiled {len(BUILTIN_RULES) + len(rules)} category rules into {len(categories)} categories")
+    return Categorizer(tuple(categories), table, matcher, tuple(value for _, value in patterns), matchers)
+
+
+def _user_rules(session: Session, user_id: int) -> tuple[CategoryRule, ...]:
+    stmt = select(UserCategoryRule).where(UserCategoryRule.user_id == user_id).order_by(UserCategoryRule.id)
+    return tuple(
+        CategoryRule(rule.category, rule.mcc_from, rule.mcc_to, rule.pattern) for rule in session.scalars(stmt)
+    )
+
+
+async def load_user_rules(user_id: int) -> tuple[CategoryRule, ...]:
+    return await run_db(_user_rules, user_id)
+
+
+def get_category_for_mcc(mcc: int) -> str:
+    return compile_rules().categorize(mcc)
+
+
+def get_category_name(category_key: str, language: str = "uk") -> str:
+    if category_key not in MCC_CATEGORIES:
+        return category_key
+    category = MCC_CATEGORIES[category_key]
+    name = category.get(f"name_{language}", category.get("name_en", "Other"))
+    return str(name)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import httpx
+
+from src.services.rate_limiter import token_key
+from src.settings import CLIENT_INFO_CACHE_MAX_SIZE, CLIENT_INFO_CACHE_MAX_STALE_SECONDS, CLIENT_INFO_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    value: dict
+    fetched_at: float
+
+
+def _is_transient(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    return isinstance(error, httpx.HTTPError) or status_code == 429 or (status_code or 0) >= 500
+
+
+class ClientInfoCache:
+    """Per-token cache of ``/personal/client-info`` responses.
+
+    Concurrent misses for one token share a single request, and a stale entry is
+    served instead of raising while Monobank throttles the token or is unavailable.
+    """
+
+    def __init__(
+        self,
+        ttl: float = CLIENT_INFO_CACHE_TTL_SECONDS,
+        max_stale: float = CLIENT_INFO_CACHE_MAX_STALE_SECONDS,
+        max_size: int = CLIENT_INFO_CACHE_MAX_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_size = max_size
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+
+    def _store(self, key: str, value: dict) -> None:
+        self._entries[key] = _Entry(value, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, token: str, fetch: Callable[[], Awaitable[dict]], max_age: float | None = None) -> dict:
+        key = token_key(token)
+        max_age = self.ttl if max_age is None else max_age
+
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.fetched_at < max_age:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+        except Exception as e:
+            entry = self._entries.get(key)
+            if entry is None or not _is_transient(e) or time.time() - entry.fetched_at > self.max_stale:
+                future.set_exception(e)
+                future.exception()
+                raise
+
+            self.stale += 1
+            logger.warning(f"Serving client info cached {time.time() - entry.fetched_at:.0f}s ago: {e}")
+            value = entry.value
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            self._store(key, value)
+        finally:
+            self._in_flight.pop(key, None)
+
+        future.set_result(value)
+        return value
+
+    def age(self, token: str) -> float | None:
+        entry = self._entries.get(token_key(token))
+        return None if entry is None else time.time() - entry.fetched_at
+
+    def invalidate(self, token: str) -> None:
+        self._entries.pop(token_key(token), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+        }
+
+
+client_info_cache = ClientInfoCache()
@@ -0,0 +1,140 @@
+import codecs
+import json
+import sys
+from collections.abc import AsyncIterable, Iterator
+
+from src.settings import STATEMENT_JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StatementRecord:
+    __slots__ = ("id", "time", "amount", "mcc", "hold", "description", "balance")
+
+    def __init__(
+        self,
+        id: str,
+        time: int,
+        amount: int = 0,
+        mcc: int = 0,
+        hold: bool = False,
+        description: str | None = None,
+        balance: int | None = None,
+    ):
+        self.id = id
+        self.time = time
+        self.amount = amount
+        self.mcc = mcc
+        self.hold = hold
+        self.description = description
+        self.balance = balance
+
+    @classmethod
+    def from_dict(cls, item: dict) -> "StatementRecord":
+        description = item.get("description")
+        return cls(
+            item["id"],
+            item["time"],
+            item.get("amount", 0),
+            item.get("mcc", 0),
+            item.get("hold", False),
+            sys.intern(description) if description else None,
+            item.get("balance"),
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, StatementRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"StatementRecord(id={self.id!r}, time={self.time}, amount={self.amount}, mcc={self.mcc})"
+
+
+class JSONArrayStream:
+    """Incrementally decodes the items of a top-level JSON array from text chunks."""
+
+    _whitespace = " \t\r\n"
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self.finished = False
+
+    def feed(self, text: str) -> Iterator[dict]:
+        buffer = self._buffer + text
+        pos = 0
+        size = len(buffer)
+
+        while not self.finished:
+            while pos < size and (buffer[pos] in self._whitespace or (self._started and buffer[pos] == ",")):
+                pos += 1
+            if pos >= size:
+                break
+
+            if not self._started:
+                if buffer[pos] != "[":
+                    raise ValueError("Statement response is not a JSON array")
+                self._started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                self.finished = True
+                pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
+            pos = end
+            yield item
+
+        self._buffer = buffer[pos:]
+
+    def close(self) -> None:
+        if not self.finished or self._buffer.strip():
+            raise ValueError("Incomplete statement response")
+
+
+async def _decode_streaming(chunks: AsyncIterable[bytes]) -> list[StatementRecord]:
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    stream = JSONArrayStream()
+    records = []
+
+    async for chunk in chunks:
+        records.extend(StatementRecord.from_dict(item) for item in stream.feed(text_decoder.decode(chunk)))
+    records.extend(StatementRecord.from_dict(item) for item in stream.feed(text_decoder.decode(b"", final=True)))
+    stream.close()
+    return records
+
+
+async def _decode_orjson(chunks: AsyncIterable[bytes]) -> list[StatementRecord]:
+    assert orjson is not None
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+
+    items = orjson.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Statement response is not a JSON array")
+    return [StatementRecord.from_dict(item) for item in items]
+
+
+def _use_orjson(backend: str) -> bool:
+    if backend == "orjson" and orjson is None:
+        raise RuntimeError("orjson is not installed")
+    return backend == "orjson" or (backend == "auto" and orjson is not None)
+
+
+async def decode_statement(
+    chunks: AsyncIterable[bytes], backend: str = STATEMENT_JSON_BACKEND
+) -> list[StatementRecord]:
+    if _use_orjson(backend):
+        return await _decode_orjson(chunks)
+    return await _decode_streaming(chunks)
@@ -0,0 +1,111 @@
+import asyncio
+import importlib.util
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import httpx
+
+from src.settings import (
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientPool:
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        http2: bool = HTTP2_ENABLED,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and _http2_available()
+        self._client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.connections_opened = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            logger.debug(f"HTTP client pool opened (http2={self.http2})")
+        return self._client
+
+    async def _trace(self, event_name: str, _info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        extensions = kwargs.pop("extensions", {})
+        extensions.setdefault("trace", self._trace)
+        self.requests += 1
+        return await self.client.request(method, url, extensions=extensions, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        extensions = kwargs.pop("extensions", {})
+        extensions.setdefault("trace", self._trace)
+        self.requests += 1
+        async with self.client.stream(method, url, extensions=extensions, **kwargs) as response:
+            yield response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def warm_up(self, url: str, connections: int = 1) -> int:
+        connections = max(1, min(connections, self.limits.max_keepalive_connections or 1))
+
+        async def _touch():
+            try:
+                await self.request("HEAD", url)
+                return True
+            except httpx.HTTPError as e:
+                logger.debug(f"Failed to warm connection to {url}: {e}")
+                return False
+
+        results = await asyncio.gather(*(_touch() for _ in range(connections)))
+        warmed = sum(results)
+        logger.debug(f"Warmed {warmed}/{connections} connections to {url}")
+        return warmed
+
+    @property
+    def stats(self) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "http2": self.http2,
+        }
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info(f"HTTP client pool closed: {self.stats}")
+        self._client = None
+
+
+http_pool = HttpClientPool()
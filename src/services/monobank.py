@@ -1,88 +1,39 @@
 import asyncio
 import logging
+import math
 import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 
 import httpx
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.services.aggregation import TransactionBatch
+from src.services.categorization import CategoryRule, compile_rules
+from src.services.client_info_cache import client_info_cache
+from src.services.decoding import StatementRecord, decode_statement
+from src.services.http_client import http_pool
+from src.services.rate_limiter import CLIENT_INFO, STATEMENT, rate_limiter
+from src.services.scheduler import Priority, statement_scheduler
+from src.services.transaction_store import (
+    STATEMENT_PAGE_SIZE,
+    accounts_with_holds,
+    get_sync_states,
+    load_transactions,
+    plan_sync,
+    record_balances,
+    split_windows,
+    store_statement,
+)
+from src.services.webhook import is_webhook_url
+from src.settings import STATEMENT_SKIP_UNCHANGED_BALANCE, STATEMENT_SYNC_FRESHNESS_SECONDS, WEBHOOK_ENABLED
 
 logger = logging.getLogger(__name__)
 
 MONOBANK_API_URL = "https://api.monobank.ua"
 
-STATEMENT_RATE_LIMIT_SECONDS = 60
-_last_statement_request: dict[str, float] = {}
-
-MCC_CATEGORIES = {
-    "groceries": {
-        "name_uk": "🛒 Продукти",
-        "name_en": "🛒 Groceries",
-        "codes": [5411, 5412, 5422, 5441, 5451, 5462, 5499],
-    },
-    "restaurants": {
-        "name_uk": "🍔 Ресторани та кафе",
-        "name_en": "🍔 Restaurants & Cafes",
-        "codes": [5812, 5813, 5814],
-    },
-    "transport": {
-        "name_uk": "🚗 Транспорт",
-        "name_en": "🚗 Transport",
-        "codes": [4111, 4112, 4121, 4131, 4411, 4511, 4784, 5541, 5542, 5172, 7512, 7523],
-    },
-    "entertainment": {
-        "name_uk": "🎬 Розваги",
-        "name_en": "🎬 Entertainment",
-        "codes": [7832, 7841, 7911, 7922, 7929, 7932, 7933, 7941, 7991, 7992, 7993, 7994, 7995, 7996, 7997, 7998, 7999],
-    },
-    "health": {
-        "name_uk": "💊 Здоров'я",
-        "name_en": "💊 Health",
-        "codes": [5122, 5292, 5912, 5975, 5976, 5977, 8011, 8021, 8031, 8041, 8042, 8043, 8049, 8050, 8062, 8071, 8099],
-    },
-    "clothing": {
-        "name_uk": "👕 Одяг та взуття",
-        "name_en": "👕 Clothing & Shoes",
-        "codes": [5611, 5621, 5631, 5641, 5651, 5661, 5681, 5691, 5699, 5931, 5932, 5948],
-    },
-    "utilities": {
-        "name_uk": "🏠 Комунальні послуги",
-        "name_en": "🏠 Utilities",
-        "codes": [4814, 4816, 4821, 4899, 4900],
-    },
-    "electronics": {
-        "name_uk": "📱 Електроніка",
-        "name_en": "📱 Electronics",
-        "codes": [5045, 5046, 5065, 5722, 5732, 5733, 5734, 5735],
-    },
-    "education": {
-        "name_uk": "📚 Освіта",
-        "name_en": "📚 Education",
-        "codes": [5111, 5192, 5942, 5943, 5994, 8211, 8220, 8241, 8244, 8249, 8299],
-    },
-    "transfers": {
-        "name_uk": "💸 Перекази",
-        "name_en": "💸 Transfers",
-        "codes": [4829, 6010, 6011, 6012, 6051, 6211, 6300, 6540],
-    },
-    "other": {
-        "name_uk": "📦 Інше",
-        "name_en": "📦 Other",
-        "codes": [],
-    },
-}
-
-
-def get_category_for_mcc(mcc: int) -> str:
-    for category_key, category_data in MCC_CATEGORIES.items():
-        codes = category_data["codes"]
-        if isinstance(codes, list) and mcc in codes:
-            return category_key
-    return "other"
-
-
-def get_category_name(category_key: str, language: str = "uk") -> str:
-    category = MCC_CATEGORIES.get(category_key, MCC_CATEGORIES["other"])
-    name = category.get(f"name_{language}", category.get("name_en", "Other"))
-    return str(name)
-
 
 class MonobankAPIError(Exception):
     def __init__(self, message: str, status_code: int | None = None, retry_after: int | None = None):
@@ -104,53 +55,57 @@ class MonobankService:
         self.token = token
         self.headers = {"X-Token": token}
 
-    async def get_client_info(self) -> dict:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{MONOBANK_API_URL}/personal/client-info", headers=self.headers)
+    @staticmethod
+    def _handle_response(response):
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 401:
+            raise MonobankAPIError("Invalid token", status_code=401)
+        elif response.status_code == 429:
+            retry_after = int(response.headers.get("Retry-After", 60))
+            raise MonobankRateLimitError(retry_after=retry_after)
+        else:
+            raise MonobankAPIError(f"API error: {response.text}", status_code=response.status_code)
 
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 401:
-                raise MonobankAPIError("Invalid token", status_code=401)
-            elif response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 60))
-                raise MonobankRateLimitError(retry_after=retry_after)
-            else:
-                raise MonobankAPIError(f"API error: {response.text}", status_code=response.status_code)
+    async def _handle_rate_limited(self, endpoint: str, response):
+        try:
+            return self._handle_response(response)
+        except MonobankRateLimitError as e:
+            await rate_limiter.penalize(self.token, endpoint, e.retry_after or 60)
+            raise
+
+    async def get_client_info(self, max_age: float | None = None) -> dict:
+        return await client_info_cache.get(self.token, self._fetch_client_info, max_age)
+
+    async def _fetch_client_info(self) -> dict:
+        wait = await rate_limiter.try_acquire(self.token, CLIENT_INFO)
+        if wait > 0:
+            raise MonobankRateLimitError(retry_after=math.ceil(wait))
+
+        response = await http_pool.get(f"{MONOBANK_API_URL}/personal/client-info", headers=self.headers)
+        return await self._handle_rate_limited(CLIENT_INFO, response)
 
     async def get_statement(
         self, account: str, from_ts: int, to_ts: int | None = None, respect_rate_limit: bool = True
-    ) -> list[dict]:
+    ) -> list[StatementRecord]:
         if respect_rate_limit:
-            await self._wait_for_rate_limit()
+            await rate_limiter.acquire(self.token, STATEMENT)
 
         url = f"{MONOBANK_API_URL}/personal/statement/{account}/{from_ts}"
         if to_ts:
             url += f"/{to_ts}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.headers)
-
-            _last_statement_request[self.token] = time.time()
-
+        async with http_pool.stream("GET", url, headers=self.headers) as response:
             if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 401:
-                raise MonobankAPIError("Invalid token", status_code=401)
-            elif response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 60))
-                raise MonobankRateLimitError(retry_after=retry_after)
-            else:
-                raise MonobankAPIError(f"API error: {response.text}", status_code=response.status_code)
-
-    async def _wait_for_rate_limit(self):
-        last_request = _last_statement_request.get(self.token, 0)
-        elapsed = time.time() - last_request
+                return await decode_statement(response.aiter_bytes())
+            await response.aread()
+            return await self._handle_rate_limited(STATEMENT, response)
 
-        if elapsed < STATEMENT_RATE_LIMIT_SECONDS:
-            wait_time = STATEMENT_RATE_LIMIT_SECONDS - elapsed
-            logger.debug(f"Rate limiting: waiting {wait_time:.1f} seconds before next statement request")
-            await asyncio.sleep(wait_time)
+    async def set_webhook(self, url: str) -> None:
+        response = await http_pool.post(
+            f"{MONOBANK_API_URL}/personal/webhook", headers=self.headers, json={"webHookUrl": url}
+        )
+        self._handle_response(response)
 
     async def get_accounts(self) -> list[dict]:
         client_info = await self.get_client_info()
@@ -164,54 +119,186 @@ class MonobankService:
             return False
 
 
-async def get_daily_spending(token: str, accounts: list[str], from_ts: int, to_ts: int, language: str = "uk") -> dict:
-    service = MonobankService(token)
+async def _fetch_statement(
+    service: MonobankService, token: str, account_id: str, from_ts: int, to_ts: int, priority: Priority
+) -> list[StatementRecord] | None:
+    def request():
+        return service.get_statement(account_id, from_ts, to_ts, respect_rate_limit=False)
 
-    all_transactions = []
-    for account_id in accounts:
+    try:
+        return await statement_scheduler.submit(token, request, priority)
+    except MonobankRateLimitError as e:
+        logger.warning(f"Rate limit hit for account {account_id}, waiting {e.retry_after}s and retrying...")
         try:
-            transactions = await service.get_statement(account_id, from_ts, to_ts, respect_rate_limit=True)
-            all_transactions.extend(transactions)
-        except MonobankRateLimitError as e:
-            retry_after = e.retry_after if e.retry_after is not None else 60
-            logger.warning(f"Rate limit hit for account {account_id}, waiting {retry_after}s and retrying...")
-            await asyncio.sleep(retry_after)
+            return await statement_scheduler.submit(token, request, priority)
+        except MonobankAPIError as retry_error:
+            logger.warning(f"Failed to get statement for account {account_id} after retry: {retry_error}")
+    except MonobankAPIError as e:
+        logger.warning(f"Failed to get statement for account {account_id}: {e}")
+    return None
+
+
+@dataclass(slots=True)
+class StatementPage:
+    from_ts: int
+    to_ts: int
+    records: list[StatementRecord]
+
+
+async def iter_statement(
+    token: str, account_id: str, from_ts: int, to_ts: int, priority: Priority = Priority.SCHEDULED
+) -> AsyncIterator[StatementPage]:
+    service = MonobankService(token)
+
+    for window_from, window_to in split_windows(from_ts, to_ts):
+        cursor = window_to
+        seen: set[str] = set()
+        while True:
+            records = await _fetch_statement(service, token, account_id, window_from, cursor, priority)
+            if records is None:
+                return
+
+            page = [record for record in records if record.id not in seen]
+            if len(records) < STATEMENT_PAGE_SIZE:
+                yield StatementPage(window_from, cursor, page)
+                break
+
+            oldest = min(record.time for record in records)
+            yield StatementPage(oldest, cursor, page)
+            if oldest <= window_from:
+                break
+
+            if oldest < cursor:
+                seen = {record.id for record in records if record.time == oldest}
+                cursor = oldest
+            else:
+                logger.warning(f"More than {STATEMENT_PAGE_SIZE} transactions at {oldest} for account {account_id}")
+                seen = set()
+                cursor = oldest - 1
+
+
+async def _sync_range(token: str, account_id: str, from_ts: int, to_ts: int, priority: Priority) -> None:
+    async for page in iter_statement(token, account_id, from_ts, to_ts, priority):
+        for attempt in range(2):
             try:
-                transactions = await service.get_statement(account_id, from_ts, to_ts, respect_rate_limit=False)
-                all_transactions.extend(transactions)
-            except MonobankAPIError as retry_error:
-                logger.warning(f"Failed to get statement for account {account_id} after retry: {retry_error}")
-                continue
-        except MonobankAPIError as e:
-            logger.warning(f"Failed to get statement for account {account_id}: {e}")
+                await run_db(store_statement, account_id, page.records, page.from_ts, page.to_ts)
+                break
+            except IntegrityError:
+                # a concurrent sync stored the same rows first, the retry updates them
+                if attempt:
+                    raise
+
+
+def _read_sync_state(session: Session, accounts: list[str], from_ts: int, to_ts: int):
+    states = get_sync_states(session, accounts)
+    holds = accounts_with_holds(session, accounts, from_ts, to_ts)
+    # detached, so the states stay readable once the transaction is committed
+    session.expunge_all()
+    return states, holds
+
+
+async def _balance_snapshot(token: str) -> tuple[dict[str, int], int]:
+    """Returns the accounts' balances and the moment up to which they may include transactions."""
+    try:
+        client_info = await MonobankService(token).get_client_info(max_age=STATEMENT_SYNC_FRESHNESS_SECONDS)
+    except (MonobankAPIError, httpx.HTTPError) as e:
+        logger.debug(f"Balance snapshot unavailable, fetching all statements: {e}")
+        return {}, 0
+
+    age = client_info_cache.age(token)
+    if age is None or age > STATEMENT_SYNC_FRESHNESS_SECONDS:
+        return {}, 0
+    balances = {
+        account["id"]: account["balance"] for account in client_info.get("accounts", []) if "balance" in account
+    }
+    return balances, math.ceil(time.time() - age)
+
+
+async def _pushes_registered(token: str) -> bool:
+    """Whether Monobank still pushes the token's transactions to this bot, it drops webhooks that keep failing."""
+    if not WEBHOOK_ENABLED:
+        return False
+    try:
+        client_info = await MonobankService(token).get_client_info()
+    except (MonobankAPIError, httpx.HTTPError) as e:
+        logger.debug(f"Webhook state unknown, fetching statements instead: {e}")
+        return False
+    return is_webhook_url(client_info.get("webHookUrl") or "")
+
+
+async def sync_statements(
+    token: str,
+    accounts: list[str],
+    from_ts: int,
+    to_ts: int,
+    priority: Priority = Priority.SCHEDULED,
+    push_since: int | None = None,
+) -> None:
+    if push_since is not None and not await _pushes_registered(token):
+        push_since = None
+
+    states, holds = await run_db(_read_sync_state, accounts, from_ts, to_ts)
+
+    plans = {
+        account_id: plan_sync(states.get(account_id), from_ts, to_ts, push_since=push_since) for account_id in accounts
+    }
+    if not any(plans.values()):
+        return
+
+    balances, taken_at = {}, 0
+    if STATEMENT_SKIP_UNCHANGED_BALANCE and push_since is None:
+        balances, taken_at = await _balance_snapshot(token)
+
+    unchanged = set()
+    for account_id, gaps in plans.items():
+        state = states.get(account_id)
+        if state is None or state.balance is None or state.balance != balances.get(account_id) or account_id in holds:
             continue
+        tail = [gap for gap in gaps if gap[0] == state.synced_to]
+        if tail:
+            unchanged.add(account_id)
+            plans[account_id] = [gap for gap in gaps if gap not in tail]
+
+    if unchanged:
+        logger.debug(f"Skipping statements of {len(unchanged)} account(s) with unchanged balance")
+
+    # a snapshot taken after to_ts may already include newer transactions, fetch the
+    # tails up to it so the stored balance matches the synced range
+    if balances and 0 < taken_at - to_ts <= STATEMENT_SYNC_FRESHNESS_SECONDS:
+        plans = {
+            account_id: [(gap_from, taken_at if gap_to == to_ts else gap_to) for gap_from, gap_to in gaps]
+            for account_id, gaps in plans.items()
+        }
+
+    await asyncio.gather(
+        *(
+            _sync_range(token, account_id, gap_from, gap_to, priority)
+            for account_id, gaps in plans.items()
+            for gap_from, gap_to in gaps
+        )
+    )
 
-    spending_by_category: dict[str, int] = {}
-    total_spending = 0
-    total_income = 0
+    if balances:
+        await run_db(record_balances, balances, taken_at, unchanged)
 
-    for tx in all_transactions:
-        amount = tx.get("amount", 0)
-        mcc = tx.get("mcc", 0)
 
-        if amount < 0:
-            category = get_category_for_mcc(mcc)
-            spending_by_category[category] = spending_by_category.get(category, 0) + abs(amount)
-            total_spending += abs(amount)
-        else:
-            total_income += amount
-
-    categories_formatted = []
-    for category_key, amount in sorted(spending_by_category.items(), key=lambda x: x[1], reverse=True):
-        category_name = get_category_name(category_key, language)
-        categories_formatted.append({"key": category_key, "name": category_name, "amount": amount})
-
-    return {
-        "total_spending": total_spending,
-        "total_income": total_income,
-        "categories": categories_formatted,
-        "transaction_count": len(all_transactions),
-    }
+async def get_daily_spending(
+    token: str,
+    accounts: list[str],
+    from_ts: int,
+    to_ts: int,
+    language: str = "uk",
+    priority: Priority = Priority.SCHEDULED,
+    push_since: int | None = None,
+    rules: tuple[CategoryRule, ...] = (),
+) -> dict:
+    await sync_statements(token, accounts, from_ts, to_ts, priority, push_since)
+
+    batch = TransactionBatch()
+    batch.add_user(0)
+    batch.extend(0, await run_db(load_transactions, accounts, from_ts, to_ts))
+
+    return batch.aggregate([compile_rules(rules)], [language])[0]
 
 
 def format_account_name(account: dict) -> str:
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.database.models import RateLimitState
+from src.settings import (
+    CLIENT_INFO_RATE_LIMIT_BURST,
+    CLIENT_INFO_RATE_LIMIT_SECONDS,
+    RATE_LIMIT_EVICT_AFTER_SECONDS,
+    STATEMENT_RATE_LIMIT_BURST,
+    STATEMENT_RATE_LIMIT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+STATEMENT = "statement"
+CLIENT_INFO = "client_info"
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    interval: float
+    burst: int = 1
+
+
+DEFAULT_LIMITS = {
+    STATEMENT: BucketLimit(STATEMENT_RATE_LIMIT_SECONDS, STATEMENT_RATE_LIMIT_BURST),
+    CLIENT_INFO: BucketLimit(CLIENT_INFO_RATE_LIMIT_SECONDS, CLIENT_INFO_RATE_LIMIT_BURST),
+}
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RateLimiter:
+    """Token bucket per Monobank token and endpoint, persisted in the database.
+
+    Buckets are stored in GCRA form: ``tat`` is the theoretical arrival time of the
+    next request, so a single float per bucket is enough and a missing row equals a
+    full bucket. Every reservation runs in a transaction that takes the row's write
+    lock first, which makes the budget shared between restarts and worker processes.
+    """
+
+    def __init__(self, limits: dict[str, BucketLimit] | None = None):
+        self.limits = limits or DEFAULT_LIMITS
+
+    def _lock_state(self, session: Session, key: str, endpoint: str, now: float) -> RateLimitState:
+        stmt = (
+            update(RateLimitState)
+            .where(RateLimitState.key == key, RateLimitState.endpoint == endpoint)
+            .values(last_used=RateLimitState.last_used)
+        )
+        if session.execute(stmt).rowcount == 0:
+            session.add(RateLimitState(key=key, endpoint=endpoint, tat=now, last_used=now))
+            session.flush()
+
+        stmt = select(RateLimitState).where(RateLimitState.key == key, RateLimitState.endpoint == endpoint)
+        return session.scalars(stmt).one()
+
+    def _reserve_in(self, session: Session, token: str, endpoint: str, force: bool, penalty: float) -> float:
+        limit = self.limits[endpoint]
+        now = time.time()
+        state = self._lock_state(session, token_key(token), endpoint, now)
+        tat = max(state.tat, now)
+        wait = tat - (limit.burst - 1) * limit.interval - now
+
+        if penalty:
+            state.tat = max(tat, now + penalty + (limit.burst - 1) * limit.interval)
+            return penalty
+        if wait > 0 and not force:
+            return wait
+
+        state.tat = tat + limit.interval
+        state.last_used = now
+        return 0.0
+
+    async def _reserve(self, token: str, endpoint: str, force: bool = False, penalty: float = 0.0) -> float:
+        for attempt in range(2):
+            try:
+                return await run_db(self._reserve_in, token, endpoint, force, penalty)
+            except IntegrityError:
+                # another process created the bucket concurrently, the retry locks its row
+                if attempt:
+                    raise
+        return 0.0
+
+    async def try_acquire(self, token: str, endpoint: str) -> float:
+        return await self._reserve(token, endpoint)
+
+    async def acquire(self, token: str, endpoint: str) -> None:
+        while (wait := await self.try_acquire(token, endpoint)) > 0:
+            logger.debug(f"Rate limiting {endpoint}: waiting {wait:.1f} seconds before next request")
+            await asyncio.sleep(wait)
+
+    async def record(self, token: str, endpoint: str) -> None:
+        await self._reserve(token, endpoint, force=True)
+
+    async def penalize(self, token: str, endpoint: str, retry_after: float) -> None:
+        await self._reserve(token, endpoint, penalty=retry_after)
+
+    async def next_allowed(self, token: str, endpoint: str) -> float:
+        limit = self.limits[endpoint]
+        stmt = select(RateLimitState.tat).where(
+            RateLimitState.key == token_key(token), RateLimitState.endpoint == endpoint
+        )
+        tat = await run_db(lambda session: session.scalar(stmt))
+
+        if tat is None:
+            return 0.0
+        return tat - (limit.burst - 1) * limit.interval
+
+    @staticmethod
+    def _evict(session: Session, now: float, idle_seconds: float) -> int:
+        stmt = delete(RateLimitState).where(RateLimitState.last_used < now - idle_seconds, RateLimitState.tat < now)
+        return session.execute(stmt).rowcount
+
+    async def evict(self, idle_seconds: float = RATE_LIMIT_EVICT_AFTER_SECONDS) -> int:
+        evicted = await run_db(self._evict, time.time(), idle_seconds)
+        if evicted:
+            logger.info(f"Evicted {evicted} idle rate limit buckets")
+        return evicted
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,156 @@
+import datetime
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from src.database.models import ReportDelivery, User, WorkerHeartbeat
+from src.services.workers import Shard
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+EXPIRED = "expired"
+
+
+@dataclass(frozen=True, slots=True)
+class OutboxItem:
+    id: int
+    user_id: int
+    scheduled_for: datetime.datetime
+
+
+def _to_db(moment: datetime.datetime) -> datetime.datetime:
+    return moment.astimezone(datetime.UTC).replace(tzinfo=None)
+
+
+def _from_db(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(tzinfo=datetime.UTC)
+
+
+def idempotency_key(user_id: int, slot: datetime.datetime) -> str:
+    return f"report:{user_id}:{slot.astimezone(datetime.UTC):%Y-%m-%dT%H:%M}"
+
+
+def enqueue(session: Session, slot: datetime.datetime, user_ids: Iterable[int]) -> int:
+    keys = {idempotency_key(user_id, slot): user_id for user_id in user_ids}
+    if not keys:
+        return 0
+
+    existing = set(
+        session.scalars(select(ReportDelivery.idempotency_key).where(ReportDelivery.idempotency_key.in_(keys)))
+    )
+    rows = [
+        {"idempotency_key": key, "user_id": user_id, "scheduled_for": _to_db(slot), "status": PENDING}
+        for key, user_id in keys.items()
+        if key not in existing
+    ]
+    if rows:
+        session.execute(insert(ReportDelivery), rows)
+    return len(rows)
+
+
+def due_users(session: Session, slot: datetime.datetime) -> list[int]:
+    """Reads the users due at a slot from the database, as the schedule of this process may be outdated."""
+    # scans the partial ix_users_report_slot index instead of the whole table
+    stmt = (
+        select(User.id)
+        .where(User.report_hour == slot.hour, User.report_minute == slot.minute, User.is_active, User.has_token)
+        .order_by(User.id)
+    )
+    return list(session.scalars(stmt))
+
+
+def pending_items(
+    session: Session, since: datetime.datetime, until: datetime.datetime, shard: Shard = Shard()
+) -> list[OutboxItem]:
+    stmt = (
+        select(ReportDelivery.id, ReportDelivery.user_id, ReportDelivery.scheduled_for)
+        .where(
+            ReportDelivery.status == PENDING,
+            ReportDelivery.scheduled_for >= _to_db(since),
+            ReportDelivery.scheduled_for <= _to_db(until),
+        )
+        .order_by(ReportDelivery.scheduled_for, ReportDelivery.id)
+    )
+    if shard.count > 1:
+        stmt = stmt.where(ReportDelivery.user_id % shard.count == shard.index)
+    return [
+        OutboxItem(row_id, user_id, _from_db(scheduled_for)) for row_id, user_id, scheduled_for in session.execute(stmt)
+    ]
+
+
+def claim(session: Session, item_ids: list[int], worker_id: str, live_since: float) -> set[int]:
+    held = set(
+        session.scalars(
+            select(ReportDelivery.id).where(ReportDelivery.id.in_(item_ids), ReportDelivery.claimed_by == worker_id)
+        )
+    )
+    live_workers = select(WorkerHeartbeat.id).where(WorkerHeartbeat.heartbeat_at >= live_since)
+    stmt = (
+        update(ReportDelivery)
+        .where(
+            ReportDelivery.id.in_(item_ids),
+            ReportDelivery.status == PENDING,
+            ReportDelivery.claimed_by.is_(None) | ReportDelivery.claimed_by.not_in(live_workers),
+        )
+        .values(claimed_by=worker_id)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(stmt)
+
+    stmt = select(ReportDelivery.id).where(ReportDelivery.id.in_(item_ids), ReportDelivery.claimed_by == worker_id)
+    return set(session.scalars(stmt)) - held
+
+
+def release(session: Session, item_ids: list[int], worker_id: str) -> None:
+    stmt = (
+        update(ReportDelivery)
+        .where(ReportDelivery.id.in_(item_ids), ReportDelivery.claimed_by == worker_id)
+        .values(claimed_by=None)
+    )
+    session.execute(stmt)
+
+
+def acknowledge(session: Session, results: list[tuple[OutboxItem, str, datetime.datetime | None]]) -> None:
+    rows = [
+        {
+            "id": item.id,
+            "status": status,
+            "delivered_at": None if delivered_at is None else _to_db(delivered_at),
+            "lateness": None if delivered_at is None else (delivered_at - item.scheduled_for).total_seconds(),
+        }
+        for item, status, delivered_at in results
+    ]
+    if rows:
+        session.execute(update(ReportDelivery), rows)
+
+
+def last_scheduled(session: Session) -> datetime.datetime | None:
+    latest = session.scalar(select(func.max(ReportDelivery.scheduled_for)))
+    return None if latest is None else _from_db(latest)
+
+
+def expire(session: Session, before: datetime.datetime) -> int:
+    stmt = (
+        update(ReportDelivery)
+        .where(ReportDelivery.status == PENDING, ReportDelivery.scheduled_for < _to_db(before))
+        .values(status=EXPIRED)
+    )
+    expired = session.execute(stmt).rowcount
+    if expired:
+        logger.warning(f"Expired {expired} reports that were not delivered before {before:%Y-%m-%d %H:%M %Z}")
+    return expired
+
+
+def deactivate_users(session: Session, user_ids: Iterable[int]) -> int:
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+
+    stmt = (
+        update(User).where(User.id.in_(user_ids), User.is_active).values(block_date=datetime.datetime.now(datetime.UTC))
+    )
+    return session.execute(stmt).rowcount
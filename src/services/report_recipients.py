@@ -0,0 +1,76 @@
+import datetime
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.models import User, UserAccount
+from src.lib.crypto import decrypt_token
+from src.lib.helpers import translator
+from src.settings import REPORT_RECIPIENT_CHUNK_SIZE
+
+
+@dataclass(frozen=True, slots=True)
+class ReportRecipient:
+    """The columns of a user that a daily report needs, read without an ORM entity."""
+
+    id: int
+    encrypted_token: str | None
+    selected_accounts: list[str]
+    language_code: str | None
+    report_hour: int
+    report_minute: int
+    webhook_date: datetime.datetime | None
+
+    @property
+    def monobank_token(self) -> str | None:
+        return decrypt_token(self.encrypted_token, self.id) if self.encrypted_token else None
+
+    @property
+    def webhook_since(self) -> int | None:
+        if self.webhook_date is None:
+            return None
+        return int(self.webhook_date.replace(tzinfo=datetime.UTC).timestamp())
+
+    @property
+    def translator(self):
+        return translator(self.language_code or "en")
+
+
+def _selected_accounts(session: Session, user_ids: list[int]) -> dict[int, list[str]]:
+    stmt = (
+        select(UserAccount.user_id, UserAccount.account_id)
+        .where(UserAccount.user_id.in_(user_ids))
+        .order_by(UserAccount.user_id, UserAccount.position)
+    )
+    accounts: dict[int, list[str]] = {}
+    for user_id, account_id in session.execute(stmt):
+        accounts.setdefault(user_id, []).append(account_id)
+    return accounts
+
+
+def iter_recipients(
+    session: Session, user_ids: Iterable[int], *criteria, chunk_size: int = REPORT_RECIPIENT_CHUNK_SIZE
+) -> Iterator[ReportRecipient]:
+    """Streams the active users with a token among ``user_ids``, ``chunk_size`` ids per query."""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start : start + chunk_size]
+        accounts = _selected_accounts(session, chunk)
+        stmt = (
+            select(
+                User.id,
+                User._monobank_token,
+                User.language_code,
+                User.report_hour,
+                User.report_minute,
+                User.webhook_date,
+            )
+            .where(User.id.in_(chunk), User.is_active, User.has_token, *criteria)
+            .execution_options(yield_per=chunk_size)
+        )
+        for user_id, encrypted_token, language_code, hour, minute, webhook_date in session.execute(stmt):
+            yield ReportRecipient(
+                user_id, encrypted_token, accounts.get(user_id, []), language_code, hour, minute, webhook_date
+            )
@@ -0,0 +1,129 @@
+import bisect
+import datetime
+import logging
+from collections.abc import Callable
+
+import pytz
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.configuration import get_session, run_db
+from src.database.models import User
+from src.settings import REPORT_RECIPIENT_CHUNK_SIZE, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class ReportSchedule:
+    """In-memory timer wheel of daily report slots.
+
+    Users are bucketed by their report minute of the day, and the occupied minutes
+    are kept sorted, so the next slot with anyone due is found with a bisect instead
+    of a database query every minute.
+    """
+
+    def __init__(self, timezone: str = TIMEZONE):
+        self.tz = pytz.timezone(timezone)
+        self._slots: dict[int, set[int]] = {}
+        self._minutes: list[int] = []
+        self._user_slots: dict[int, int] = {}
+        self.on_change: Callable[[], None] | None = None
+
+    @staticmethod
+    def _read(session: Session) -> tuple[dict[int, set[int]], dict[int, int]]:
+        slots: dict[int, set[int]] = {}
+        user_slots: dict[int, int] = {}
+        # scans the partial ix_users_report_slot index instead of the whole table
+        stmt = (
+            select(User.id, User.report_hour, User.report_minute)
+            .where(User.is_active, User.has_token)
+            .execution_options(yield_per=REPORT_RECIPIENT_CHUNK_SIZE)
+        )
+        for user_id, hour, minute in session.execute(stmt):
+            slot = hour * 60 + minute
+            slots.setdefault(slot, set()).add(user_id)
+            user_slots[user_id] = slot
+        return slots, user_slots
+
+    def load(self, session_factory=get_session) -> None:
+        session = session_factory()
+        try:
+            slots, user_slots = self._read(session)
+        finally:
+            session.close()
+        self._swap(slots, user_slots)
+
+    async def reload(self) -> None:
+        """Reloads the schedule without blocking the event loop, for the periodic refresh."""
+        self._swap(*await run_db(self._read))
+
+    def _swap(self, slots: dict[int, set[int]], user_slots: dict[int, int]) -> None:
+        # built aside and swapped in at once, so a failed load keeps the previous schedule
+        self._slots, self._user_slots, self._minutes = slots, user_slots, sorted(slots)
+        logger.info(f"Report schedule loaded: {len(self._user_slots)} users in {len(self._minutes)} slots")
+        self._notify()
+
+    def _discard(self, user_id: int) -> bool:
+        slot = self._user_slots.pop(user_id, None)
+        if slot is None:
+            return False
+
+        users = self._slots[slot]
+        users.discard(user_id)
+        if not users:
+            del self._slots[slot]
+            self._minutes.pop(bisect.bisect_left(self._minutes, slot))
+        return True
+
+    def set(self, user_id: int, hour: int, minute: int) -> None:
+        slot = hour * 60 + minute
+        if self._user_slots.get(user_id) == slot:
+            return
+
+        self._discard(user_id)
+        if slot not in self._slots:
+            self._slots[slot] = set()
+            bisect.insort(self._minutes, slot)
+        self._slots[slot].add(user_id)
+        self._user_slots[user_id] = slot
+        self._notify()
+
+    def remove(self, user_id: int) -> None:
+        if self._discard(user_id):
+            self._notify()
+
+    def sync_user(self, user: User) -> None:
+        if user.is_active and user.has_token:
+            self.set(user.id, user.report_hour, user.report_minute)
+        else:
+            self.remove(user.id)
+
+    def due(self, hour: int, minute: int) -> list[int]:
+        return sorted(self._slots.get(hour * 60 + minute, ()))
+
+    def next_fire(self, after: datetime.datetime) -> datetime.datetime | None:
+        if not self._minutes:
+            return None
+
+        local = after.astimezone(self.tz)
+        index = bisect.bisect_right(self._minutes, local.hour * 60 + local.minute)
+        day = local.date()
+        if index == len(self._minutes):
+            index = 0
+            day += datetime.timedelta(days=1)
+
+        hour, minute = divmod(self._minutes[index], 60)
+        return self.tz.localize(datetime.datetime.combine(day, datetime.time(hour, minute)))
+
+    def _notify(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    @property
+    def stats(self) -> dict:
+        return {"users": len(self._user_slots), "slots": len(self._minutes)}
+
+
+report_schedule = ReportSchedule()
@@ -0,0 +1,237 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+from src.services.rate_limiter import STATEMENT, RateLimiter, rate_limiter
+from src.settings import MONOBANK_MAX_CONCURRENT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    SCHEDULED = 1
+
+
+@dataclass
+class _Request:
+    func: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class RequestScheduler:
+    """Runs rate limited Monobank requests for many tokens from a single dispatcher.
+
+    Each priority lane is a heap of tokens keyed by the time their bucket allows the
+    next request. Callers only await a future; the dispatcher is the only coroutine
+    that sleeps, and requests of different tokens run concurrently.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter = rate_limiter,
+        endpoint: str = STATEMENT,
+        max_concurrency: int = MONOBANK_MAX_CONCURRENT_REQUESTS,
+    ):
+        self.limiter = limiter
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pending: dict[str, dict[Priority, deque[_Request]]] = {}
+        self._lanes: dict[Priority, list[tuple[float, int, str]]] = {priority: [] for priority in Priority}
+        self._entries: dict[str, tuple[Priority, int]] = {}
+        self._counter = itertools.count()
+        self._in_flight: set[asyncio.Task] = set()
+        self._wait_times: deque[float] = deque(maxlen=1000)
+        self._runner: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._runner is not None and not self._runner.done() and self._runner.get_loop() is loop:
+            return
+
+        if self._runner is not None and self._runner.get_loop() is not loop:
+            self._reset()
+        if self._wakeup is None or self._slots is None:
+            self._wakeup = asyncio.Event()
+            # requests still in flight release the slots they took from this semaphore
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._runner = loop.create_task(self._run(), name="monobank_request_scheduler")
+
+    def _push(self, token: str, priority: Priority, ready_at: float) -> None:
+        seq = next(self._counter)
+        self._entries[token] = (priority, seq)
+        heapq.heappush(self._lanes[priority], (ready_at, seq, token))
+
+    def _best_priority(self, token: str) -> Priority | None:
+        queues = self._pending.get(token, {})
+        return next((priority for priority in Priority if queues.get(priority)), None)
+
+    def _reschedule(self, token: str, ready_at: float) -> None:
+        priority = self._best_priority(token)
+        if priority is None:
+            self._entries.pop(token, None)
+            self._pending.pop(token, None)
+            return
+        self._push(token, priority, ready_at)
+
+    async def submit(self, token: str, func: Callable[[], Awaitable[Any]], priority: Priority = Priority.SCHEDULED):
+        self._ensure_running()
+
+        request = _Request(func=func, future=asyncio.get_running_loop().create_future())
+        self._pending.setdefault(token, {}).setdefault(priority, deque()).append(request)
+
+        entry = self._entries.get(token)
+        if entry is None:
+            try:
+                ready_at = await self.limiter.next_allowed(token, self.endpoint)
+            except Exception:
+                self._pending[token][priority].remove(request)
+                raise
+            self._push(token, priority, ready_at)
+        elif priority < entry[0]:
+            ready_at = next(ready for ready, seq, _ in self._lanes[entry[0]] if seq == entry[1])
+            self._push(token, priority, ready_at)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await request.future
+
+    def _next_ready(self) -> tuple[Priority, float] | None:
+        best = None
+        now = time.time()
+        for priority in Priority:
+            lane = self._lanes[priority]
+            while lane and self._entries.get(lane[0][2]) != (priority, lane[0][1]):
+                heapq.heappop(lane)
+            if not lane:
+                continue
+            ready_at = lane[0][0]
+            if ready_at <= now:
+                return priority, ready_at
+            if best is None or ready_at < best[1]:
+                best = (priority, ready_at)
+        return best
+
+    async def _sleep(self, timeout: float | None) -> None:
+        assert self._wakeup is not None
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        assert self._slots is not None
+        while True:
+            await self._slots.acquire()
+
+            nxt = self._next_ready()
+            if nxt is None or nxt[1] > time.time():
+                self._slots.release()
+                await self._sleep(None if nxt is None else nxt[1] - time.time())
+                continue
+
+            priority, _ = nxt
+            _, _, token = heapq.heappop(self._lanes[priority])
+            # submit() pushes the token again if it comes by while the bucket is read below
+            del self._entries[token]
+
+            queue = self._pending[token][priority]
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if not queue:
+                self._slots.release()
+                self._reschedule(token, time.time())
+                continue
+
+            try:
+                wait = await self.limiter.try_acquire(token, self.endpoint)
+            except Exception as e:
+                # e.g. a locked database; fail this request and keep dispatching the others
+                logger.exception(f"Could not reserve a {self.endpoint} request")
+                self._slots.release()
+                queue.popleft().future.set_exception(e)
+                self._reschedule(token, time.time())
+                continue
+            if wait > 0:
+                self._slots.release()
+                self._reschedule(token, time.time() + wait)
+                continue
+
+            request = queue.popleft()
+            self._wait_times.append(time.time() - request.enqueued_at)
+            task = asyncio.create_task(self._execute(request))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+            try:
+                ready_at = await self.limiter.next_allowed(token, self.endpoint)
+            except Exception:
+                logger.exception(f"Could not read the next {self.endpoint} slot")
+                # try_acquire() still holds the request back until the bucket allows it
+                ready_at = time.time()
+            self._reschedule(token, ready_at)
+
+    async def _execute(self, request: _Request) -> None:
+        assert self._slots is not None
+        try:
+            result = await request.func()
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self._slots.release()
+            if not request.future.done():
+                request.future.cancel()
+
+    @property
+    def stats(self) -> dict:
+        queued = {
+            priority.name.lower(): sum(len(queues.get(priority, ())) for queues in self._pending.values())
+            for priority in Priority
+        }
+        wait_times = list(self._wait_times)
+        return {
+            "queue_depth": sum(queued.values()),
+            "queued": queued,
+            "tokens": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "avg_wait": sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            "max_wait": max(wait_times, default=0.0),
+        }
+
+    async def close(self) -> None:
+        if self._runner is not None and not self._runner.done():
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+
+        for task in list(self._in_flight):
+            task.cancel()
+
+        for queues in self._pending.values():
+            for queue in queues.values():
+                for request in queue:
+                    request.future.cancel()
+        self._reset()
+
+
+statement_scheduler = RequestScheduler()
@@ -0,0 +1,207 @@
+import asyncio
+import datetime
+import itertools
+import logging
+from collections import deque
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.services.scheduler import Priority
+from src.settings import (
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_GROUP_RATE_PER_MINUTE,
+    TELEGRAM_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_CHATS = 10000
+
+
+class _Gcra:
+    __slots__ = ("interval", "tolerance", "tat")
+
+    def __init__(self, interval: float, burst: int = 1):
+        self.interval = interval
+        self.tolerance = interval * (burst - 1)
+        self.tat = 0.0
+
+    def reserve(self, now: float) -> float:
+        tat = max(self.tat, now)
+        self.tat = tat + self.interval
+        return max(tat - self.tolerance - now, 0.0)
+
+
+def _is_group(chat_id: int | str) -> bool:
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+def _seconds(retry_after: int | datetime.timedelta) -> float:
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Flood control for every Bot API request that targets a chat.
+
+    A request first waits for its chat's bucket (1/s with a small burst for private
+    chats, 20/min for groups), then joins a priority queue drained by one dispatcher at the global
+    rate, so interactive menu updates overtake queued bulk reports. ``RetryAfter``
+    pauses the dispatcher and the request is retried.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: int = TELEGRAM_CHAT_BURST,
+        group_rate_per_minute: float = TELEGRAM_GROUP_RATE_PER_MINUTE,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.chat_interval = 1 / chat_rate
+        self.chat_burst = max(chat_burst, 1)
+        self.group_interval = 60 / group_rate_per_minute
+        self.max_retries = max_retries
+        self._reset()
+
+    def _reset(self) -> None:
+        self._global = _Gcra(1 / self.global_rate, burst=max(int(self.global_rate), 1))
+        self._chats: dict[int | str, _Gcra] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._counter = itertools.count()
+        self._paused_until = 0.0
+        self._backlog = dict.fromkeys(Priority, 0)
+        self._wait_times: deque[float] = deque(maxlen=1000)
+        self.sent = 0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        self._ensure_running()
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        logger.info(f"Outbound dispatcher stopped: {self.stats}")
+        self._dispatcher = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is not None and not self._dispatcher.done() and self._dispatcher.get_loop() is loop:
+            return
+
+        if self._dispatcher is not None and self._dispatcher.get_loop() is not loop:
+            self._reset()
+        self._queue = asyncio.PriorityQueue()
+        self._dispatcher = loop.create_task(self._dispatch(), name="telegram_outbound_dispatcher")
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> _Gcra:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_TRACKED_CHATS:
+                self._chats = {key: value for key, value in self._chats.items() if value.tat > now}
+            if _is_group(chat_id):
+                bucket = _Gcra(self.group_interval)
+            else:
+                # a menu tap often makes two calls in a row, they should not wait a second
+                bucket = _Gcra(self.chat_interval, burst=self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, future = await self._queue.get()
+            if future.done():
+                continue
+
+            while (pause := self._paused_until - loop.time()) > 0:
+                await asyncio.sleep(pause)
+            delay = self._global.reserve(loop.time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if not future.done():
+                future.set_result(None)
+
+    async def _acquire(self, chat_id: int | str, priority: Priority) -> None:
+        loop = asyncio.get_running_loop()
+        self._ensure_running()
+        assert self._queue is not None
+
+        self._backlog[priority] += 1
+        try:
+            delay = self._chat_bucket(chat_id, loop.time()).reserve(loop.time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            future = loop.create_future()
+            self._queue.put_nowait((priority, next(self._counter), future))
+            await future
+        finally:
+            self._backlog[priority] -= 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict[str, Any] | list[dict[str, Any]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> bool | dict[str, Any] | list[dict[str, Any]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = Priority.INTERACTIVE if rate_limit_args is None else Priority(rate_limit_args)
+        loop = asyncio.get_running_loop()
+
+        attempt = 0
+        while True:
+            started_at = loop.time()
+            await self._acquire(chat_id, priority)
+            self._wait_times.append(loop.time() - started_at)
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = _seconds(e.retry_after)
+                self._paused_until = max(self._paused_until, loop.time() + retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Flood control on {endpoint} for chat {chat_id}, retrying in {retry_after:.0f}s")
+                continue
+
+            self.sent += 1
+            return result
+
+    @property
+    def stats(self) -> dict:
+        wait_times = list(self._wait_times)
+        return {
+            "backlog": sum(self._backlog.values()),
+            "queued": {priority.name.lower(): count for priority, count in self._backlog.items()},
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "retries": self.retries,
+            "avg_wait": sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            "max_wait": max(wait_times, default=0.0),
+        }
+
+
+outbound_limiter = OutboundRateLimiter()
@@ -0,0 +1,101 @@
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update
+
+from src.database.configuration import get_session, run_db
+from src.database.models import User
+from src.lib.crypto import (
+    decrypt_token,
+    encrypt_token,
+    needs_reencryption,
+    pending_reencryptions,
+    rotate_master_key,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 500
+MIGRATION_WORKERS = 4
+
+
+def _store(session, tokens: dict[int, tuple[str, str]]) -> int:
+    stored = 0
+    for user_id, (old, new) in tokens.items():
+        # Only replace the ciphertext that was re-encrypted, never a token changed in the meantime
+        stmt = update(User).where(User.id == user_id, User._monobank_token == old).values({User._monobank_token: new})
+        stored += session.execute(stmt).rowcount
+    return stored
+
+
+async def flush_reencrypted_tokens() -> int:
+    tokens = pending_reencryptions.drain()
+    if not tokens:
+        return 0
+
+    stored = await run_db(_store, tokens)
+    logger.info(f"Stored {stored} tokens re-encrypted on read")
+    return stored
+
+
+def _reencrypt(row: tuple[int, str]) -> tuple[int, str, str | None]:
+    user_id, encrypted = row
+    token = decrypt_token(encrypted, user_id)
+    return user_id, encrypted, None if token is None else encrypt_token(token, user_id)
+
+
+def migrate_tokens(
+    batch_size: int = MIGRATION_BATCH_SIZE, workers: int = MIGRATION_WORKERS, session_factory=get_session
+) -> tuple[int, int]:
+    migrated = failed = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token_migration") as pool:
+        while True:
+            session = session_factory()
+            try:
+                stmt = (
+                    select(User.id, User._monobank_token)
+                    .where(User._monobank_token.is_not(None), User.id > last_id)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )
+                rows = [(user_id, encrypted) for user_id, encrypted in session.execute(stmt)]
+            finally:
+                session.close()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            results = list(pool.map(_reencrypt, [row for row in rows if needs_reencryption(row[1])]))
+            tokens = {user_id: (old, new) for user_id, old, new in results if new is not None}
+            failed += len(results) - len(tokens)
+
+            session = session_factory()
+            try:
+                with session.begin():
+                    migrated += _store(session, tokens)
+            finally:
+                session.close()
+            logger.info(f"Re-encrypted {migrated} tokens so far (last user id {last_id})")
+
+    return migrated, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encrypt stored Monobank tokens with the current token format.")
+    parser.add_argument("--rotate", action="store_true", help="generate a new master key before re-encrypting")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=MIGRATION_WORKERS)
+    args = parser.parse_args()
+
+    if args.rotate:
+        rotate_master_key()
+        logger.info("Generated a new master key, the previous one is kept as retired")
+
+    migrated, failed = migrate_tokens(args.batch_size, args.workers)
+    logger.info(f"Token migration finished: {migrated} re-encrypted, {failed} could not be decrypted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import logging
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from src.database.models import AccountSyncState, Transaction
+from src.services.decoding import StatementRecord
+from src.settings import STATEMENT_SYNC_FRESHNESS_SECONDS, WEBHOOK_RECONCILE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_PAGE_SIZE = 500
+STATEMENT_MAX_WINDOW_SECONDS = 31 * 24 * 60 * 60 + 60 * 60
+
+
+def get_sync_states(session: Session, account_ids: list[str]) -> dict[str, AccountSyncState]:
+    stmt = select(AccountSyncState).where(AccountSyncState.account_id.in_(account_ids))
+    return {state.account_id: state for state in session.scalars(stmt)}
+
+
+def plan_sync(
+    state: AccountSyncState | None,
+    from_ts: int,
+    to_ts: int,
+    freshness: int = STATEMENT_SYNC_FRESHNESS_SECONDS,
+    push_since: int | None = None,
+    reconcile: int = WEBHOOK_RECONCILE_SECONDS,
+) -> list[tuple[int, int]]:
+    if push_since is not None:
+        # pushes cover the time after the webhook was registered or the account was last
+        # polled, but only for a while, so pushes that were lost get fetched eventually
+        pushed_from = push_since if state is None else max(push_since, state.synced_to)
+        if pushed_from < to_ts and to_ts - pushed_from <= reconcile:
+            if pushed_from <= from_ts:
+                return []
+            to_ts, freshness = pushed_from, 0
+
+    if state is None or to_ts < state.synced_from or from_ts > state.synced_to:
+        return [(from_ts, to_ts)]
+
+    gaps = []
+    if from_ts < state.synced_from:
+        gaps.append((from_ts, state.synced_from))
+    if to_ts - state.synced_to > freshness:
+        gaps.append((state.synced_to, to_ts))
+    return gaps
+
+
+def accounts_with_holds(session: Session, account_ids: list[str], from_ts: int, to_ts: int) -> set[str]:
+    stmt = (
+        select(Transaction.account_id)
+        .where(
+            Transaction.account_id.in_(account_ids),
+            Transaction.hold.is_(True),
+            Transaction.time >= from_ts,
+            Transaction.time <= to_ts,
+        )
+        .distinct()
+    )
+    return set(session.scalars(stmt))
+
+
+def record_balances(session: Session, balances: dict[str, int], taken_at: int, unchanged: set[str]) -> None:
+    """Stores balances fetched at ``taken_at`` for the accounts synced at least up to that moment."""
+    for state in get_sync_states(session, list(balances)).values():
+        if state.account_id in unchanged:
+            # an unchanged balance only proves there were no transactions until it was fetched
+            state.synced_to = max(state.synced_to, taken_at)
+        if state.synced_to >= taken_at:
+            state.balance = balances[state.account_id]
+
+
+def split_windows(from_ts: int, to_ts: int, window: int = STATEMENT_MAX_WINDOW_SECONDS) -> list[tuple[int, int]]:
+    windows = []
+    while to_ts > from_ts:
+        windows.append((max(from_ts, to_ts - window), to_ts))
+        to_ts -= window
+    return windows or [(from_ts, to_ts)]
+
+
+def _to_row(account_id: str, record: StatementRecord) -> dict:
+    return {
+        "id": record.id,
+        "account_id": account_id,
+        "time": record.time,
+        "amount": record.amount,
+        "mcc": record.mcc,
+        "hold": record.hold,
+        "description": record.description,
+        "balance": record.balance,
+    }
+
+
+def upsert_transactions(session: Session, account_id: str, items: list[StatementRecord]) -> None:
+    if not items:
+        return
+
+    rows = {item.id: _to_row(account_id, item) for item in items}
+    existing = set(session.scalars(select(Transaction.id).where(Transaction.id.in_(rows))))
+
+    new_rows = [row for tx_id, row in rows.items() if tx_id not in existing]
+    updated_rows = [row for tx_id, row in rows.items() if tx_id in existing]
+    if new_rows:
+        session.execute(insert(Transaction), new_rows)
+    if updated_rows:
+        session.execute(update(Transaction), updated_rows)
+
+
+def store_statement(session: Session, account_id: str, items: list[StatementRecord], from_ts: int, to_ts: int) -> None:
+    upsert_transactions(session, account_id, items)
+
+    if len(items) >= STATEMENT_PAGE_SIZE:
+        from_ts = min(item.time for item in items)
+        logger.debug(f"Statement page for account {account_id} is full, covers from {from_ts} only")
+
+    state = session.get(AccountSyncState, account_id)
+    if state is None:
+        session.add(AccountSyncState(account_id=account_id, synced_from=from_ts, synced_to=to_ts))
+    elif to_ts < state.synced_from or from_ts > state.synced_to:
+        state.synced_from, state.synced_to = from_ts, to_ts
+    else:
+        state.synced_from = min(state.synced_from, from_ts)
+        state.synced_to = max(state.synced_to, to_ts)
+
+
+def load_transactions(
+    session: Session, account_ids: list[str], from_ts: int, to_ts: int
+) -> list[tuple[str, int, int, int, str | None]]:
+    stmt = select(
+        Transaction.account_id, Transaction.amount, Transaction.mcc, Transaction.time, Transaction.description
+    ).where(
+        Transaction.account_id.in_(account_ids),
+        Transaction.time >= from_ts,
+        Transaction.time <= to_ts,
+    )
+    return [tuple(row) for row in session.execute(stmt)]
@@ -0,0 +1,203 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.database.models import User
+from src.settings import USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHECK_CHUNK_SIZE = 500
+# Columns that may wait for the next sync; tokens, accounts and report times are written right away,
+# the latter because report ticks of every process read them from the database
+WRITE_BEHIND_COLUMNS = frozenset({"first_name", "last_name", "username", "language_code", "block_date"})
+
+
+@dataclass
+class _Entry:
+    user: User
+    version: int
+    cached_at: float
+
+
+class UserCache:
+    """Per-process cache of detached users with write-behind of their profile columns.
+
+    update() changes the cached user at once and only remembers the columns whose
+    value actually changed. sync() writes them for all users in one transaction and
+    evicts users another process changed since they were cached, which the version
+    incremented by every write to ``users`` reveals.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._dirty: dict[int, dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+        self.written = 0
+        self.conflicts = 0
+        self.evicted = 0
+
+    def get(self, user_id: int) -> User | None:
+        entry = self._entries.get(user_id)
+        if entry is None or (user_id not in self._dirty and time.monotonic() - entry.cached_at > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(user_id)
+        return entry.user
+
+    def put(self, user: User) -> User:
+        """Caches a detached user read from the database, with its changes that are not written yet."""
+        for key, value in self._dirty.get(user.id, {}).items():
+            setattr(user, key, value)
+        self._entries[user.id] = _Entry(user, user.version, time.monotonic())
+        self._entries.move_to_end(user.id)
+        if len(self._entries) > self.max_size:
+            # users with pending changes stay until they are written
+            clean = [user_id for user_id in self._entries if user_id not in self._dirty]
+            for user_id in clean[: len(self._entries) - self.max_size]:
+                del self._entries[user_id]
+        return user
+
+    def update(self, user: User, **values) -> bool:
+        """Sets columns of a cached user, returns whether that left anything to write."""
+        unknown = set(values) - WRITE_BEHIND_COLUMNS
+        if unknown:
+            raise ValueError(f"Columns {sorted(unknown)} cannot be written behind")
+
+        changes = {key: value for key, value in values.items() if getattr(user, key) != value}
+        if not changes:
+            self.unchanged += 1
+            return False
+        for key, value in changes.items():
+            setattr(user, key, value)
+        self._dirty.setdefault(user.id, {}).update(changes)
+        return True
+
+    def take(self, user_id: int) -> dict[str, Any]:
+        """Removes and returns the pending changes of a user, to write them together with others."""
+        return self._dirty.pop(user_id, {})
+
+    def restore(self, user_id: int, values: dict[str, Any]) -> None:
+        if values:
+            # changes made since they were taken are newer
+            self._dirty[user_id] = {**values, **self._dirty.get(user_id, {})}
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._dirty.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def as_dict(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "pending": self.pending,
+            "hits": self.hits,
+            "misses": self.misses,
+            "unchanged": self.unchanged,
+            "written": self.written,
+            "conflicts": self.conflicts,
+            "evicted": self.evicted,
+        }
+
+    @staticmethod
+    def _write(session: Session, changes: dict[int, dict[str, Any]], versions: dict[int, int | None]) -> list[int]:
+        """Writes pending columns, returns the users whose row was changed by someone else meanwhile."""
+        conflicts = []
+        for user_id, values in changes.items():
+            stmt = update(User).where(User.id == user_id).values(values)
+            version = versions[user_id]
+            if version is None:
+                session.execute(stmt)
+            elif not session.execute(stmt.where(User.version == version)).rowcount:
+                # the user's latest choice still wins, but the cached copy is outdated
+                session.execute(stmt)
+                conflicts.append(user_id)
+        return conflicts
+
+    @staticmethod
+    def _changed(session: Session, versions: dict[int, int]) -> list[int]:
+        user_ids = list(versions)
+        changed = []
+        for start in range(0, len(user_ids), CHECK_CHUNK_SIZE):
+            chunk = user_ids[start : start + CHECK_CHUNK_SIZE]
+            current = dict(session.execute(select(User.id, User.version).where(User.id.in_(chunk))).all())
+            changed.extend(user_id for user_id in chunk if current.get(user_id) != versions[user_id])
+        return changed
+
+    async def flush(self) -> int:
+        """Writes the pending changes of all users in one transaction, returns the number of users written."""
+        changes, self._dirty = self._dirty, {}
+        if not changes:
+            return 0
+
+        versions = {user_id: entry.version if (entry := self._entries.get(user_id)) else None for user_id in changes}
+        try:
+            conflicts = set(await run_db(self._write, changes, versions))
+        except Exception:
+            for user_id, values in changes.items():
+                self.restore(user_id, values)
+            raise
+
+        for user_id in changes:
+            entry = self._entries.get(user_id)
+            # skip entries replaced by a fresh copy while the write was running
+            if entry is None or entry.version != versions[user_id]:
+                continue
+            if user_id in conflicts:
+                del self._entries[user_id]
+            else:
+                entry.version += 1
+        self.written += len(changes)
+        self.conflicts += len(conflicts)
+        logger.debug(f"Wrote cached changes of {len(changes)} users ({len(conflicts)} changed elsewhere)")
+        return len(changes)
+
+    async def refresh(self) -> int:
+        """Evicts expired users and users another process changed, returns how many were evicted."""
+        now = time.monotonic()
+        expired = [
+            user_id
+            for user_id, entry in self._entries.items()
+            if user_id not in self._dirty and now - entry.cached_at > self.ttl
+        ]
+        for user_id in expired:
+            del self._entries[user_id]
+
+        versions = {user_id: entry.version for user_id, entry in self._entries.items() if user_id not in self._dirty}
+        if not versions:
+            return len(expired)
+
+        changed = await run_db(self._changed, versions)
+        evicted = 0
+        for user_id in changed:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == versions[user_id]:
+                del self._entries[user_id]
+                evicted += 1
+        self.evicted += evicted
+        return len(expired) + evicted
+
+    async def sync(self) -> int:
+        written = await self.flush()
+        await self.refresh()
+        return written
+
+
+user_cache = UserCache()
@@ -0,0 +1,195 @@
+import asyncio
+import hmac
+import json
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.database.models import UserAccount
+from src.lib.crypto import webhook_signature, webhook_signatures
+from src.services.decoding import StatementRecord
+from src.services.transaction_store import upsert_transactions
+from src.settings import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PUBLIC_URL
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH_PREFIX = "/monobank"
+MAX_BODY_SIZE = 64 * 1024
+READ_TIMEOUT_SECONDS = 10
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class WebhookPayloadError(ValueError):
+    pass
+
+
+def webhook_url(user_id: int, base_url: str = WEBHOOK_PUBLIC_URL) -> str:
+    return f"{base_url.rstrip('/')}{WEBHOOK_PATH_PREFIX}/{user_id}/{webhook_signature(user_id)}"
+
+
+def is_webhook_url(url: str, base_url: str = WEBHOOK_PUBLIC_URL) -> bool:
+    return bool(base_url) and url.startswith(f"{base_url.rstrip('/')}{WEBHOOK_PATH_PREFIX}/")
+
+
+def parse_webhook_path(path: str) -> int | None:
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if len(parts) != 3 or f"/{parts[0]}" != WEBHOOK_PATH_PREFIX or not parts[1].isdigit():
+        return None
+
+    user_id = int(parts[1])
+    # Webhooks registered before a master key rotation keep working
+    if not any(hmac.compare_digest(parts[2], signature) for signature in webhook_signatures(user_id)):
+        return None
+    return user_id
+
+
+def parse_statement_item(body: bytes) -> tuple[str, StatementRecord]:
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise WebhookPayloadError(f"Invalid JSON: {e}") from e
+
+    if not isinstance(payload, dict) or payload.get("type") != "StatementItem":
+        raise WebhookPayloadError("Unsupported payload type")
+
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        raise WebhookPayloadError("Missing data")
+
+    account = data.get("account")
+    item = data.get("statementItem")
+    if not isinstance(account, str) or not isinstance(item, dict):
+        raise WebhookPayloadError("Missing account or statementItem")
+
+    if not isinstance(item.get("id"), str) or not isinstance(item.get("time"), int):
+        raise WebhookPayloadError("Invalid statementItem")
+    for field in ("amount", "mcc"):
+        if not isinstance(item.get(field, 0), int):
+            raise WebhookPayloadError(f"Invalid statementItem {field}")
+    if not isinstance(item.get("description") or "", str):
+        raise WebhookPayloadError("Invalid statementItem description")
+
+    return account, StatementRecord.from_dict(item)
+
+
+def _store_statement_item(session: Session, user_id: int, account: str, item: StatementRecord) -> bool:
+    stmt = select(UserAccount.account_id).where(UserAccount.user_id == user_id, UserAccount.account_id == account)
+    if session.scalar(stmt) is None:
+        return False
+    upsert_transactions(session, account, [item])
+    return True
+
+
+async def store_statement_item(user_id: int, account: str, item: StatementRecord) -> bool:
+    """Stores a pushed item if ``account`` is one of the user's selected accounts, returns whether it was stored."""
+    return await run_db(_store_statement_item, user_id, account, item)
+
+
+class WebhookServer:
+    def __init__(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT):
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._server: asyncio.Server | None = None
+
+    @property
+    def bound_port(self) -> int | None:
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Monobank webhook server listening on {self.host}:{self.bound_port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info(
+                f"Monobank webhook server stopped (received={self.received}, rejected={self.rejected}, dropped={self.dropped})"
+            )
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        method, path, _version = request_line.split(" ", 2)
+
+        content_length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value.strip())
+
+        if content_length > MAX_BODY_SIZE:
+            raise OverflowError(content_length)
+
+        body = await reader.readexactly(content_length) if content_length else b""
+        return method.upper(), path, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> int:
+        user_id = parse_webhook_path(path)
+        if user_id is None:
+            return 404
+
+        if method == "GET":
+            return 200
+        if method != "POST":
+            return 405
+
+        try:
+            account, item = parse_statement_item(body)
+        except WebhookPayloadError as e:
+            logger.warning(f"Rejected webhook payload for user {user_id}: {e}")
+            return 400
+
+        if not await store_statement_item(user_id, account, item):
+            # acknowledged anyway, Monobank disables webhooks that keep failing
+            self.dropped += 1
+            logger.warning(f"Dropped pushed transaction {item.id}: account is not selected by user {user_id}")
+            return 200
+
+        self.received += 1
+        logger.debug(f"Stored pushed transaction {item.id} for user {user_id}")
+        return 200
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            async with asyncio.timeout(READ_TIMEOUT_SECONDS):
+                method, path, body = await self._read_request(reader)
+            status = await self._dispatch(method, path, body)
+        except OverflowError:
+            status = 413
+        except (ValueError, asyncio.IncompleteReadError, TimeoutError):
+            status = 400
+        except Exception as e:
+            logger.error(f"Failed to process webhook request: {e}")
+            status = 500
+
+        if status != 200:
+            self.rejected += 1
+
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode()
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+webhook_server = WebhookServer()
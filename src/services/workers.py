@@ -0,0 +1,121 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.configuration import run_db
+from src.database.models import Lease, WorkerHeartbeat
+from src.settings import WORKER_ID, WORKER_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = "leader"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()[:32]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int = 0
+    count: int = 1
+
+    def owns(self, user_id: int) -> bool:
+        return user_id % self.count == self.index
+
+
+class WorkerRegistry:
+    """Membership of the bot processes that share one database.
+
+    Every worker upserts its row in ``workers`` on each heartbeat and takes the
+    live workers, ordered by id, as the shard layout: a user belongs to the worker
+    at position ``user_id % count``. A worker that stops heartbeating drops out
+    after the TTL and the others pick up its users on their next heartbeat. One
+    worker also holds the ``leader`` lease and runs the jobs that must not run
+    twice; the lease expires with the same TTL.
+    """
+
+    def __init__(self, worker_id: str | None = None, ttl: float = WORKER_TTL_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self.shard = Shard()
+        self.is_leader = False
+        self.started_at = time.time()
+
+    def _touch(self, session: Session, now: float) -> None:
+        stmt = update(WorkerHeartbeat).where(WorkerHeartbeat.id == self.worker_id).values(heartbeat_at=now)
+        if session.execute(stmt).rowcount == 0:
+            session.add(WorkerHeartbeat(id=self.worker_id, started_at=self.started_at, heartbeat_at=now))
+            session.flush()
+
+    def _acquire_lease(self, session: Session, name: str, now: float) -> bool:
+        stmt = (
+            update(Lease)
+            .where(Lease.name == name, (Lease.holder == self.worker_id) | (Lease.expires_at < now))
+            .values(holder=self.worker_id, expires_at=now + self.ttl)
+        )
+        if session.execute(stmt).rowcount:
+            return True
+        if session.get(Lease, name) is not None:
+            return False
+
+        session.add(Lease(name=name, holder=self.worker_id, expires_at=now + self.ttl))
+        session.flush()
+        return True
+
+    def _beat(self, session: Session) -> tuple[list[str], bool]:
+        now = time.time()
+        self._touch(session, now)
+        is_leader = self._acquire_lease(session, LEADER_LEASE, now)
+        if is_leader:
+            session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.heartbeat_at < now - self.ttl))
+        stmt = (
+            select(WorkerHeartbeat.id)
+            .where(WorkerHeartbeat.heartbeat_at >= now - self.ttl)
+            .order_by(WorkerHeartbeat.id)
+        )
+        return list(session.scalars(stmt)), is_leader
+
+    async def heartbeat(self) -> bool:
+        for attempt in range(2):
+            try:
+                live, is_leader = await run_db(self._beat)
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+
+        shard = Shard(live.index(self.worker_id), len(live))
+        changed = shard != self.shard
+        if changed:
+            logger.info(f"Worker {self.worker_id} now owns shard {shard.index + 1} of {shard.count}")
+        if is_leader != self.is_leader:
+            logger.info(f"Worker {self.worker_id} {'became' if is_leader else 'lost'} the leader lease")
+
+        self.shard = shard
+        self.is_leader = is_leader
+        return changed
+
+    def live_since(self) -> float:
+        return time.time() - self.ttl
+
+    def _leave(self, session: Session) -> None:
+        session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.id == self.worker_id))
+        session.execute(update(Lease).where(Lease.holder == self.worker_id).values(expires_at=0.0))
+
+    async def leave(self) -> None:
+        await run_db(self._leave)
+
+        self.shard = Shard()
+        self.is_leader = False
+        logger.info(f"Worker {self.worker_id} left")
+
+
+worker_registry = WorkerRegistry(str(WORKER_ID) if WORKER_ID else None)
@@ -16,10 +16,73 @@ TIMEZONE = "Europe/Kiev"
 BOT_TOKEN = ""
 
 DATABASE_URL = "sqlite:///data/bot.db"
+DATABASE_ASYNC = False
+DATABASE_ASYNC_URL = ""
+DATABASE_POOL_SIZE = 5
+DATABASE_MAX_OVERFLOW = 10
+SQLITE_JOURNAL_MODE = "WAL"
+SQLITE_SYNCHRONOUS = "NORMAL"
+SQLITE_BUSY_TIMEOUT_MS = 5000
 
 REPORT_HOUR = 21
 REPORT_MINUTE = 0
 
+STATEMENT_RATE_LIMIT_SECONDS = 60
+STATEMENT_RATE_LIMIT_BURST = 1
+CLIENT_INFO_RATE_LIMIT_SECONDS = 60
+CLIENT_INFO_RATE_LIMIT_BURST = 1
+RATE_LIMIT_EVICT_AFTER_SECONDS = 7 * 24 * 60 * 60
+CLIENT_INFO_CACHE_TTL_SECONDS = 300
+CLIENT_INFO_CACHE_MAX_STALE_SECONDS = 24 * 60 * 60
+CLIENT_INFO_CACHE_MAX_SIZE = 10000
+MONOBANK_MAX_CONCURRENT_REQUESTS = 20
+STATEMENT_SYNC_FRESHNESS_SECONDS = 60
+STATEMENT_JSON_BACKEND = "auto"
+STATEMENT_SKIP_UNCHANGED_BALANCE = True
+
+WEBHOOK_ENABLED = False
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+WEBHOOK_PUBLIC_URL = ""
+WEBHOOK_RECONCILE_SECONDS = 6 * 60 * 60
+
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 90.0
+HTTP_TIMEOUT = 30.0
+HTTP_CONNECT_TIMEOUT = 10.0
+HTTP2_ENABLED = True
+HTTP_WARM_UP_SECONDS = 15
+
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_CHAT_BURST = 3
+TELEGRAM_GROUP_RATE_PER_MINUTE = 20
+TELEGRAM_MAX_RETRIES = 3
+
+REPORT_CONCURRENCY = 50
+REPORT_USER_TIMEOUT_SECONDS = 300
+REPORT_PREFETCH_ENABLED = True
+REPORT_PREFETCH_MARGIN_SECONDS = 30
+REPORT_PREFETCH_MAX_LEAD_SECONDS = 15 * 60
+REPORT_OUTBOX_ACK_BATCH_SIZE = 100
+REPORT_CATCH_UP_SECONDS = 3 * 60 * 60
+REPORT_RECIPIENT_CHUNK_SIZE = 500
+
+TOKEN_KEY_CACHE_MAX_SIZE = 10000
+TOKEN_KEY_CACHE_TTL_SECONDS = 60 * 60
+TOKEN_KEY_DERIVATION_THREADS = 4
+TOKEN_DECRYPT_PROCESSES = 0
+TOKEN_DECRYPT_CHUNK_SIZE = 256
+
+USER_CACHE_TTL_SECONDS = 10 * 60
+USER_CACHE_MAX_SIZE = 10000
+USER_CACHE_SYNC_SECONDS = 10
+
+WORKER_ID = ""
+WORKER_HEARTBEAT_SECONDS = 15
+WORKER_TTL_SECONDS = 60
+
 vars_copy = locals().copy()
 local_variables = locals()
 for key in vars_copy:
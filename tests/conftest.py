@@ -3,8 +3,15 @@ from unittest.mock import patch
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
+from src.database.configuration import async_database_url
 from src.database.models import Base, User
+from src.services.client_info_cache import client_info_cache
+from src.services.decoding import StatementRecord
+from src.services.rate_limiter import CLIENT_INFO, STATEMENT, BucketLimit, RateLimiter
+from src.services.scheduler import statement_scheduler
+from src.services.user_cache import user_cache
 
 
 @pytest.fixture
@@ -14,6 +21,61 @@ def tmp_secret_key(tmp_path):
         yield secret_file
 
 
+def _async_sessionmaker(url: str):
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        # without a pool no connection outlives the test, so the engine needs no async dispose
+        async_engine = create_async_engine(async_database_url(url), poolclass=NullPool)
+    except ImportError:
+        return None
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with (
+        patch("src.database.configuration.sm", sessionmaker(bind=engine, autoflush=False, autocommit=False)),
+        patch("src.database.configuration.async_sm", _async_sessionmaker(url)),
+    ):
+        yield engine
+    engine.dispose()
+
+
+@pytest.fixture(params=[False, True], ids=["sync", "async"])
+def database_mode(request):
+    """Runs a test once with regular sessions in a thread and once on the async engine."""
+    if request.param:
+        pytest.importorskip("aiosqlite")
+    with patch("src.database.configuration.DATABASE_ASYNC", request.param):
+        yield request.param
+
+
+@pytest.fixture(autouse=True)
+def clear_client_info_cache():
+    yield
+    client_info_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    yield
+    user_cache.clear()
+
+
+@pytest.fixture
+def no_rate_limit():
+    limiter = RateLimiter({STATEMENT: BucketLimit(0), CLIENT_INFO: BucketLimit(0)})
+    with (
+        patch("src.services.monobank.rate_limiter", limiter),
+        patch.object(statement_scheduler, "limiter", limiter),
+    ):
+        yield limiter
+
+
 @pytest.fixture
 def engine():
     engine = create_engine("sqlite:///:memory:")
@@ -83,6 +145,11 @@ def sample_transactions():
     ]
 
 
+@pytest.fixture
+def sample_records(sample_transactions):
+    return [StatementRecord.from_dict(tx) for tx in sample_transactions]
+
+
 @pytest.fixture
 def sample_accounts():
     return [
@@ -0,0 +1,75 @@
+import pytest
+
+from src.services.aggregation import TransactionBatch, np
+from src.services.categorization import CategoryRule, compile_rules
+
+requires_numpy = pytest.mark.skipif(np is None, reason="numpy is not installed")
+
+
+@pytest.fixture
+def batch(sample_transactions):
+    batch = TransactionBatch()
+    batch.extend(
+        1, [("account1", tx["amount"], tx["mcc"], tx["time"], tx["description"]) for tx in sample_transactions]
+    )
+    batch.extend(2, [("account2", -1000, 5812, 1705660900, "Aroma Kava"), ("account2", -50, -1, 1705660901, None)])
+    return batch
+
+
+class TestTransactionBatch:
+    def test_columns(self, batch):
+        assert len(batch) == 6
+        assert batch.users == [1, 2]
+        assert batch.accounts == ["account1", "account2"]
+        assert list(batch.user_idx) == [0, 0, 0, 0, 1, 1]
+
+    def test_python_aggregation(self, batch):
+        default = compile_rules()
+        first, second = batch.aggregate([default, default], ["uk", "en"], vectorized=False)
+
+        assert first["total_spending"] == 70000
+        assert first["total_income"] == 500000
+        assert first["transaction_count"] == 4
+        assert [c["key"] for c in first["categories"]] == ["transport", "restaurants", "groceries"]
+        assert second["total_spending"] == 1050
+        assert {c["key"]: c["amount"] for c in second["categories"]} == {"restaurants": 1000, "other": 50}
+
+    @requires_numpy
+    def test_vectorized_matches_python(self, batch):
+        categorizers = [compile_rules(), compile_rules((CategoryRule("coffee", pattern="kava"),))]
+        languages = ["uk", "en"]
+
+        assert batch.aggregate(categorizers, languages, vectorized=True) == batch.aggregate(
+            categorizers, languages, vectorized=False
+        )
+
+    @requires_numpy
+    def test_vectorized_per_user_rules(self, batch):
+        categorizers = [compile_rules(), compile_rules((CategoryRule("coffee", pattern="kava"),))]
+        _, second = batch.aggregate(categorizers, ["uk", "en"], vectorized=True)
+
+        assert {c["key"]: c["amount"] for c in second["categories"]} == {"coffee": 1000, "other": 50}
+
+    @pytest.mark.parametrize("vectorized", [False, pytest.param(True, marks=requires_numpy)])
+    def test_patterns_matched_one_by_one(self, batch, vectorized):
+        # an inline global flag cannot be combined into one expression, so these are matched one by one
+        fallback = compile_rules((CategoryRule("coffee", pattern="(?i)kava"),))
+        assert fallback.matcher is None
+
+        _, second = batch.aggregate([compile_rules(), fallback], ["uk", "en"], vectorized=vectorized)
+
+        assert {c["key"]: c["amount"] for c in second["categories"]} == {"coffee": 1000, "other": 50}
+
+    def test_user_without_transactions(self):
+        batch = TransactionBatch()
+        batch.add_user(1)
+
+        result = batch.aggregate([compile_rules()], ["uk"])[0]
+        assert result == {"total_spending": 0, "total_income": 0, "categories": [], "transaction_count": 0}
+
+    def test_descriptions_are_deduplicated(self):
+        batch = TransactionBatch()
+        batch.extend(1, [("account1", -100, 5411, 1, "Silpo"), ("account1", -200, 5411, 2, "Silpo")])
+
+        assert batch.descriptions == [None, "Silpo"]
+        assert list(batch.description_idx) == [1, 1]
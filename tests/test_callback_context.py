@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from src.database import configuration
+from src.database.configuration import SessionStats, run_db
+from src.database.models import User
+from src.lib.callback_context import UpdateSessionProcessor
+
+
+def _user_ids(session) -> list[int]:
+    return list(session.scalars(select(User.id)))
+
+
+@pytest.fixture
+def stats():
+    stats = SessionStats()
+    with patch.object(configuration, "session_stats", stats):
+        yield stats
+
+
+class TestUpdateSessionStats:
+    @pytest.mark.asyncio
+    async def test_updates_without_database_access_use_no_session(self, stats):
+        async def handle():
+            pass
+
+        await UpdateSessionProcessor(1).process_update(object(), handle())
+
+        assert (stats.updates, stats.sessions, stats.connections) == (1, 0, 0)
+        assert stats.as_dict()["without_session"] == 1
+
+    @pytest.mark.asyncio
+    async def test_run_db_calls_are_counted_per_update(self, stats):
+        async def handle():
+            await run_db(_user_ids)
+            await run_db(_user_ids)
+
+        await UpdateSessionProcessor(1).process_update(object(), handle())
+
+        result = stats.as_dict()
+        assert (result["sessions"], result["max_sessions_per_update"], result["without_session"]) == (2, 2, 0)
+        assert stats.update_connections == stats.connections >= 2
+
+    @pytest.mark.asyncio
+    async def test_usage_outside_updates_is_not_attributed(self, stats):
+        await run_db(_user_ids)
+
+        async def handle():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await UpdateSessionProcessor(1).process_update(object(), handle())
+
+        assert (stats.sessions, stats.updates, stats.update_sessions) == (1, 1, 0)
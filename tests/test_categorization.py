@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.database.configuration import get_session
+from src.database.models import UserCategoryRule
+from src.services import categorization
+from src.services.categorization import CategoryRule, check_pattern, compile_rules, get_category_name, load_user_rules
+
+
+class TestCompileRules:
+    def test_builtin_codes(self):
+        categorizer = compile_rules()
+        assert categorizer.categorize(5411) == "groceries"
+        assert categorizer.categorize(4829) == "transfers"
+
+    def test_out_of_range_mcc(self):
+        categorizer = compile_rules()
+        assert categorizer.categorize(-1) == "other"
+        assert categorizer.categorize(10000) == "other"
+
+    def test_user_override_wins_over_builtin(self):
+        categorizer = compile_rules((CategoryRule("coffee", 5814, 5814),))
+        assert categorizer.categorize(5814) == "coffee"
+        assert categorizer.categorize(5812) == "restaurants"
+
+    def test_user_range(self):
+        categorizer = compile_rules((CategoryRule("travel", 3500, 3999),))
+        assert categorizer.categorize(3500) == "travel"
+        assert categorizer.categorize(3750) == "travel"
+        assert categorizer.categorize(4000) == "other"
+
+    def test_patterns_match_description(self):
+        rules = (
+            CategoryRule("coffee", pattern="starbucks|aroma kava"),
+            CategoryRule("groceries", pattern="silpo"),
+        )
+        categorizer = compile_rules(rules)
+        assert categorizer.categorize(5812, "STARBUCKS Kyiv") == "coffee"
+        assert categorizer.categorize(0, "Silpo #12") == "groceries"
+        assert categorizer.categorize(5812, "McDonald's") == "restaurants"
+
+    def test_patterns_sharing_category_and_groups(self):
+        rules = (CategoryRule("coffee", pattern="(star)bucks"), CategoryRule("coffee", pattern="lviv croissants"))
+        categorizer = compile_rules(rules)
+        assert categorizer.categorize(0, "Starbucks") == "coffee"
+        assert categorizer.categorize(0, "Lviv Croissants") == "coffee"
+
+    def test_invalid_pattern_is_skipped(self):
+        categorizer = compile_rules((CategoryRule("broken", pattern="("), CategoryRule("coffee", pattern="kava")))
+        assert categorizer.categorize(0, "kava") == "coffee"
+
+    def test_patterns_reusing_a_group_name(self):
+        rules = (CategoryRule("coffee", pattern="(?P<shop>aroma)"), CategoryRule("pets", pattern="(?P<shop>zoo)"))
+        categorizer = compile_rules(rules)
+        assert categorizer.matcher is None
+        assert categorizer.categorize(0, "Aroma Kava") == "coffee"
+        assert categorizer.categorize(0, "Zoo Market") == "pets"
+        assert categorizer.categorize(5411, "Silpo") == "groceries"
+
+    def test_catastrophic_patterns_are_rejected(self):
+        for pattern in ["(a+)+$", "(\\w*)*x", "(a|aa){2,}(b+)*", "(a)\\1", "x" * 101]:
+            with pytest.raises(ValueError):
+                check_pattern(pattern)
+        check_pattern("starbucks|aroma (kava)?")
+
+        categorizer = compile_rules((CategoryRule("slow", pattern="(a+)+$"),))
+        assert categorizer.categorize(5411, "a" * 40 + "!") == "groceries"
+
+    def test_patterns_are_checked_without_the_private_parser(self):
+        with patch.object(categorization, "sre_parse", None):
+            for pattern in [
+                "(a+)+$",
+                "(\\w*)*x",
+                "(a|aa){2,}(b+)*",
+                "((a)+)+",
+                "(a)\\1",
+                "(?P<x>a)(?P=x)",
+                "(",
+                "x" * 101,
+            ]:
+                with pytest.raises(ValueError):
+                    check_pattern(pattern)
+            for pattern in ["starbucks|aroma (kava)?", "(?i)kava", "(?P<shop>zoo)", "\\(a+\\)+"]:
+                check_pattern(pattern)
+
+    def test_compiled_table_is_cached_per_rule_set(self):
+        rules = (CategoryRule("coffee", 5814, 5814),)
+        assert compile_rules(rules) is compile_rules((CategoryRule("coffee", 5814, 5814),))
+        assert compile_rules(rules) is not compile_rules((CategoryRule("coffee", 5813, 5813),))
+
+
+class TestUserRules:
+    @pytest.mark.asyncio
+    async def test_load_user_rules(self):
+        session = get_session()
+        with session.begin():
+            session.add(UserCategoryRule(user_id=1, category="coffee", mcc_from=5814, mcc_to=5814))
+            session.add(UserCategoryRule(user_id=1, category="pets", pattern="zoo"))
+            session.add(UserCategoryRule(user_id=2, category="other_user", pattern="x"))
+        session.close()
+
+        assert await load_user_rules(1) == (
+            CategoryRule("coffee", 5814, 5814),
+            CategoryRule("pets", pattern="zoo"),
+        )
+
+    def test_custom_category_name(self):
+        assert get_category_name("☕ Coffee", "en") == "☕ Coffee"
@@ -0,0 +1,126 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from src.services.client_info_cache import ClientInfoCache
+from src.services.monobank import MonobankAPIError, MonobankRateLimitError, MonobankService
+
+CLIENT_INFO = {"clientId": "test", "accounts": [{"id": "acc1", "balance": 100}]}
+
+
+class TestClientInfoCache:
+    @pytest.mark.asyncio
+    async def test_fresh_entry_is_served_from_cache(self):
+        cache = ClientInfoCache(ttl=60)
+        fetch = AsyncMock(return_value=CLIENT_INFO)
+
+        assert await cache.get("token", fetch) == CLIENT_INFO
+        assert await cache.get("token", fetch) == CLIENT_INFO
+
+        assert fetch.call_count == 1
+        assert cache.stats["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_refetched(self):
+        cache = ClientInfoCache(ttl=0)
+        fetch = AsyncMock(return_value=CLIENT_INFO)
+
+        await cache.get("token", fetch)
+        await cache.get("token", fetch)
+
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_request(self):
+        cache = ClientInfoCache(ttl=60)
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return CLIENT_INFO
+
+        fetch_mock = AsyncMock(side_effect=fetch)
+        tasks = [asyncio.create_task(cache.get("token", fetch_mock)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*tasks) == [CLIENT_INFO] * 5
+        assert fetch_mock.call_count == 1
+        assert cache.stats["coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_the_error(self):
+        cache = ClientInfoCache(ttl=60)
+
+        async def fetch():
+            await asyncio.sleep(0)
+            raise MonobankAPIError("Invalid token", status_code=401)
+
+        results = await asyncio.gather(*(cache.get("token", fetch) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, MonobankAPIError) for result in results)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "error",
+        [
+            MonobankRateLimitError(retry_after=30),
+            MonobankAPIError("API error", status_code=503),
+            httpx.ConnectError("unreachable"),
+        ],
+    )
+    async def test_stale_entry_is_served_on_transient_error(self, error):
+        cache = ClientInfoCache(ttl=0)
+        await cache.get("token", AsyncMock(return_value=CLIENT_INFO))
+
+        assert await cache.get("token", AsyncMock(side_effect=error)) == CLIENT_INFO
+        assert cache.stats["stale"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_token_is_not_masked_by_stale_entry(self):
+        cache = ClientInfoCache(ttl=0)
+        await cache.get("token", AsyncMock(return_value=CLIENT_INFO))
+
+        with pytest.raises(MonobankAPIError):
+            await cache.get("token", AsyncMock(side_effect=MonobankAPIError("Invalid token", status_code=401)))
+
+    @pytest.mark.asyncio
+    async def test_too_old_entry_is_not_served(self):
+        cache = ClientInfoCache(ttl=0, max_stale=0)
+        await cache.get("token", AsyncMock(return_value=CLIENT_INFO))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(MonobankRateLimitError):
+            await cache.get("token", AsyncMock(side_effect=MonobankRateLimitError()))
+
+    @pytest.mark.asyncio
+    async def test_invalidate_forces_refetch(self):
+        cache = ClientInfoCache(ttl=60)
+        fetch = AsyncMock(return_value=CLIENT_INFO)
+
+        await cache.get("token", fetch)
+        cache.invalidate("token")
+        await cache.get("token", fetch)
+
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_size_is_bounded(self):
+        cache = ClientInfoCache(ttl=60, max_size=2)
+        for token in ("a", "b", "c"):
+            await cache.get(token, AsyncMock(return_value=CLIENT_INFO))
+        assert cache.stats["size"] == 2
+
+
+class TestMonobankServiceClientInfo:
+    @pytest.mark.asyncio
+    async def test_validate_then_list_accounts_makes_one_request(self):
+        response = httpx.Response(200, json=CLIENT_INFO)
+        with patch("src.services.monobank.http_pool.get", new_callable=AsyncMock, return_value=response) as mock:
+            assert await MonobankService("token").validate_token() is True
+            accounts = await MonobankService("token").get_accounts()
+
+        assert accounts == CLIENT_INFO["accounts"]
+        assert mock.call_count == 1
@@ -1,6 +1,29 @@
+import base64
+import threading
 from unittest.mock import patch
 
-from src.lib.crypto import decrypt_token, encrypt_token
+import pytest
+from cryptography.fernet import Fernet
+
+from src.lib import crypto
+from src.lib.crypto import (
+    DerivedKeyCache,
+    decrypt_token,
+    decrypt_tokens,
+    encrypt_token,
+    is_legacy_token,
+    needs_reencryption,
+    pending_reencryptions,
+    rotate_master_key,
+    warm_up_user_keys,
+)
+
+TOKEN = "uTestToken123456789012345678901234567890"
+
+
+def legacy_encrypt(token: str, user_id: int) -> str:
+    fernet = Fernet(crypto._pbkdf2_user_key(crypto._get_or_create_master_key(), user_id))
+    return base64.urlsafe_b64encode(fernet.encrypt(token.encode())).decode()
 
 
 class TestTokenEncryption:
@@ -64,3 +87,137 @@ class TestTokenEncryption:
 
             assert decrypted1 == token
             assert decrypted2 == token
+
+
+class TestDerivedKeyCache:
+    def test_legacy_key_is_derived_once_per_user(self, tmp_secret_key):
+        encrypted = legacy_encrypt(TOKEN, 1)
+        with patch.object(crypto, "_pbkdf2_user_key", wraps=crypto._pbkdf2_user_key) as derive:
+            decrypt_token(encrypted, 1)
+            decrypt_token(encrypted, 1)
+
+        assert derive.call_count == 1
+
+    def test_master_key_is_read_once(self, tmp_secret_key):
+        crypto._get_or_create_master_key()
+        tmp_secret_key.write_bytes(b"changed")
+
+        assert crypto._get_or_create_master_key() != b"changed"
+
+    def test_new_master_key_does_not_reuse_derived_keys(self, tmp_path):
+        token = "uTestToken123456789012345678901234567890"
+        with patch.object(crypto, "SECRET_KEY_FILE", tmp_path / "first"):
+            encrypted = encrypt_token(token, 1)
+        with patch.object(crypto, "SECRET_KEY_FILE", tmp_path / "second"):
+            assert decrypt_token(encrypted, 1) is None
+
+    def test_entries_expire_and_are_bounded(self):
+        cache = DerivedKeyCache(max_size=2, ttl=60)
+        cache.put(b"master", 1, b"key1")
+        cache.put(b"master", 2, b"key2")
+        cache.get(b"master", 1)
+        cache.put(b"master", 3, b"key3")
+
+        assert cache.get(b"master", 2) is None
+        assert cache.get(b"master", 1) == b"key1"
+
+        with patch("src.lib.crypto.time.monotonic", return_value=1e12):
+            assert cache.get(b"master", 1) is None
+
+    def test_invalidate_user(self):
+        cache = DerivedKeyCache()
+        cache.put(b"master", 1, b"key1")
+        cache.put(b"master", 2, b"key2")
+
+        cache.invalidate(1)
+
+        assert cache.get(b"master", 1) is None
+        assert cache.get(b"master", 2) == b"key2"
+
+    @pytest.mark.asyncio
+    async def test_warm_up_derives_off_the_event_loop(self, tmp_secret_key):
+        threads = set()
+
+        def derive(master_key, user_id):
+            threads.add(threading.current_thread().name)
+            return b"key"
+
+        tokens = [(1, legacy_encrypt(TOKEN, 1)), (2, legacy_encrypt(TOKEN, 2)), (3, encrypt_token(TOKEN, 3))]
+        with patch.object(crypto, "_pbkdf2_user_key", side_effect=derive) as pbkdf2:
+            await warm_up_user_keys(tokens)
+            await warm_up_user_keys(tokens)
+
+        assert pbkdf2.call_count == 2
+        assert all(name.startswith("token_kdf") for name in threads)
+
+
+class TestTokenEnvelope:
+    def test_new_tokens_use_versioned_envelope(self, tmp_secret_key):
+        encrypted = encrypt_token(TOKEN, 1)
+
+        assert base64.urlsafe_b64decode(encrypted)[0] == crypto.ENVELOPE_VERSION
+        assert not is_legacy_token(encrypted)
+        assert not needs_reencryption(encrypted)
+
+    def test_new_tokens_skip_pbkdf2(self, tmp_secret_key):
+        with patch.object(crypto, "_pbkdf2_user_key") as pbkdf2:
+            assert decrypt_token(encrypt_token(TOKEN, 1), 1) == TOKEN
+        pbkdf2.assert_not_called()
+
+    def test_legacy_tokens_are_still_readable(self, tmp_secret_key):
+        encrypted = legacy_encrypt(TOKEN, 1)
+
+        assert is_legacy_token(encrypted)
+        assert needs_reencryption(encrypted)
+        assert decrypt_token(encrypted, 1) == TOKEN
+
+    def test_rotation_keeps_old_tokens_readable(self, tmp_secret_key, tmp_path):
+        with patch.object(crypto, "RETIRED_KEYS_FILE", tmp_path / ".secret_key.retired"):
+            encrypted = encrypt_token(TOKEN, 1)
+            legacy = legacy_encrypt(TOKEN, 2)
+
+            rotate_master_key()
+
+            assert needs_reencryption(encrypted)
+            assert decrypt_token(encrypted, 1) == TOKEN
+            assert decrypt_token(legacy, 2) == TOKEN
+            assert not needs_reencryption(encrypt_token(TOKEN, 1))
+
+    def test_key_rotated_by_another_process_is_picked_up(self, tmp_secret_key, tmp_path):
+        with patch.object(crypto, "RETIRED_KEYS_FILE", tmp_path / ".secret_key.retired"):
+            crypto._get_or_create_master_key()
+            rotate_master_key()
+            encrypted = encrypt_token(TOKEN, 1)
+            crypto._master_keys[tmp_secret_key] = b"stale-key-of-this-process"
+            crypto._keyrings.clear()
+
+            assert decrypt_token(encrypted, 1) == TOKEN
+
+
+class TestBatchDecryption:
+    @pytest.mark.asyncio
+    async def test_new_tokens_stay_in_process(self, tmp_secret_key):
+        tokens = [(user_id, encrypt_token(TOKEN, user_id)) for user_id in range(1, 4)]
+
+        with patch.object(crypto, "_process_pool") as pool:
+            decrypted = await decrypt_tokens([*tokens, (4, None), (5, "garbage")], chunk_size=2)
+
+        pool.assert_not_called()
+        assert decrypted == {1: TOKEN, 2: TOKEN, 3: TOKEN, 5: None}
+
+    @pytest.mark.asyncio
+    async def test_legacy_tokens_are_decrypted_in_worker_processes(self, tmp_secret_key):
+        pending_reencryptions.drain()
+        tokens = [(user_id, legacy_encrypt(TOKEN, user_id)) for user_id in range(1, 4)]
+        tokens.append((4, encrypt_token(TOKEN, 4)))
+
+        with patch.object(crypto, "TOKEN_DECRYPT_PROCESSES", 2):
+            try:
+                decrypted = await decrypt_tokens(tokens, chunk_size=2)
+            finally:
+                crypto.shutdown_decrypt_pool()
+
+        assert decrypted == {1: TOKEN, 2: TOKEN, 3: TOKEN, 4: TOKEN}
+        reencrypted = pending_reencryptions.drain()
+        assert sorted(reencrypted) == [1, 2, 3]
+        assert all(decrypt_token(new, user_id) == TOKEN for user_id, (_old, new) in reencrypted.items())
@@ -0,0 +1,164 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.jobs import daily_report
+from src.jobs.daily_report import ReportOutcome, TickSummary, fan_out_reports
+from src.services.report_outbox import OutboxItem
+
+SLOT = datetime.datetime(2024, 1, 15, 21, 0, tzinfo=datetime.UTC)
+
+
+def _users(count: int, accounts: list[str] | None = None) -> list[tuple[OutboxItem, SimpleNamespace]]:
+    return [
+        (
+            OutboxItem(i, i, SLOT),
+            SimpleNamespace(id=i, selected_accounts=["account1"] if accounts is None else accounts),
+        )
+        for i in range(count)
+    ]
+
+
+class TestTickSummary:
+    def test_percentiles(self):
+        summary = TickSummary(SLOT, latencies=[float(i) for i in range(1, 101)])
+        assert summary.percentile(50) == 50.0
+        assert summary.percentile(99) == 99.0
+
+    def test_empty_summary(self):
+        summary = TickSummary(SLOT)
+        assert summary.percentile(99) == 0.0
+        assert "sent=0" in str(summary)
+
+
+class TestFanOutReports:
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        active = peak = 0
+
+        async def send(_context, _user, scheduled_for, token):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return ReportOutcome.SENT
+
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            summary = await fan_out_reports(MagicMock(), _users(10), SLOT, concurrency=3)
+
+        assert peak == 3
+        assert summary.outcomes[ReportOutcome.SENT] == 10
+        assert len(summary.latencies) == 10
+
+    @pytest.mark.asyncio
+    async def test_slow_user_does_not_block_others(self):
+        async def send(_context, user, scheduled_for, token):
+            if user.id == 0:
+                await asyncio.sleep(10)
+            return ReportOutcome.SENT
+
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            summary = await fan_out_reports(MagicMock(), _users(3), SLOT, concurrency=3, timeout=0.05)
+
+        assert summary.outcomes[ReportOutcome.SENT] == 2
+        assert summary.outcomes[ReportOutcome.FAILED] == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_and_users_without_accounts_are_counted(self):
+        async def send(_context, user, scheduled_for, token):
+            raise RuntimeError("boom")
+
+        users = _users(2) + _users(1, accounts=[])
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            summary = await fan_out_reports(MagicMock(), users, SLOT)
+
+        assert summary.outcomes[ReportOutcome.FAILED] == 2
+        assert summary.outcomes[ReportOutcome.SKIPPED] == 1
+
+    @pytest.mark.asyncio
+    async def test_pending_reports_are_cancelled_at_next_slot(self):
+        cancelled = []
+
+        async def send(_context, user, scheduled_for, token):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(user.id)
+                raise
+
+        deadline = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=0.05)
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            summary = await fan_out_reports(MagicMock(), _users(2), SLOT, deadline=deadline)
+
+        assert sorted(cancelled) == [0, 1]
+        assert summary.outcomes[ReportOutcome.CANCELLED] == 2
+
+    @pytest.mark.asyncio
+    async def test_results_are_reported_as_they_finish(self):
+        async def send(_context, user, scheduled_for, token):
+            return ReportOutcome.BLOCKED if user.id == 1 else ReportOutcome.SENT
+
+        results = []
+
+        async def on_result(item, outcome):
+            results.append((item.id, outcome))
+
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            await fan_out_reports(MagicMock(), _users(2), SLOT, on_result=on_result)
+
+        assert sorted(results, key=lambda result: result[0]) == [(0, ReportOutcome.SENT), (1, ReportOutcome.BLOCKED)]
+
+
+class TestSendReportToUser:
+    @pytest.mark.asyncio
+    async def test_late_report_covers_the_day_of_its_slot(self):
+        # 23:30 in Kyiv, sent after midnight
+        scheduled_for = datetime.datetime(2024, 1, 15, 21, 30, tzinfo=datetime.UTC)
+        user = SimpleNamespace(
+            id=1, translator=lambda text: text, language_code="en", selected_accounts=["account1"], webhook_since=None
+        )
+        spending = {"total_spending": 0, "total_income": 0, "categories": [], "transaction_count": 0}
+        context = MagicMock()
+        context.bot.send_message = AsyncMock()
+
+        with (
+            patch.object(daily_report, "get_daily_spending", AsyncMock(return_value=spending)) as get_spending,
+            patch.object(daily_report, "load_user_rules", AsyncMock(return_value=())),
+        ):
+            outcome = await daily_report.send_report_to_user(context, user, scheduled_for=scheduled_for, token="token")
+
+        assert outcome is ReportOutcome.SENT
+        _, _, from_ts, to_ts, *_ = get_spending.call_args.args
+        assert (from_ts, to_ts) == (
+            int(datetime.datetime(2024, 1, 14, 22, 0, tzinfo=datetime.UTC).timestamp()),
+            int(scheduled_for.timestamp()),
+        )
+        assert "15.01.2024" in context.bot.send_message.call_args.kwargs["text"]
+
+
+class TestPrefetchStatements:
+    @pytest.mark.asyncio
+    async def test_failing_user_does_not_stop_the_others(self):
+        recipients = [SimpleNamespace(id=i, encrypted_token=f"enc{i}", selected_accounts=["account1"]) for i in (1, 2)]
+        synced = []
+
+        async def sync(token, accounts, from_ts, to_ts):
+            if token == "token1":
+                raise RuntimeError("database is locked")
+            synced.append(token)
+
+        context = SimpleNamespace(job=SimpleNamespace(data=SLOT), job_queue=MagicMock())
+        with (
+            patch.object(daily_report, "schedule_next_prefetch"),
+            patch.object(daily_report.report_schedule, "due", return_value=[1, 2]),
+            patch.object(daily_report, "run_db", AsyncMock(return_value=recipients)),
+            patch.object(daily_report, "decrypt_tokens", AsyncMock(return_value={1: "token1", 2: "token2"})),
+            patch.object(daily_report, "sync_statements", side_effect=sync),
+        ):
+            await daily_report.prefetch_statements(context)
+
+        assert synced == ["token2"]
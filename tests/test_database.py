@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+from sqlalchemy import select, text
+
+from src.database import configuration
+from src.database.configuration import async_database_url, create_db_engine, get_session, run_db
+from src.database.models import User
+
+
+def _add_user(session, user_id: int) -> int:
+    session.add(User(id=user_id, first_name="Test"))
+    session.flush()
+    return user_id
+
+
+class TestDatabaseConfiguration:
+    def test_sqlite_connections_use_wal(self, tmp_path):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+        with engine.connect() as connection:
+            assert connection.scalar(text("PRAGMA journal_mode")) == "wal"
+            assert connection.scalar(text("PRAGMA synchronous")) == 1
+            assert connection.scalar(text("PRAGMA busy_timeout")) == 5000
+        engine.dispose()
+
+    def test_file_databases_get_a_sized_pool(self, tmp_path):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+        assert engine.pool.size() == configuration.DATABASE_POOL_SIZE
+        engine.dispose()
+
+    def test_async_url_swaps_the_driver(self):
+        assert async_database_url("sqlite:///data/bot.db") == "sqlite+aiosqlite:///data/bot.db"
+        assert async_database_url("postgresql://bot:secret@db/bot") == "postgresql+asyncpg://bot:secret@db/bot"
+        assert async_database_url("sqlite+pysqlite:///data/bot.db") == "sqlite+pysqlite:///data/bot.db"
+
+    @pytest.mark.asyncio
+    async def test_run_db_commits(self, database_mode):
+        assert await run_db(_add_user, 1) == 1
+
+        session = get_session()
+        assert session.scalars(select(User.id)).all() == [1]
+        session.close()
+
+    @pytest.mark.asyncio
+    async def test_run_db_rolls_back_on_error(self, database_mode):
+        def add_and_fail(session):
+            _add_user(session, 2)
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await run_db(add_and_fail)
+
+        assert await run_db(lambda session: session.scalars(select(User.id)).all()) == []
+
+    @pytest.mark.asyncio
+    async def test_sync_session_runs_off_the_event_loop(self, monkeypatch):
+        monkeypatch.setattr(configuration, "DATABASE_ASYNC", False)
+        assert await run_db(lambda _session: threading.get_ident()) != threading.get_ident()
@@ -0,0 +1,104 @@
+import json
+
+import httpx
+import pytest
+
+from src.services import decoding
+from src.services.decoding import JSONArrayStream, StatementRecord, decode_statement
+from src.services.http_client import HttpClientPool
+from src.services.monobank import MonobankRateLimitError, MonobankService
+
+
+async def _chunks(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+def _statement_body(sample_transactions) -> bytes:
+    items = [dict(tx, comment="Дякую", counterIban="UA000000000000000000000000000") for tx in sample_transactions]
+    return json.dumps(items, ensure_ascii=False).encode()
+
+
+class TestJSONArrayStream:
+    def test_items_split_across_chunks(self):
+        stream = JSONArrayStream()
+        items = [*stream.feed('[{"id": "a", "ti'), *stream.feed('me": 1}, {"id": "b"'), *stream.feed(', "time": 2}]')]
+        stream.close()
+
+        assert items == [{"id": "a", "time": 1}, {"id": "b", "time": 2}]
+
+    def test_empty_array(self):
+        stream = JSONArrayStream()
+        assert list(stream.feed(" [ ] ")) == []
+        stream.close()
+
+    def test_incomplete_array_raises(self):
+        stream = JSONArrayStream()
+        list(stream.feed('[{"id": "a", "time": 1}'))
+        with pytest.raises(ValueError):
+            stream.close()
+
+    def test_non_array_raises(self):
+        with pytest.raises(ValueError):
+            list(JSONArrayStream().feed('{"errorDescription": "oops"}'))
+
+
+class TestDecodeStatement:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["json", "orjson"])
+    async def test_records_keep_only_needed_fields(self, backend, sample_transactions):
+        if backend == "orjson" and decoding.orjson is None:
+            pytest.skip("orjson is not installed")
+
+        records = await decode_statement(_chunks(_statement_body(sample_transactions), 7), backend=backend)
+
+        assert records == [StatementRecord.from_dict(tx) for tx in sample_transactions]
+        assert not hasattr(records[0], "__dict__")
+        assert not hasattr(records[0], "comment")
+
+    @pytest.mark.asyncio
+    async def test_multibyte_characters_split_across_chunks(self):
+        body = json.dumps([{"id": "a", "time": 1, "description": "Сільпо"}], ensure_ascii=False).encode()
+        records = await decode_statement(_chunks(body, 1), backend="json")
+        assert records[0].description == "Сільпо"
+
+    @pytest.mark.asyncio
+    async def test_repeated_descriptions_are_interned(self):
+        items = [{"id": str(i), "time": i, "description": "".join(["Сіль", "по"])} for i in range(3)]
+        records = await decode_statement(_chunks(json.dumps(items).encode(), 64), backend="json")
+        assert records[0].description is records[1].description is records[2].description
+
+    @pytest.mark.asyncio
+    async def test_unavailable_backend_raises(self, monkeypatch):
+        monkeypatch.setattr(decoding, "orjson", None)
+        with pytest.raises(RuntimeError):
+            await decode_statement(_chunks(b"[]", 1), backend="orjson")
+
+
+@pytest.mark.usefixtures("no_rate_limit")
+class TestGetStatementStreaming:
+    @pytest.mark.asyncio
+    async def test_statement_is_decoded_into_records(self, monkeypatch, sample_transactions):
+        body = _statement_body(sample_transactions)
+        pool = HttpClientPool(http2=False)
+        pool._client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda _request: httpx.Response(200, content=body))
+        )
+        monkeypatch.setattr("src.services.monobank.http_pool", pool)
+
+        records = await MonobankService("token").get_statement("account1", 1705660000, 1705670000)
+        await pool.close()
+
+        assert [record.id for record in records] == ["tx1", "tx2", "tx3", "tx4"]
+        assert records[0].amount == -15000
+
+    @pytest.mark.asyncio
+    async def test_error_response_is_read_before_raising(self, monkeypatch):
+        response = httpx.Response(429, headers={"Retry-After": "30"}, content=b'{"errorDescription": "Too many"}')
+        pool = HttpClientPool(http2=False)
+        pool._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _request: response))
+        monkeypatch.setattr("src.services.monobank.http_pool", pool)
+
+        with pytest.raises(MonobankRateLimitError):
+            await MonobankService("token").get_statement("account1", 1705660000, respect_rate_limit=False)
+        await pool.close()
@@ -0,0 +1,100 @@
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from src.services.http_client import HttpClientPool
+from src.services.monobank import MonobankAPIError, MonobankRateLimitError, MonobankService
+
+
+def _pool_with_transport(handler) -> HttpClientPool:
+    pool = HttpClientPool(http2=False)
+    pool._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+
+class TestHttpClientPool:
+    @pytest.mark.asyncio
+    async def test_client_is_shared(self):
+        pool = HttpClientPool(http2=False)
+        try:
+            assert pool.client is pool.client
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_close_reopens_on_next_use(self):
+        pool = HttpClientPool(http2=False)
+        first = pool.client
+        await pool.close()
+        assert first.is_closed
+        assert pool.client is not first
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_stats_count_reused_connections(self):
+        pool = _pool_with_transport(lambda _request: httpx.Response(200, json={}))
+
+        await pool._trace("connection.connect_tcp.complete", {})
+        await pool.get("https://api.monobank.ua/personal/client-info")
+        await pool.get("https://api.monobank.ua/personal/client-info")
+        await pool.get("https://api.monobank.ua/personal/client-info")
+
+        assert pool.stats["requests"] == 3
+        assert pool.stats["connections_opened"] == 1
+        assert pool.stats["connections_reused"] == 2
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_warm_up_is_bounded_by_keepalive_limit(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(404)
+
+        pool = _pool_with_transport(handler)
+        pool.limits = httpx.Limits(max_connections=10, max_keepalive_connections=3)
+
+        warmed = await pool.warm_up("https://api.monobank.ua", connections=50)
+
+        assert warmed == 3
+        assert all(r.method == "HEAD" for r in requests)
+        await pool.close()
+
+    def test_http2_disabled_without_h2(self):
+        with patch("src.services.http_client._http2_available", return_value=False):
+            assert HttpClientPool(http2=True).http2 is False
+
+
+class TestMonobankServiceResponses:
+    @pytest.mark.asyncio
+    async def test_client_info_uses_shared_pool(self):
+        response = httpx.Response(200, json={"clientId": "test"})
+        with patch("src.services.monobank.http_pool.get", new_callable=AsyncMock, return_value=response) as mock:
+            result = await MonobankService("token").get_client_info()
+
+        assert result == {"clientId": "test"}
+        assert mock.call_args.kwargs["headers"] == {"X-Token": "token"}
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_response(self):
+        response = httpx.Response(429, headers={"Retry-After": "30"})
+        with (
+            patch("src.services.monobank.http_pool.get", new_callable=AsyncMock, return_value=response),
+            pytest.raises(MonobankRateLimitError) as exc_info,
+        ):
+            await MonobankService("token").get_client_info()
+
+        assert exc_info.value.retry_after == 30
+
+    @pytest.mark.asyncio
+    async def test_invalid_token_response(self):
+        response = httpx.Response(401)
+        with (
+            patch("src.services.monobank.http_pool.get", new_callable=AsyncMock, return_value=response),
+            pytest.raises(MonobankAPIError) as exc_info,
+        ):
+            await MonobankService("token").get_client_info()
+
+        assert exc_info.value.status_code == 401
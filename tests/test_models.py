@@ -1,6 +1,6 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from src.database.models import User
+from src.database.models import User, UserAccount
 
 
 class TestUserModel:
@@ -28,15 +28,60 @@ class TestUserModel:
         user2 = User(id=2, first_name="Jane", last_name=None)
         assert user2.name == "Jane"
 
-    def test_selected_accounts_json(self, session):
+    def test_selected_accounts_are_stored_as_rows(self, session):
         user = User(id=222222222, first_name="Test")
         user.selected_accounts = ["acc1", "acc2", "acc3"]
         session.add(user)
         session.commit()
+        session.expunge_all()
 
         stmt = select(User).where(User.id == 222222222)
         result = session.scalar(stmt)
         assert result.selected_accounts == ["acc1", "acc2", "acc3"]
+        owners = session.scalars(select(UserAccount.user_id).where(UserAccount.account_id == "acc2")).all()
+        assert owners == [222222222]
+
+    def test_select_accounts_keeps_selection_order(self, session):
+        user = User(id=1, first_name="Test")
+        user.selected_accounts = ["acc1", "acc2"]
+        session.add(user)
+        session.commit()
+
+        user.select_accounts(
+            [{"id": "acc2"}, {"id": "acc3", "currencyCode": 840, "type": "black", "maskedPan": ["5375****1234"]}]
+        )
+        session.commit()
+        session.expunge_all()
+
+        result = session.get(User, 1)
+        assert result.selected_accounts == ["acc2", "acc3"]
+        assert (result.accounts[1].currency_code, result.accounts[1].masked_pan) == (840, "5375****1234")
+
+    def test_every_write_increments_version(self, session):
+        user = User(id=1, first_name="Test")
+        session.add(user)
+        session.commit()
+        assert user.version == 0
+
+        user.language_code = "en"
+        session.commit()
+        assert user.version == 1
+
+        session.execute(update(User).where(User.id == 1).values(block_date=None))
+        session.commit()
+        assert session.scalar(select(User.version)) == 2
+
+    def test_accounts_stay_available_on_detached_user(self, session):
+        user = User(id=1, first_name="Test")
+        user.selected_accounts = ["acc1"]
+        session.add(user)
+        session.commit()
+        session.expunge_all()
+
+        result = session.scalar(select(User).where(User.id == 1))
+        session.expunge(result)
+
+        assert result.selected_accounts == ["acc1"]
 
     def test_selected_accounts_empty(self, session):
         user = User(id=333333333, first_name="Test")
@@ -2,14 +2,17 @@ from unittest.mock import AsyncMock, patch
 
 import pytest
 
+from src.services.categorization import get_category_for_mcc, get_category_name
+from src.services.client_info_cache import client_info_cache
+from src.services.decoding import StatementRecord
 from src.services.monobank import (
     MonobankAPIError,
     MonobankService,
     format_account_name,
-    get_category_for_mcc,
-    get_category_name,
     get_daily_spending,
+    iter_statement,
 )
+from src.services.transaction_store import STATEMENT_MAX_WINDOW_SECONDS
 
 
 class TestMCCCategories:
@@ -93,12 +96,14 @@ class TestMonobankService:
             assert accounts[0]["id"] == "acc1"
 
 
+@pytest.mark.usefixtures("no_rate_limit")
 class TestGetDailySpending:
     @pytest.mark.asyncio
-    async def test_daily_spending_calculation(self, sample_transactions):
+    async def test_daily_spending_calculation(self, sample_records):
         with patch("src.services.monobank.MonobankService") as MockService:
             mock_instance = MockService.return_value
-            mock_instance.get_statement = AsyncMock(return_value=sample_transactions)
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
+            mock_instance.get_statement = AsyncMock(return_value=sample_records)
 
             result = await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
 
@@ -115,6 +120,7 @@ class TestGetDailySpending:
     async def test_empty_transactions(self):
         with patch("src.services.monobank.MonobankService") as MockService:
             mock_instance = MockService.return_value
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
             mock_instance.get_statement = AsyncMock(return_value=[])
 
             result = await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
@@ -125,11 +131,168 @@ class TestGetDailySpending:
             assert result["categories"] == []
 
     @pytest.mark.asyncio
-    async def test_multiple_accounts(self, sample_transactions):
+    async def test_multiple_accounts(self, sample_records):
         with patch("src.services.monobank.MonobankService") as MockService:
             mock_instance = MockService.return_value
-            mock_instance.get_statement = AsyncMock(return_value=sample_transactions[:2])
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
+            mock_instance.get_statement = AsyncMock(return_value=sample_records[:2])
 
             await get_daily_spending("token", ["account1", "account2"], 1705660000, 1705670000, "uk")
 
             assert mock_instance.get_statement.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_recently_synced_account_is_not_fetched_again(self, sample_records):
+        with patch("src.services.monobank.MonobankService") as MockService:
+            mock_instance = MockService.return_value
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
+            mock_instance.get_statement = AsyncMock(return_value=sample_records)
+
+            await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
+            result = await get_daily_spending("token", ["account1"], 1705660000, 1705670030, "uk")
+
+            assert mock_instance.get_statement.call_count == 1
+            assert result["total_spending"] == 70000
+
+    @pytest.mark.asyncio
+    async def test_only_delta_is_requested(self, sample_records):
+        with patch("src.services.monobank.MonobankService") as MockService:
+            mock_instance = MockService.return_value
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
+            mock_instance.get_statement = AsyncMock(side_effect=[sample_records[:2], sample_records[2:]])
+
+            await get_daily_spending("token", ["account1"], 1705660000, 1705661100, "uk")
+            result = await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
+
+            assert mock_instance.get_statement.call_args.args[:3] == ("account1", 1705661100, 1705670000)
+            assert result["total_spending"] == 70000
+            assert result["total_income"] == 500000
+            assert result["transaction_count"] == 4
+
+
+@pytest.mark.usefixtures("no_rate_limit")
+class TestIterStatement:
+    @staticmethod
+    def _page(times):
+        return [StatementRecord(f"tx{time}", time, amount=-100, mcc=5411) for time in times]
+
+    @pytest.mark.asyncio
+    async def test_full_page_follows_cursor_backwards(self):
+        first = self._page(range(2000, 1500, -1))
+        second = self._page(range(1501, 1400, -1))
+        with patch("src.services.monobank.MonobankService") as MockService:
+            mock_instance = MockService.return_value
+            mock_instance.get_statement = AsyncMock(side_effect=[first, second])
+
+            pages = [page async for page in iter_statement("token", "account1", 1000, 2000)]
+
+            calls = [call.args[1:3] for call in mock_instance.get_statement.call_args_list]
+            assert calls == [(1000, 2000), (1000, 1501)]
+        assert [(page.from_ts, page.to_ts) for page in pages] == [(1501, 2000), (1000, 1501)]
+        ids = [record.id for page in pages for record in page.records]
+        assert len(ids) == len(set(ids)) == 600
+
+    @pytest.mark.asyncio
+    async def test_long_range_is_requested_in_legal_windows(self):
+        to_ts = 1000 + STATEMENT_MAX_WINDOW_SECONDS + 500
+        with patch("src.services.monobank.MonobankService") as MockService:
+            mock_instance = MockService.return_value
+            mock_instance.get_statement = AsyncMock(return_value=[])
+
+            pages = [page async for page in iter_statement("token", "account1", 1000, to_ts)]
+
+            calls = [call.args[1:3] for call in mock_instance.get_statement.call_args_list]
+        assert calls == [(1500, to_ts), (1000, 1500)]
+        assert all(to - start <= STATEMENT_MAX_WINDOW_SECONDS for start, to in calls)
+        assert len(pages) == 2
+
+    @pytest.mark.asyncio
+    async def test_paginated_range_is_fully_synced(self):
+        first = self._page(range(2000, 1500, -1))
+        second = self._page(range(1501, 1400, -1))
+        with patch("src.services.monobank.MonobankService") as MockService:
+            mock_instance = MockService.return_value
+            mock_instance.get_client_info = AsyncMock(return_value={"accounts": []})
+            mock_instance.get_statement = AsyncMock(side_effect=[first, second])
+
+            result = await get_daily_spending("token", ["account1"], 1000, 2000, "uk")
+            await get_daily_spending("token", ["account1"], 1000, 2000, "uk")
+
+            assert mock_instance.get_statement.call_count == 2
+        assert result["transaction_count"] == 600
+
+
+@pytest.mark.usefixtures("no_rate_limit", "snapshot_clock")
+class TestUnchangedBalance:
+    @pytest.fixture
+    def snapshot_clock(self):
+        # client info snapshots are taken at the end of the first synced range
+        with patch("time.time", return_value=1705670000.0) as clock:
+            yield clock
+
+    @staticmethod
+    def _client_info(balance1, balance2=50000):
+        return {"accounts": [{"id": "account1", "balance": balance1}, {"id": "account2", "balance": balance2}]}
+
+    @staticmethod
+    def _patch_service(client_info, statements):
+        return (
+            patch.object(MonobankService, "_fetch_client_info", AsyncMock(side_effect=client_info)),
+            patch.object(MonobankService, "get_statement", AsyncMock(side_effect=statements)),
+        )
+
+    @pytest.mark.asyncio
+    async def test_unchanged_accounts_are_not_fetched(self, sample_records):
+        client_info, statements = self._patch_service([self._client_info(545000)], [sample_records, [], []])
+        with client_info, statements as get_statement:
+            await get_daily_spending("token", ["account1", "account2"], 1705660000, 1705670000, "uk")
+            result = await get_daily_spending("token", ["account1", "account2"], 1705660000, 1705670090, "uk")
+
+        assert get_statement.call_count == 2
+        assert result["transaction_count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_changed_balance_is_fetched(self):
+        client_info, statements = self._patch_service(
+            [self._client_info(545000), self._client_info(540000)], [[], [], []]
+        )
+        with client_info, statements as get_statement:
+            await get_daily_spending("token", ["account1", "account2"], 1705660000, 1705670000, "uk")
+            client_info_cache.clear()
+            await get_daily_spending("token", ["account1", "account2"], 1705660000, 1705670090, "uk")
+
+        assert [call.args[0] for call in get_statement.call_args_list[2:]] == ["account1"]
+
+    @pytest.mark.asyncio
+    async def test_hold_forces_refresh(self, sample_records):
+        sample_records[0].hold = True
+        client_info, statements = self._patch_service([self._client_info(545000)], [sample_records, []])
+        with client_info, statements as get_statement:
+            await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
+            await get_daily_spending("token", ["account1"], 1705660000, 1705670090, "uk")
+
+        assert get_statement.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_snapshot_is_not_trusted(self, sample_records):
+        client_info, statements = self._patch_service([self._client_info(545000)], [sample_records, []])
+        with client_info, statements as get_statement:
+            await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
+            with patch("src.services.monobank.client_info_cache.age", return_value=3600):
+                await get_daily_spending("token", ["account1"], 1705660000, 1705670090, "uk")
+
+        assert get_statement.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_snapshot_after_the_range_is_synced_up_to(self, snapshot_clock):
+        late = StatementRecord.from_dict({"id": "late", "time": 1705670020, "amount": -500, "mcc": 5411})
+        client_info, statements = self._patch_service([self._client_info(545000)], [[late], []])
+        snapshot_clock.return_value = 1705670030.0
+        with client_info, statements as get_statement:
+            await get_daily_spending("token", ["account1"], 1705660000, 1705670000, "uk")
+            result = await get_daily_spending("token", ["account1"], 1705660000, 1705670090, "uk")
+
+        # the tail was fetched up to the snapshot, which then proves nothing changed since
+        assert get_statement.call_args_list[0].args[1:3] == (1705660000, 1705670030)
+        assert get_statement.call_count == 1
+        assert result["transaction_count"] == 1
@@ -0,0 +1,92 @@
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database.configuration import get_session
+from src.database.models import RateLimitState
+from src.services.rate_limiter import CLIENT_INFO, STATEMENT, BucketLimit, RateLimiter, token_key
+
+LIMITS = {STATEMENT: BucketLimit(60), CLIENT_INFO: BucketLimit(60, burst=2)}
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(LIMITS)
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_first_request_is_allowed(self, limiter):
+        assert await limiter.try_acquire("token", STATEMENT) == 0
+
+    @pytest.mark.asyncio
+    async def test_second_request_must_wait(self, limiter):
+        await limiter.try_acquire("token", STATEMENT)
+        wait = await limiter.try_acquire("token", STATEMENT)
+        assert 59 < wait <= 60
+
+    @pytest.mark.asyncio
+    async def test_tokens_and_endpoints_are_independent(self, limiter):
+        assert await limiter.try_acquire("token1", STATEMENT) == 0
+        assert await limiter.try_acquire("token2", STATEMENT) == 0
+        assert await limiter.try_acquire("token1", CLIENT_INFO) == 0
+
+    @pytest.mark.asyncio
+    async def test_burst_allows_consecutive_requests(self, limiter):
+        assert await limiter.try_acquire("token", CLIENT_INFO) == 0
+        assert await limiter.try_acquire("token", CLIENT_INFO) == 0
+        assert await limiter.try_acquire("token", CLIENT_INFO) > 0
+
+    @pytest.mark.asyncio
+    async def test_state_survives_new_limiter_instance(self, limiter):
+        await limiter.try_acquire("token", STATEMENT)
+        assert await RateLimiter(LIMITS).try_acquire("token", STATEMENT) > 0
+
+    @pytest.mark.asyncio
+    async def test_state_is_shared_between_engines(self, limiter, database):
+        await limiter.try_acquire("token", STATEMENT)
+
+        other_engine = create_engine(database.url)
+        with patch("src.database.configuration.sm", sessionmaker(bind=other_engine)):
+            assert await RateLimiter(LIMITS).try_acquire("token", STATEMENT) > 0
+        other_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_penalize_pushes_next_allowed(self, limiter):
+        await limiter.penalize("token", STATEMENT, 30)
+        assert await limiter.next_allowed("token", STATEMENT) == pytest.approx(time.time() + 30, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_token_is_not_stored_in_plaintext(self, limiter):
+        await limiter.try_acquire("uSecretToken", STATEMENT)
+
+        session = get_session()
+        keys = session.scalars(select(RateLimitState.key)).all()
+        session.close()
+        assert keys == [token_key("uSecretToken")]
+
+    @pytest.mark.asyncio
+    async def test_evict_removes_idle_buckets(self, limiter):
+        await limiter.try_acquire("idle", STATEMENT)
+        await limiter.try_acquire("active", STATEMENT)
+
+        with patch("src.services.rate_limiter.time.time", return_value=time.time() + 3600):
+            await limiter.try_acquire("active", STATEMENT)
+            evicted = await limiter.evict(idle_seconds=600)
+
+        assert evicted == 1
+        assert await limiter.next_allowed("idle", STATEMENT) == 0
+        assert await limiter.next_allowed("active", STATEMENT) > 0
+
+    @pytest.mark.asyncio
+    async def test_acquire_sleeps_until_allowed(self, limiter):
+        with (
+            patch("src.services.rate_limiter.asyncio.sleep", new_callable=AsyncMock) as sleep,
+            patch.object(limiter, "try_acquire", side_effect=[42.0, 0.0]),
+        ):
+            await limiter.acquire("token", STATEMENT)
+
+        sleep.assert_awaited_once_with(42.0)
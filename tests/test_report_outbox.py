@@ -0,0 +1,274 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+import pytz
+from sqlalchemy import select
+
+from src.database.configuration import get_session
+from src.database.models import ReportDelivery, User, WorkerHeartbeat
+from src.jobs import daily_report
+from src.jobs.daily_report import ReportOutcome
+from src.services import report_outbox
+from src.services.report_schedule import ReportSchedule
+from src.services.workers import Shard, WorkerRegistry
+
+TZ = pytz.timezone("Europe/Kiev")
+SLOT = TZ.localize(datetime.datetime(2024, 1, 15, 21, 0))
+
+
+def _user(user_id: int, hour: int = 21, minute: int = 0) -> User:
+    user = User(id=user_id, first_name="Test", language_code="uk", report_hour=hour, report_minute=minute)
+    user.monobank_token = "uTestToken123456789012345678901234567890"
+    user.selected_accounts = ["account1"]
+    return user
+
+
+def _deliveries() -> list[ReportDelivery]:
+    session = get_session()
+    try:
+        return list(session.scalars(select(ReportDelivery).order_by(ReportDelivery.id)))
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def registry():
+    registry = WorkerRegistry("worker-a")
+    with patch.object(daily_report, "worker_registry", registry):
+        yield registry
+
+
+@pytest.fixture
+def schedule(tmp_secret_key):
+    schedule = ReportSchedule("Europe/Kiev")
+    with patch.object(daily_report, "report_schedule", schedule):
+        yield schedule
+
+
+class TestReportOutbox:
+    def test_enqueue_is_idempotent(self, session):
+        assert report_outbox.enqueue(session, SLOT, [1, 2]) == 2
+        assert report_outbox.enqueue(session, SLOT, [2, 3]) == 1
+        session.commit()
+
+        assert session.scalars(select(ReportDelivery.user_id).order_by(ReportDelivery.id)).all() == [1, 2, 3]
+
+    def test_same_slot_in_another_timezone_has_same_key(self):
+        utc_slot = SLOT.astimezone(datetime.UTC)
+        assert report_outbox.idempotency_key(1, SLOT) == report_outbox.idempotency_key(1, utc_slot)
+
+    def test_acknowledged_items_are_no_longer_pending(self, session):
+        report_outbox.enqueue(session, SLOT, [1, 2])
+        first, second = report_outbox.pending_items(session, SLOT, SLOT)
+        delivered_at = SLOT + datetime.timedelta(seconds=30)
+
+        report_outbox.acknowledge(session, [(first, "sent", delivered_at)])
+        session.commit()
+
+        assert report_outbox.pending_items(session, SLOT, SLOT) == [second]
+        delivery = session.get(ReportDelivery, first.id)
+        assert delivery.status == "sent"
+        assert delivery.lateness == 30.0
+
+    def test_expire_only_touches_old_pending_items(self, session):
+        earlier = SLOT - datetime.timedelta(days=1)
+        report_outbox.enqueue(session, earlier, [1])
+        report_outbox.enqueue(session, SLOT, [1])
+
+        assert report_outbox.expire(session, SLOT) == 1
+        assert report_outbox.last_scheduled(session) == SLOT
+        assert [item.scheduled_for for item in report_outbox.pending_items(session, earlier, SLOT)] == [SLOT]
+
+    def test_deactivate_users_in_one_update(self, session, tmp_secret_key):
+        session.add_all([_user(1), _user(2), _user(3)])
+        session.commit()
+
+        assert report_outbox.deactivate_users(session, [1, 2]) == 2
+        session.commit()
+
+        active = session.scalars(select(User.id).where(User.is_active)).all()
+        assert active == [3]
+
+
+class TestOutboxDispatch:
+    @pytest.mark.asyncio
+    async def test_blocked_users_are_deactivated_together(self, schedule):
+        session = get_session()
+        with session.begin():
+            session.add_all([_user(1), _user(2), _user(3)])
+        session.close()
+        for user_id in (1, 2, 3):
+            schedule.set(user_id, 21, 0)
+
+        async def send(_context, user, scheduled_for, token):
+            return ReportOutcome.SENT if user.id == 3 else ReportOutcome.BLOCKED
+
+        context = MagicMock(job=SimpleNamespace(data=SLOT))
+        context.job_queue.get_jobs_by_name.return_value = ()
+        with (
+            patch.object(daily_report, "send_report_to_user", side_effect=send),
+            patch.object(daily_report, "deactivate_users", wraps=report_outbox.deactivate_users) as deactivate,
+        ):
+            await daily_report.send_daily_reports(context)
+
+        deactivate.assert_called_once()
+        assert sorted(deactivate.call_args.args[1]) == [1, 2]
+        assert schedule.due(21, 0) == [3]
+        assert [delivery.status for delivery in _deliveries()] == ["blocked", "blocked", "sent"]
+
+    @pytest.mark.asyncio
+    async def test_slot_is_enqueued_from_the_database(self, schedule):
+        session = get_session()
+        with session.begin():
+            # user 1 moved their report in another process, this worker's schedule still has 21:00
+            session.add_all([_user(1, 21, 30), _user(2), _user(3)])
+        with session.begin():
+            session.get(User, 3).block_date = datetime.datetime.now(datetime.UTC)
+        session.close()
+        schedule.set(1, 21, 0)
+
+        context = MagicMock(job=SimpleNamespace(data=SLOT))
+        context.job_queue.get_jobs_by_name.return_value = ()
+        with patch.object(daily_report, "send_report_to_user", return_value=ReportOutcome.SENT) as send:
+            await daily_report.send_daily_reports(context)
+
+        assert [call.args[1].id for call in send.call_args_list] == [2]
+        assert [delivery.user_id for delivery in _deliveries()] == [2]
+
+    @pytest.mark.asyncio
+    async def test_failures_are_acknowledged_in_batches(self, schedule):
+        session = get_session()
+        with session.begin():
+            session.add_all([_user(user_id) for user_id in range(1, 6)])
+            report_outbox.enqueue(session, SLOT, range(1, 6))
+        session.close()
+
+        with (
+            patch.object(daily_report, "send_report_to_user", return_value=ReportOutcome.FAILED),
+            patch.object(daily_report, "REPORT_OUTBOX_ACK_BATCH_SIZE", 2),
+            patch.object(daily_report, "acknowledge", wraps=report_outbox.acknowledge) as acknowledge,
+        ):
+            summary = await daily_report.dispatch_outbox(MagicMock(), SLOT)
+
+        assert summary.outcomes[ReportOutcome.FAILED] == 5
+        assert [len(call.args[1]) for call in acknowledge.call_args_list] == [2, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_sent_reports_are_acknowledged_before_the_tick_ends(self, schedule):
+        session = get_session()
+        with session.begin():
+            session.add_all([_user(1), _user(2)])
+            report_outbox.enqueue(session, SLOT, [1, 2])
+        session.close()
+
+        statuses = []
+
+        async def send(_context, user, scheduled_for, token):
+            if user.id == 2:
+                # user 1 is sent meanwhile; a worker that crashed now must not send it again
+                await asyncio.sleep(0.05)
+                statuses.extend(delivery.status for delivery in _deliveries())
+            return ReportOutcome.SENT
+
+        with patch.object(daily_report, "send_report_to_user", side_effect=send):
+            await daily_report.dispatch_outbox(MagicMock(), SLOT)
+
+        assert statuses == ["sent", "pending"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_reports_stay_pending(self, schedule):
+        session = get_session()
+        with session.begin():
+            session.add(_user(1))
+            report_outbox.enqueue(session, SLOT, [1])
+        session.close()
+
+        with patch.object(daily_report, "fan_out_reports", return_value=daily_report.TickSummary(SLOT)):
+            await daily_report.dispatch_outbox(MagicMock(), SLOT)
+
+        assert _deliveries()[0].status == "pending"
+
+    @pytest.mark.asyncio
+    async def test_new_leader_replays_missed_slot_once(self, schedule, registry):
+        now = datetime.datetime.now(TZ)
+        missed = now - datetime.timedelta(minutes=30)
+        session = get_session()
+        with session.begin():
+            session.add(_user(1, missed.hour, missed.minute))
+            report_outbox.enqueue(session, now - datetime.timedelta(hours=1), [1])
+        session.close()
+        schedule.set(1, missed.hour, missed.minute)
+
+        with patch.object(daily_report, "send_report_to_user", return_value=ReportOutcome.SENT) as send:
+            await daily_report.worker_heartbeat(MagicMock())
+            await daily_report.worker_heartbeat(MagicMock())
+
+        deliveries = _deliveries()
+        assert send.call_count == 2
+        assert [delivery.status for delivery in deliveries] == ["sent", "sent"]
+        assert deliveries[1].scheduled_for.replace(tzinfo=datetime.UTC) == missed.replace(second=0, microsecond=0)
+
+    @pytest.mark.asyncio
+    async def test_replay_expires_reports_older_than_window(self, schedule, registry):
+        session = get_session()
+        with session.begin():
+            session.add(_user(1))
+            report_outbox.enqueue(session, datetime.datetime.now(TZ) - datetime.timedelta(days=2), [1])
+        session.close()
+
+        with patch.object(daily_report, "send_report_to_user", return_value=ReportOutcome.SENT) as send:
+            await daily_report.worker_heartbeat(MagicMock())
+
+        send.assert_not_called()
+        assert _deliveries()[0].status == "expired"
+
+    @pytest.mark.asyncio
+    async def test_workers_only_dispatch_their_shard(self, schedule, registry):
+        other = WorkerRegistry("worker-b")
+        session = get_session()
+        with session.begin():
+            session.add_all([_user(user_id) for user_id in range(1, 5)])
+            report_outbox.enqueue(session, SLOT, range(1, 5))
+        session.close()
+        await registry.heartbeat()
+        await other.heartbeat()
+        await registry.heartbeat()
+
+        with patch.object(daily_report, "send_report_to_user", return_value=ReportOutcome.SENT) as send:
+            await daily_report.dispatch_outbox(MagicMock(), SLOT)
+
+        assert registry.shard == Shard(0, 2)
+        assert sorted(call.args[1].id for call in send.call_args_list) == [2, 4]
+
+
+class TestOutboxClaims:
+    def test_claimed_items_are_skipped_by_other_workers(self, session):
+        report_outbox.enqueue(session, SLOT, [1, 2])
+        session.add(WorkerHeartbeat(id="worker-a", started_at=0, heartbeat_at=time.time()))
+        ids = [item.id for item in report_outbox.pending_items(session, SLOT, SLOT)]
+
+        assert report_outbox.claim(session, ids, "worker-a", time.time() - 60) == set(ids)
+        assert report_outbox.claim(session, ids, "worker-b", time.time() - 60) == set()
+        assert report_outbox.claim(session, ids, "worker-a", time.time() - 60) == set()
+
+        report_outbox.release(session, ids[:1], "worker-a")
+        assert report_outbox.claim(session, ids, "worker-b", time.time() - 60) == set(ids[:1])
+
+    def test_claims_of_dead_workers_are_taken_over(self, session):
+        report_outbox.enqueue(session, SLOT, [1])
+        session.add(WorkerHeartbeat(id="worker-a", started_at=0, heartbeat_at=time.time() - 120))
+        ids = [item.id for item in report_outbox.pending_items(session, SLOT, SLOT)]
+        report_outbox.claim(session, ids, "worker-a", 0)
+
+        assert report_outbox.claim(session, ids, "worker-b", time.time() - 60) == set(ids)
+
+    def test_pending_items_are_filtered_by_shard(self, session):
+        report_outbox.enqueue(session, SLOT, range(1, 7))
+
+        items = report_outbox.pending_items(session, SLOT, SLOT, Shard(1, 3))
+
+        assert [item.user_id for item in items] == [1, 4]
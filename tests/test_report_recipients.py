@@ -0,0 +1,46 @@
+import datetime
+
+from src.database.models import User
+from src.services.report_recipients import ReportRecipient, iter_recipients
+
+TOKEN = "uTestToken123456789012345678901234567890"
+
+
+def _user(user_id: int, accounts: list[str] | None = None, token: bool = True) -> User:
+    user = User(id=user_id, first_name="Test", language_code="en", report_hour=21, report_minute=0)
+    if token:
+        user.monobank_token = TOKEN
+    user.selected_accounts = accounts or []
+    return user
+
+
+class TestReportRecipients:
+    def test_only_active_users_with_token_are_streamed(self, session, tmp_secret_key):
+        blocked = _user(4)
+        blocked.deactivate()
+        session.add_all([_user(1, ["account1", "account2"]), _user(2), _user(3, token=False), blocked, _user(5)])
+        session.commit()
+
+        recipients = list(iter_recipients(session, [1, 2, 3, 4, 5], chunk_size=2))
+
+        assert [recipient.id for recipient in recipients] == [1, 2, 5]
+        assert recipients[0].selected_accounts == ["account1", "account2"]
+        assert recipients[1].selected_accounts == []
+        assert recipients[0].monobank_token == TOKEN
+
+    def test_extra_criteria_are_applied(self, session, tmp_secret_key):
+        pushed = _user(2)
+        pushed.webhook_date = datetime.datetime(2024, 1, 15, 12, 0)
+        session.add_all([_user(1), pushed])
+        session.commit()
+
+        recipients = list(iter_recipients(session, [1, 2], User.webhook_date.is_(None)))
+
+        assert [recipient.id for recipient in recipients] == [1]
+
+    def test_recipient_mirrors_user_helpers(self):
+        recipient = ReportRecipient(1, None, [], None, 21, 0, datetime.datetime(2024, 1, 15, 12, 0))
+
+        assert recipient.monobank_token is None
+        assert recipient.webhook_since == int(datetime.datetime(2024, 1, 15, 12, 0, tzinfo=datetime.UTC).timestamp())
+        assert recipient.translator("No spending today! 🎉\n") == "No spending today! 🎉\n"
@@ -0,0 +1,225 @@
+import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytz
+from sqlalchemy import select
+
+from src.database.configuration import get_session
+from src.database.models import ReportDelivery, User
+from src.jobs import daily_report
+from src.services.rate_limiter import BucketLimit
+from src.services.report_schedule import ReportSchedule
+
+TZ = pytz.timezone("Europe/Kiev")
+
+
+def _at(hour: int, minute: int, second: int = 0, day: int = 15) -> datetime.datetime:
+    return TZ.localize(datetime.datetime(2024, 1, day, hour, minute, second))
+
+
+def _user(user_id: int, hour: int = 21, minute: int = 0, token: bool = True) -> User:
+    user = User(id=user_id, first_name="Test", language_code="uk", report_hour=hour, report_minute=minute)
+    if token:
+        user.monobank_token = "uTestToken123456789012345678901234567890"
+    return user
+
+
+@pytest.fixture
+def schedule(tmp_secret_key):
+    return ReportSchedule("Europe/Kiev")
+
+
+class TestReportSchedule:
+    def test_empty_schedule_has_no_fire_time(self, schedule):
+        assert schedule.next_fire(_at(12, 0)) is None
+
+    def test_next_fire_is_aligned_to_slot_minute(self, schedule):
+        schedule.set(1, 21, 0)
+        schedule.set(2, 9, 30)
+
+        assert schedule.next_fire(_at(12, 0, 42)) == _at(21, 0)
+        assert schedule.next_fire(_at(8, 59, 59)) == _at(9, 30)
+
+    def test_next_fire_wraps_to_next_day(self, schedule):
+        schedule.set(1, 9, 30)
+        assert schedule.next_fire(_at(21, 0)) == _at(9, 30, day=16)
+
+    def test_current_slot_is_not_fired_again(self, schedule):
+        schedule.set(1, 21, 0)
+        assert schedule.next_fire(_at(21, 0)) == _at(21, 0, day=16)
+
+    def test_moving_user_empties_old_slot(self, schedule):
+        schedule.set(1, 21, 0)
+        schedule.set(1, 22, 15)
+
+        assert schedule.due(21, 0) == []
+        assert schedule.due(22, 15) == [1]
+        assert schedule.stats == {"users": 1, "slots": 1}
+
+    def test_sync_user_removes_inactive_and_tokenless_users(self, schedule):
+        blocked = _user(1)
+        blocked.deactivate()
+        schedule.set(1, 21, 0)
+        schedule.set(2, 21, 0)
+
+        schedule.sync_user(blocked)
+        schedule.sync_user(_user(2, token=False))
+
+        assert schedule.due(21, 0) == []
+
+    def test_changes_notify_listener(self, schedule):
+        schedule.on_change = MagicMock()
+
+        schedule.set(1, 21, 0)
+        schedule.set(1, 21, 0)
+        schedule.remove(1)
+        schedule.remove(1)
+
+        assert schedule.on_change.call_count == 2
+
+    def test_load_indexes_active_users_with_token(self, schedule):
+        session = get_session()
+        with session.begin():
+            blocked = _user(3, 21, 0)
+            blocked.deactivate()
+            session.add_all([_user(1, 21, 0), _user(2, 9, 30, token=False), blocked])
+        session.close()
+
+        schedule.load()
+
+        assert schedule.due(21, 0) == [1]
+        assert schedule.stats == {"users": 1, "slots": 1}
+
+    def test_failed_load_keeps_previous_schedule(self, schedule):
+        def rows():
+            yield 1, 9, 30
+            raise RuntimeError("connection lost")
+
+        session = MagicMock()
+        session.execute.return_value = rows()
+        schedule.set(2, 21, 0)
+
+        with pytest.raises(RuntimeError):
+            schedule.load(lambda: session)
+
+        session.close.assert_called_once()
+        assert schedule.due(9, 30) == []
+        assert schedule.due(21, 0) == [2]
+        assert schedule.next_fire(_at(12, 0)) == _at(21, 0)
+
+    def test_load_scans_partial_slot_index(self, database):
+        stmt = select(User.id, User.report_hour, User.report_minute).where(User.is_active, User.has_token)
+        with database.connect() as connection:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {stmt.compile(database)}").all()
+
+        assert "ix_users_report_slot" in plan[0][-1]
+
+
+class TestReportJob:
+    def test_next_report_is_scheduled_once(self, schedule):
+        schedule.set(1, 21, 0)
+        job_queue = MagicMock()
+        job_queue.get_jobs_by_name.return_value = ()
+
+        with patch.object(daily_report, "report_schedule", schedule):
+            daily_report.schedule_next_report(job_queue, after=_at(12, 0))
+            job_queue.get_jobs_by_name.return_value = (SimpleNamespace(data=_at(21, 0), removed=False),)
+            daily_report.schedule_next_report(job_queue, after=_at(12, 5))
+
+        job_queue.run_once.assert_called_once()
+        assert job_queue.run_once.call_args.kwargs["when"] == _at(21, 0)
+
+    def test_earlier_slot_replaces_scheduled_job(self, schedule):
+        existing = MagicMock(data=_at(21, 0), removed=False)
+        job_queue = MagicMock()
+        job_queue.get_jobs_by_name.return_value = (existing,)
+        schedule.set(1, 21, 0)
+        schedule.set(2, 13, 0)
+
+        with patch.object(daily_report, "report_schedule", schedule):
+            daily_report.schedule_next_report(job_queue, after=_at(12, 0))
+
+        existing.schedule_removal.assert_called_once()
+        assert job_queue.run_once.call_args.kwargs["when"] == _at(13, 0)
+
+    @pytest.mark.asyncio
+    async def test_tick_sends_to_due_users_and_schedules_next_slot(self, schedule):
+        session = get_session()
+        with session.begin():
+            user = _user(1, 21, 0)
+            user.selected_accounts = ["account1"]
+            session.add(user)
+        session.close()
+        schedule.set(1, 21, 0)
+
+        context = MagicMock(job=SimpleNamespace(data=_at(21, 0)))
+        context.job_queue.get_jobs_by_name.return_value = ()
+        with (
+            patch.object(daily_report, "report_schedule", schedule),
+            patch.object(daily_report, "send_report_to_user", return_value=daily_report.ReportOutcome.SENT) as send,
+        ):
+            await daily_report.send_daily_reports(context)
+
+        session = get_session()
+        delivery = session.scalar(select(ReportDelivery))
+        session.close()
+        assert [call.args[1].id for call in send.call_args_list] == [1]
+        assert delivery.status == "sent"
+        assert context.job_queue.run_once.call_args.kwargs["when"] == _at(21, 0, day=16)
+
+
+class TestPrefetch:
+    def test_lead_grows_with_accounts(self):
+        with patch.object(daily_report, "DEFAULT_LIMITS", {daily_report.STATEMENT: BucketLimit(60)}):
+            assert daily_report.prefetch_lead(1) == 60 + daily_report.REPORT_PREFETCH_MARGIN_SECONDS
+            assert daily_report.prefetch_lead(3) == 180 + daily_report.REPORT_PREFETCH_MARGIN_SECONDS
+            assert daily_report.prefetch_lead(100) == daily_report.REPORT_PREFETCH_MAX_LEAD_SECONDS
+
+    def test_reports_waiting_on_statements_outlive_the_next_slot(self, schedule):
+        schedule.set(1, 21, 0)
+        schedule.set(2, 21, 5)
+        with (
+            patch.object(daily_report, "report_schedule", schedule),
+            patch.object(daily_report, "DEFAULT_LIMITS", {daily_report.STATEMENT: BucketLimit(60)}),
+            patch.object(daily_report, "REPORT_PREFETCH_MARGIN_SECONDS", 30),
+        ):
+            assert daily_report.report_deadline(_at(21, 0), 1) == _at(21, 5)
+            assert daily_report.report_deadline(_at(21, 0), 10) == _at(21, 10, 30)
+
+    def test_prefetch_runs_ahead_of_slot(self, schedule):
+        schedule.set(1, 21, 0)
+        job_queue = MagicMock()
+        job_queue.get_jobs_by_name.return_value = ()
+
+        with patch.object(daily_report, "report_schedule", schedule):
+            daily_report.schedule_next_prefetch(job_queue, after=_at(12, 0))
+
+        lead = datetime.timedelta(seconds=daily_report.REPORT_PREFETCH_MAX_LEAD_SECONDS)
+        assert job_queue.run_once.call_args.kwargs["when"] == _at(21, 0) - lead
+        assert job_queue.run_once.call_args.kwargs["data"] == _at(21, 0)
+
+    @pytest.mark.asyncio
+    async def test_prefetch_syncs_polling_users_only(self, schedule):
+        session = get_session()
+        with session.begin():
+            polling, pushed, idle = _user(1), _user(2), _user(3)
+            polling.selected_accounts = ["account1", "account2"]
+            pushed.selected_accounts = ["account3"]
+            pushed.webhook_date = datetime.datetime(2024, 1, 1)
+            session.add_all([polling, pushed, idle])
+        session.close()
+        for user_id in (1, 2, 3):
+            schedule.set(user_id, 21, 0)
+
+        context = MagicMock(job=SimpleNamespace(data=_at(21, 0)))
+        context.job_queue.get_jobs_by_name.return_value = ()
+        with (
+            patch.object(daily_report, "report_schedule", schedule),
+            patch.object(daily_report, "sync_statements", new_callable=AsyncMock) as sync,
+        ):
+            await daily_report.prefetch_statements(context)
+
+        sync.assert_called_once()
+        assert sync.call_args.args[1:3] == (["account1", "account2"], int(_at(0, 0).timestamp()))
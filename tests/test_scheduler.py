@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from src.services.rate_limiter import STATEMENT, BucketLimit, RateLimiter
+from src.services.scheduler import Priority, RequestScheduler
+
+
+class _LockedLimiter(RateLimiter):
+    """Fails the first reservation like a locked SQLite database."""
+
+    def __init__(self):
+        super().__init__({STATEMENT: BucketLimit(0.05)})
+        self.failures = 1
+
+    async def try_acquire(self, token: str, endpoint: str) -> float:
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("UPDATE rate_limits", {}, Exception("database is locked"))
+        return await super().try_acquire(token, endpoint)
+
+
+def _scheduler(interval: float = 60, max_concurrency: int = 10) -> RequestScheduler:
+    return RequestScheduler(RateLimiter({STATEMENT: BucketLimit(interval)}), max_concurrency=max_concurrency)
+
+
+class TestRequestScheduler:
+    @pytest.mark.asyncio
+    async def test_returns_request_result(self):
+        scheduler = _scheduler()
+
+        async def request():
+            return [{"id": "tx1"}]
+
+        assert await scheduler.submit("token", request) == [{"id": "tx1"}]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_propagates_request_errors(self):
+        scheduler = _scheduler()
+
+        async def request():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await scheduler.submit("token", request)
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_different_tokens_run_concurrently(self):
+        scheduler = _scheduler(interval=60)
+
+        async def request(name):
+            await asyncio.sleep(0.05)
+            return name
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(scheduler.submit(f"token{i}", lambda i=i: request(i)) for i in range(5))), timeout=1
+        )
+
+        assert sorted(results) == [0, 1, 2, 3, 4]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_same_token_requests_are_spaced(self):
+        scheduler = _scheduler(interval=0.2)
+        started = []
+
+        async def request():
+            started.append(time.time())
+
+        submitted_at = time.time()
+        await asyncio.gather(scheduler.submit("token", request), scheduler.submit("token", request))
+
+        assert started[1] - submitted_at >= 0.19
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_interactive_requests_go_first(self):
+        scheduler = _scheduler(max_concurrency=1)
+        started, release = asyncio.Event(), asyncio.Event()
+        order = []
+
+        async def blocker():
+            started.set()
+            await release.wait()
+
+        async def request(name):
+            order.append(name)
+
+        blocking = asyncio.create_task(scheduler.submit("busy", blocker))
+        await started.wait()
+        scheduled = asyncio.create_task(scheduler.submit("a", lambda: request("scheduled"), Priority.SCHEDULED))
+        interactive = asyncio.create_task(scheduler.submit("b", lambda: request("interactive"), Priority.INTERACTIVE))
+        # both tokens are scheduled once their buckets are read
+        while scheduler.stats["tokens"] < 2:
+            await asyncio.sleep(0.01)
+
+        assert scheduler.stats["queue_depth"] == 2
+        assert scheduler.stats["queued"] == {"interactive": 1, "scheduled": 1}
+
+        release.set()
+        await asyncio.gather(blocking, scheduled, interactive)
+
+        assert order == ["interactive", "scheduled"]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_stats_track_wait_time(self):
+        scheduler = _scheduler(interval=0.1)
+
+        async def request():
+            return None
+
+        await asyncio.gather(scheduler.submit("token", request), scheduler.submit("token", request))
+
+        stats = scheduler.stats
+        assert stats["queue_depth"] == 0
+        assert stats["max_wait"] >= 0.09
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_limiter_errors_fail_only_their_request(self):
+        scheduler = RequestScheduler(_LockedLimiter(), max_concurrency=1)
+
+        async def request():
+            return "ok"
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(scheduler.submit(token, request) for token in ["a", "b"]), return_exceptions=True),
+            timeout=1,
+        )
+        runner = scheduler._runner
+
+        assert sorted(type(result).__name__ for result in results) == ["OperationalError", "str"]
+        assert await asyncio.wait_for(scheduler.submit("a", request), timeout=1) == "ok"
+        assert scheduler._runner is runner and not runner.done()
+        await scheduler.close()
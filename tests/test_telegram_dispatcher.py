@@ -0,0 +1,120 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from telegram.error import RetryAfter
+
+from src.services.scheduler import Priority
+from src.services.telegram_dispatcher import OutboundRateLimiter
+
+
+async def _send(limiter, chat_id, callback, priority=None):
+    return await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, priority)
+
+
+@pytest.fixture
+async def limiter():
+    limiter = OutboundRateLimiter(
+        global_rate=1000, chat_rate=20, chat_burst=1, group_rate_per_minute=600, max_retries=2
+    )
+    await limiter.initialize()
+    yield limiter
+    await limiter.shutdown()
+
+
+class TestOutboundRateLimiter:
+    @pytest.mark.asyncio
+    async def test_requests_without_chat_pass_through(self, limiter):
+        callback = AsyncMock(return_value=True)
+        result = await limiter.process_request(callback, (), {}, "answerCallbackQuery", {}, None)
+
+        assert result is True
+        assert limiter.stats["sent"] == 0
+
+    @pytest.mark.asyncio
+    async def test_same_chat_is_spaced(self, limiter):
+        sent_at = []
+
+        async def callback():
+            sent_at.append(time.monotonic())
+            return True
+
+        await asyncio.gather(*(_send(limiter, 1, callback) for _ in range(3)))
+
+        assert sent_at[2] - sent_at[0] >= 0.09
+        assert limiter.stats["sent"] == 3
+
+    @pytest.mark.asyncio
+    async def test_private_chats_allow_a_short_burst(self):
+        limiter = OutboundRateLimiter(global_rate=1000, chat_rate=1, chat_burst=3)
+        callback = AsyncMock(return_value=True)
+
+        started_at = time.monotonic()
+        await _send(limiter, 1, callback)
+        await _send(limiter, 1, callback)
+
+        assert time.monotonic() - started_at < 0.5
+        assert callback.call_count == 2
+        await limiter.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_groups_have_their_own_slower_bucket(self, limiter):
+        sent_at = []
+
+        async def callback():
+            sent_at.append(time.monotonic())
+            return True
+
+        await asyncio.gather(_send(limiter, -100, callback), _send(limiter, -100, callback))
+
+        assert sent_at[1] - sent_at[0] >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_interactive_requests_overtake_bulk(self):
+        limiter = OutboundRateLimiter(global_rate=50, chat_rate=1000)
+        order = []
+
+        def callback(name):
+            async def send():
+                order.append(name)
+                return True
+
+            return send
+
+        bulk = [asyncio.create_task(_send(limiter, i, callback(f"bulk{i}"), Priority.SCHEDULED)) for i in range(80)]
+        await asyncio.sleep(0.02)
+        await _send(limiter, 1000, callback("interactive"), Priority.INTERACTIVE)
+        await asyncio.gather(*bulk)
+        await limiter.shutdown()
+
+        assert order.index("interactive") < len(order) - 10
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_retried(self, limiter):
+        callback = AsyncMock(side_effect=[RetryAfter(0), True])
+
+        assert await _send(limiter, 1, callback) is True
+        assert callback.call_count == 2
+        assert limiter.stats["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_after_gives_up_after_max_retries(self, limiter):
+        callback = AsyncMock(side_effect=RetryAfter(0))
+
+        with pytest.raises(RetryAfter):
+            await _send(limiter, 1, callback)
+        assert callback.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_backlog_is_reported_per_lane(self):
+        limiter = OutboundRateLimiter(global_rate=1000, chat_rate=1, chat_burst=1)
+        callback = AsyncMock(return_value=True)
+
+        await _send(limiter, 1, callback)
+        waiting = asyncio.create_task(_send(limiter, 1, callback, Priority.SCHEDULED))
+        await asyncio.sleep(0.01)
+
+        assert limiter.stats["queued"] == {"interactive": 0, "scheduled": 1}
+        waiting.cancel()
+        await limiter.shutdown()
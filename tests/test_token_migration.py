@@ -0,0 +1,122 @@
+import base64
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import select
+from telegram import User as TelegramUser
+
+from src.database.configuration import get_session
+from src.database.models import User
+from src.lib import crypto
+from src.lib.crypto import is_legacy_token, needs_reencryption, pending_reencryptions
+from src.lib.helpers import prepare_user
+from src.services.token_migration import flush_reencrypted_tokens, migrate_tokens
+from src.services.webhook import parse_webhook_path, webhook_url
+
+TOKEN = "uTestToken123456789012345678901234567890"
+
+
+def legacy_encrypt(token: str, user_id: int) -> str:
+    fernet = Fernet(crypto._pbkdf2_user_key(crypto._get_or_create_master_key(), user_id))
+    return base64.urlsafe_b64encode(fernet.encrypt(token.encode())).decode()
+
+
+@pytest.fixture
+def retired_keys(tmp_path):
+    with patch.object(crypto, "RETIRED_KEYS_FILE", tmp_path / ".secret_key.retired"):
+        yield
+    pending_reencryptions.drain()
+
+
+def _add_users(tokens: dict[int, str]) -> None:
+    session = get_session()
+    with session.begin():
+        for user_id, encrypted in tokens.items():
+            user = User(id=user_id, first_name="Test", language_code="uk")
+            user._monobank_token = encrypted
+            session.add(user)
+    session.close()
+
+
+def _stored_tokens() -> dict[int, str]:
+    session = get_session()
+    try:
+        return dict(session.execute(select(User.id, User._monobank_token).order_by(User.id)).all())
+    finally:
+        session.close()
+
+
+class TestLazyReencryption:
+    @pytest.mark.asyncio
+    async def test_loaded_legacy_token_is_reencrypted(self, tmp_secret_key, retired_keys):
+        _add_users({1: legacy_encrypt(TOKEN, 1)})
+        session = get_session()
+        user = session.get(User, 1)
+        session.close()
+
+        assert user.monobank_token == TOKEN
+        # reading the token has no side effects
+        assert is_legacy_token(user.encrypted_token)
+        assert len(pending_reencryptions) == 0
+
+        user.reencrypt_if_stale()
+        assert user.monobank_token == TOKEN
+        assert not is_legacy_token(user.encrypted_token)
+        assert await flush_reencrypted_tokens() == 1
+        assert not needs_reencryption(_stored_tokens()[1])
+
+    @pytest.mark.asyncio
+    async def test_users_are_reencrypted_when_loaded(self, tmp_secret_key, retired_keys):
+        _add_users({1: legacy_encrypt(TOKEN, 1)})
+        update = SimpleNamespace(effective_user=TelegramUser(id=1, first_name="Test", is_bot=False))
+
+        user = await prepare_user(update, SimpleNamespace(user_data={}, user=None))
+
+        assert not is_legacy_token(user.encrypted_token)
+        assert await flush_reencrypted_tokens() == 1
+
+    @pytest.mark.asyncio
+    async def test_token_changed_meanwhile_is_not_overwritten(self, tmp_secret_key, retired_keys):
+        _add_users({1: legacy_encrypt(TOKEN, 1)})
+        session = get_session()
+        user = session.get(User, 1)
+        session.close()
+        user.reencrypt_if_stale()
+
+        replacement = crypto.encrypt_token("uOtherToken12345678901234567890123456789", 1)
+        session = get_session()
+        with session.begin():
+            session.get(User, 1)._monobank_token = replacement
+        session.close()
+
+        assert await flush_reencrypted_tokens() == 0
+        assert _stored_tokens()[1] == replacement
+
+
+class TestBulkMigration:
+    def test_migrates_legacy_tokens_in_batches(self, tmp_secret_key, retired_keys):
+        current = crypto.encrypt_token(TOKEN, 3)
+        _add_users({1: legacy_encrypt(TOKEN, 1), 2: legacy_encrypt(TOKEN, 2), 3: current, 4: "broken"})
+
+        migrated, failed = migrate_tokens(batch_size=2, workers=2)
+
+        stored = _stored_tokens()
+        assert (migrated, failed) == (2, 0)
+        assert stored[3] == current
+        assert all(not is_legacy_token(stored[user_id]) for user_id in (1, 2))
+        assert crypto.decrypt_token(stored[1], 1) == TOKEN
+
+    def test_rotation_reencrypts_everything_under_new_key(self, tmp_secret_key, retired_keys):
+        _add_users({1: crypto.encrypt_token(TOKEN, 1), 2: legacy_encrypt(TOKEN, 2)})
+        old_url = webhook_url(1, "https://bot.example")
+
+        crypto.rotate_master_key()
+        migrated, _ = migrate_tokens()
+
+        stored = _stored_tokens()
+        assert migrated == 2
+        assert not any(needs_reencryption(encrypted) for encrypted in stored.values())
+        assert crypto.decrypt_token(stored[2], 2) == TOKEN
+        assert parse_webhook_path(old_url.removeprefix("https://bot.example")) == 1
@@ -0,0 +1,92 @@
+from sqlalchemy import select
+
+from src.database.configuration import get_session
+from src.database.models import AccountSyncState, Transaction
+from src.services.decoding import StatementRecord
+from src.services.transaction_store import (
+    STATEMENT_MAX_WINDOW_SECONDS,
+    load_transactions,
+    plan_sync,
+    split_windows,
+    store_statement,
+)
+
+
+def _state(synced_from: int, synced_to: int) -> AccountSyncState:
+    return AccountSyncState(account_id="account1", synced_from=synced_from, synced_to=synced_to)
+
+
+class TestPlanSync:
+    def test_unknown_account_fetches_whole_range(self):
+        assert plan_sync(None, 1000, 2000) == [(1000, 2000)]
+
+    def test_covered_range_fetches_only_delta(self):
+        assert plan_sync(_state(1000, 1500), 1000, 2000, freshness=60) == [(1500, 2000)]
+
+    def test_fresh_watermark_needs_no_fetch(self):
+        assert plan_sync(_state(1000, 1990), 1000, 2000, freshness=60) == []
+
+    def test_earlier_start_fetches_head_gap(self):
+        assert plan_sync(_state(1500, 2000), 1000, 2000, freshness=60) == [(1000, 1500)]
+
+    def test_disjoint_coverage_fetches_whole_range(self):
+        assert plan_sync(_state(100, 200), 1000, 2000) == [(1000, 2000)]
+
+
+class TestSplitWindows:
+    def test_short_range_is_one_window(self):
+        assert split_windows(1000, 2000) == [(1000, 2000)]
+
+    def test_long_range_is_split_newest_first(self):
+        to_ts = 1000 + 2 * STATEMENT_MAX_WINDOW_SECONDS + 10
+        assert split_windows(1000, to_ts) == [
+            (1010 + STATEMENT_MAX_WINDOW_SECONDS, to_ts),
+            (1010, 1010 + STATEMENT_MAX_WINDOW_SECONDS),
+            (1000, 1010),
+        ]
+
+
+class TestStoreStatement:
+    def test_store_and_load(self, sample_records):
+        session = get_session()
+        with session.begin():
+            store_statement(session, "account1", sample_records, 1705660000, 1705670000)
+
+        rows = load_transactions(session, ["account1"], 1705660000, 1705670000)
+        state = session.get(AccountSyncState, "account1")
+        session.close()
+
+        assert sorted(rows) == [
+            ("account1", -30000, 5541, 1705661400, "Gas Station"),
+            ("account1", -25000, 5812, 1705661000, "Restaurant"),
+            ("account1", -15000, 5411, 1705660800, "Grocery Store"),
+            ("account1", 500000, 6011, 1705661200, "Salary"),
+        ]
+        assert (state.synced_from, state.synced_to) == (1705660000, 1705670000)
+
+    def test_upsert_updates_existing_transactions(self, sample_records):
+        session = get_session()
+        with session.begin():
+            store_statement(session, "account1", sample_records[:1], 1705660000, 1705661000)
+        with session.begin():
+            changed = sample_records[0]
+            changed.amount = -16000
+            store_statement(session, "account1", [changed, sample_records[1]], 1705661000, 1705662000)
+
+        amounts = session.scalars(select(Transaction.amount).order_by(Transaction.time)).all()
+        state = session.get(AccountSyncState, "account1")
+        session.close()
+
+        assert amounts == [-16000, -25000]
+        assert (state.synced_from, state.synced_to) == (1705660000, 1705662000)
+
+    def test_truncated_statement_shrinks_coverage(self):
+        items = [StatementRecord(f"tx{i}", 2000 - i, amount=-100, mcc=5411) for i in range(500)]
+
+        session = get_session()
+        with session.begin():
+            store_statement(session, "account1", items, 1000, 2000)
+        state = session.get(AccountSyncState, "account1")
+        session.close()
+
+        assert (state.synced_from, state.synced_to) == (1501, 2000)
@@ -0,0 +1,169 @@
+import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select, update
+from telegram import User as TelegramUser
+
+from src.database.configuration import get_session
+from src.database.models import User
+from src.lib.helpers import change_user, prepare_user, update_user
+from src.services import user_cache as user_cache_module
+from src.services.report_outbox import due_users
+from src.services.user_cache import UserCache, user_cache
+
+
+def _telegram_update(first_name: str = "Test", user_id: int = 1) -> SimpleNamespace:
+    return SimpleNamespace(effective_user=TelegramUser(id=user_id, first_name=first_name, is_bot=False))
+
+
+def _context() -> SimpleNamespace:
+    return SimpleNamespace(user_data={}, user=None)
+
+
+def _stored(user_id: int = 1) -> User:
+    session = get_session()
+    try:
+        user = session.scalar(select(User).where(User.id == user_id))
+        session.expunge(user)
+        return user
+    finally:
+        session.close()
+
+
+def _write_elsewhere(**values) -> None:
+    session = get_session()
+    with session.begin():
+        session.execute(update(User).where(User.id == 1).values(values))
+    session.close()
+
+
+@pytest.fixture
+def cached_user(tmp_secret_key):
+    session = get_session()
+    with session.begin():
+        session.add(User(id=1, first_name="Test", language_code="uk"))
+    session.close()
+
+    cache = UserCache(ttl=60)
+    return cache, cache.put(_stored())
+
+
+class TestUserCache:
+    @pytest.mark.asyncio
+    async def test_repeated_interactions_write_nothing(self, tmp_secret_key):
+        await prepare_user(_telegram_update(), _context())
+        for _ in range(20):
+            await prepare_user(_telegram_update(), _context())
+
+        assert await user_cache.flush() == 0
+        assert _stored().version == 0
+        assert user_cache.as_dict()["hits"] == 20
+
+    @pytest.mark.asyncio
+    async def test_changes_are_coalesced_into_one_write(self, tmp_secret_key):
+        context = _context()
+        await prepare_user(_telegram_update(), context)
+        await prepare_user(_telegram_update("Renamed"), context)
+        change_user(context, language_code="en")
+        change_user(context, username="renamed")
+
+        assert user_cache.pending == 1
+        assert await user_cache.flush() == 1
+
+        stored = _stored()
+        assert (stored.first_name, stored.language_code, stored.username) == ("Renamed", "en", "renamed")
+        assert stored.version == 1
+        # the cache knows the version it wrote, so its own write does not evict the user
+        await user_cache.refresh()
+        assert user_cache.get(1) is context.user_data["user"]
+
+    @pytest.mark.asyncio
+    async def test_writes_of_other_processes_evict_the_user(self, cached_user):
+        cache, user = cached_user
+        _write_elsewhere(block_date=None)
+
+        assert await cache.refresh() == 1
+        assert cache.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_pending_change_survives_a_concurrent_write(self, cached_user):
+        cache, user = cached_user
+        cache.update(user, language_code="en")
+        _write_elsewhere(first_name="Elsewhere")
+
+        await cache.flush()
+
+        stored = _stored()
+        assert (stored.first_name, stored.language_code) == ("Elsewhere", "en")
+        assert cache.get(1) is None
+        assert cache.conflicts == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_changes_pending(self, cached_user):
+        cache, user = cached_user
+        cache.update(user, language_code="en")
+
+        with (
+            patch.object(user_cache_module, "run_db", side_effect=RuntimeError("database is locked")),
+            pytest.raises(RuntimeError),
+        ):
+            await cache.flush()
+
+        assert cache.pending == 1
+        assert await cache.flush() == 1
+        assert _stored().language_code == "en"
+
+    def test_reloaded_user_keeps_pending_changes(self, cached_user):
+        cache, user = cached_user
+        cache.update(user, language_code="en")
+        cache.invalidate(1)
+
+        assert cache.put(_stored()).language_code == "en"
+
+    def test_tokens_and_report_times_are_not_written_behind(self, cached_user):
+        cache, user = cached_user
+        with pytest.raises(ValueError):
+            cache.update(user, _monobank_token="secret")
+        with pytest.raises(ValueError):
+            cache.update(user, report_hour=8)
+
+    @pytest.mark.asyncio
+    async def test_immediate_update_takes_pending_changes_along(self, cached_user):
+        cache, user = cached_user
+        context = SimpleNamespace(user_data={"user": user})
+        with patch("src.lib.helpers.user_cache", cache):
+            change_user(context, language_code="en")
+
+            def set_webhook(db_user: User) -> None:
+                db_user.webhook_date = None
+
+            result = await update_user(context, set_webhook)
+
+        assert cache.pending == 0
+        assert _stored().language_code == "en"
+        assert cache.get(1) is result
+
+    @pytest.mark.asyncio
+    async def test_report_time_change_is_seen_by_the_next_tick(self, tmp_secret_key):
+        session = get_session()
+        with session.begin():
+            user = User(id=1, first_name="Test", language_code="uk", report_hour=21, report_minute=0)
+            user.monobank_token = "uTestToken123456789012345678901234567890"
+            session.add(user)
+        session.close()
+        context = SimpleNamespace(user_data={"user": user_cache.put(_stored())})
+
+        def set_report_time(db_user: User) -> None:
+            db_user.report_hour, db_user.report_minute = 8, 30
+
+        await update_user(context, set_report_time)
+
+        session = get_session()
+        try:
+            assert due_users(session, datetime.datetime(2024, 1, 15, 8, 30)) == [1]
+            assert due_users(session, datetime.datetime(2024, 1, 15, 21, 0)) == []
+        finally:
+            session.close()
+        assert user_cache.pending == 0
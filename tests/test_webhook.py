@@ -0,0 +1,184 @@
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from src.database.configuration import get_session
+from src.database.models import AccountSyncState, Transaction, User
+from src.services.monobank import MonobankService, sync_statements
+from src.services.transaction_store import plan_sync
+from src.services.webhook import WebhookServer, is_webhook_url, parse_webhook_path, webhook_url
+
+
+@pytest.fixture
+async def server(tmp_secret_key):
+    session = get_session()
+    with session.begin():
+        user = User(id=123456789, first_name="Test")
+        user.selected_accounts = ["account1"]
+        session.add(user)
+    session.close()
+
+    server = WebhookServer(host="127.0.0.1", port=0)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+def statement_push():
+    return {
+        "type": "StatementItem",
+        "data": {
+            "account": "account1",
+            "statementItem": {
+                "id": "pushed1",
+                "time": 1705660800,
+                "description": "Grocery Store",
+                "mcc": 5411,
+                "amount": -15000,
+                "balance": 100000,
+            },
+        },
+    }
+
+
+def _url(server: WebhookServer, user_id: int = 123456789) -> str:
+    return webhook_url(user_id, base_url=f"http://127.0.0.1:{server.bound_port}")
+
+
+class TestWebhookPath:
+    def test_valid_signature(self, tmp_secret_key):
+        assert (
+            parse_webhook_path(webhook_url(42, base_url="https://example.com").removeprefix("https://example.com"))
+            == 42
+        )
+
+    def test_invalid_signature(self, tmp_secret_key):
+        assert parse_webhook_path("/monobank/42/deadbeef") is None
+
+    def test_unknown_path(self, tmp_secret_key):
+        assert parse_webhook_path("/other/42/deadbeef") is None
+
+
+class TestWebhookServer:
+    @pytest.mark.asyncio
+    async def test_validation_get_is_accepted(self, server):
+        async with httpx.AsyncClient() as sender:
+            response = await sender.get(_url(server))
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_pushed_item_is_stored(self, server, statement_push):
+        async with httpx.AsyncClient() as sender:
+            response = await sender.post(_url(server), json=statement_push)
+
+        assert response.status_code == 200
+        session = get_session()
+        tx = session.scalar(select(Transaction).where(Transaction.id == "pushed1"))
+        session.close()
+        assert tx.account_id == "account1"
+        assert tx.amount == -15000
+        assert server.received == 1
+
+    @pytest.mark.asyncio
+    async def test_repeated_push_is_idempotent(self, server, statement_push):
+        async with httpx.AsyncClient() as sender:
+            await sender.post(_url(server), json=statement_push)
+            await sender.post(_url(server), json=statement_push)
+
+        session = get_session()
+        count = len(session.scalars(select(Transaction)).all())
+        session.close()
+        assert count == 1
+
+    @pytest.mark.asyncio
+    async def test_push_for_another_account_is_dropped(self, server, statement_push):
+        statement_push["data"]["account"] = "someone_elses_account"
+        async with httpx.AsyncClient() as sender:
+            response = await sender.post(_url(server), json=statement_push)
+
+        assert response.status_code == 200
+        session = get_session()
+        assert session.scalars(select(Transaction)).all() == []
+        session.close()
+        assert (server.received, server.dropped) == (0, 1)
+
+    @pytest.mark.asyncio
+    async def test_bad_signature_is_rejected(self, server, statement_push):
+        async with httpx.AsyncClient() as sender:
+            response = await sender.post(
+                f"http://127.0.0.1:{server.bound_port}/monobank/123456789/deadbeef", json=statement_push
+            )
+        assert response.status_code == 404
+        assert server.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_payload_is_rejected(self, server, statement_push):
+        statement_push["data"]["statementItem"]["amount"] = "a lot"
+        async with httpx.AsyncClient() as sender:
+            invalid_item = await sender.post(_url(server), json=statement_push)
+            invalid_json = await sender.post(_url(server), content=b"{not json")
+            wrong_type = await sender.post(_url(server), json={"type": "Other", "data": {}})
+
+        assert invalid_item.status_code == 400
+        assert invalid_json.status_code == 400
+        assert wrong_type.status_code == 400
+
+
+class TestPushCoverage:
+    def test_pushed_range_needs_no_fetch(self):
+        assert plan_sync(None, 1000, 2000, push_since=900) == []
+
+    def test_only_range_before_push_is_fetched(self):
+        assert plan_sync(None, 1000, 2000, push_since=1500) == [(1000, 1500)]
+
+    def test_polled_range_up_to_push_needs_no_fetch(self):
+        state = AccountSyncState(account_id="account1", synced_from=1000, synced_to=1600)
+        assert plan_sync(state, 1000, 2000, push_since=1500) == []
+
+    def test_pushes_are_trusted_only_until_reconciled(self):
+        state = AccountSyncState(account_id="account1", synced_from=1000, synced_to=1600)
+        assert plan_sync(state, 1000, 2000, push_since=1500, reconcile=300) == [(1600, 2000)]
+        assert plan_sync(None, 1000, 2000, push_since=900, reconcile=300) == [(1000, 2000)]
+
+
+@pytest.mark.usefixtures("no_rate_limit")
+class TestPushHealth:
+    @staticmethod
+    def _client_info(webhook: str):
+        return patch.object(
+            MonobankService, "_fetch_client_info", AsyncMock(return_value={"webHookUrl": webhook, "accounts": []})
+        )
+
+    @pytest.mark.asyncio
+    async def test_pushes_are_used_while_the_webhook_is_registered(self):
+        with (
+            patch("src.services.monobank.WEBHOOK_ENABLED", True),
+            patch("src.services.monobank.is_webhook_url", lambda url: is_webhook_url(url, "https://bot.example.com")),
+            self._client_info("https://bot.example.com/monobank/1/signature"),
+            patch.object(MonobankService, "get_statement", AsyncMock(return_value=[])) as get_statement,
+        ):
+            await sync_statements("token", ["account1"], 1000, 2000, push_since=900)
+
+        get_statement.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_statements_are_fetched_when_pushes_stopped(self):
+        with (
+            patch("src.services.monobank.WEBHOOK_ENABLED", True),
+            patch("src.services.monobank.is_webhook_url", lambda url: is_webhook_url(url, "https://bot.example.com")),
+            self._client_info(""),
+            patch.object(MonobankService, "get_statement", AsyncMock(return_value=[])) as get_statement,
+        ):
+            await sync_statements("token", ["account1"], 1000, 2000, push_since=900)
+
+        assert get_statement.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_statements_are_fetched_with_webhooks_disabled(self):
+        with patch.object(MonobankService, "get_statement", AsyncMock(return_value=[])) as get_statement:
+            await sync_statements("token", ["account1"], 1000, 2000, push_since=900)
+
+        assert get_statement.call_count == 1
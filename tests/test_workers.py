@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import time
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from src.database.configuration import get_session
+from src.database.models import Lease, WorkerHeartbeat
+from src.services.workers import Shard, WorkerRegistry
+
+
+def _age_worker(worker_id: str, seconds: float) -> None:
+    session = get_session()
+    with session.begin():
+        stmt = update(WorkerHeartbeat).where(WorkerHeartbeat.id == worker_id)
+        session.execute(stmt.values(heartbeat_at=WorkerHeartbeat.heartbeat_at - seconds))
+        session.execute(update(Lease).where(Lease.holder == worker_id).values(expires_at=Lease.expires_at - seconds))
+    session.close()
+
+
+async def _heartbeat_until(registry: WorkerRegistry, size: int) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        await registry.heartbeat()
+        if registry.shard.count == size:
+            break
+        await asyncio.sleep(0.05)
+
+
+def _join_cluster(database_url: str, worker_id: str, size: int, results) -> None:
+    engine = create_engine(database_url)
+    registry = WorkerRegistry(worker_id)
+    # the spawned process does not run the conftest fixtures, so pin it to this test database
+    with (
+        patch("src.database.configuration.sm", sessionmaker(bind=engine)),
+        patch("src.database.configuration.DATABASE_ASYNC", False),
+    ):
+        asyncio.run(_heartbeat_until(registry, size))
+    results.put((worker_id, registry.shard, registry.is_leader))
+    engine.dispose()
+
+
+class TestWorkerRegistry:
+    @pytest.mark.asyncio
+    async def test_single_worker_owns_everything(self):
+        registry = WorkerRegistry("worker-a")
+
+        await registry.heartbeat()
+
+        assert registry.shard == Shard(0, 1)
+        assert registry.is_leader
+
+    @pytest.mark.asyncio
+    async def test_workers_split_users(self):
+        first, second = WorkerRegistry("worker-a"), WorkerRegistry("worker-b")
+
+        await first.heartbeat()
+        await second.heartbeat()
+        assert await first.heartbeat() is True
+
+        assert (first.shard, second.shard) == (Shard(0, 2), Shard(1, 2))
+        assert (first.is_leader, second.is_leader) == (True, False)
+        assert [user_id for user_id in range(6) if second.shard.owns(user_id)] == [1, 3, 5]
+
+    @pytest.mark.asyncio
+    async def test_dead_worker_is_rebalanced_and_loses_leadership(self):
+        first, second = WorkerRegistry("worker-a"), WorkerRegistry("worker-b")
+        await first.heartbeat()
+        await second.heartbeat()
+
+        _age_worker("worker-a", 120)
+
+        assert await second.heartbeat() is True
+        assert second.shard == Shard(0, 1)
+        assert second.is_leader
+
+    @pytest.mark.asyncio
+    async def test_leaving_hands_over_leadership(self):
+        first, second = WorkerRegistry("worker-a"), WorkerRegistry("worker-b")
+        await first.heartbeat()
+        await second.heartbeat()
+
+        await first.leave()
+        await second.heartbeat()
+
+        assert second.is_leader
+        assert second.shard == Shard(0, 1)
+
+    def test_processes_sharing_a_database_split_users(self, database):
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        size = 3
+        processes = [
+            context.Process(target=_join_cluster, args=(str(database.url), f"worker-{i}", size, results))
+            for i in range(size)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join(timeout=10)
+
+        shards = {worker_id: shard for worker_id, shard, _ in outcomes}
+        assert sorted(shard.index for shard in shards.values()) == [0, 1, 2]
+        assert {shard.count for shard in shards.values()} == {size}
+        assert sum(is_leader for _, _, is_leader in outcomes) == 1